@@ -0,0 +1,162 @@
+"""
+Fixed against adaptive worker concurrency, measured offline.
+
+A LocalWorker mounted under /v2/local runs async_handler over an app that
+stands in for a GPU: it serves `capacity` requests in `work` seconds each,
+and every request beyond that slows all of them down more than it adds, the
+way a model thrashes once its batch no longer fits. `users` callers keep
+sending through AsyncClient, and each worker concurrency in --limits is
+compared with AdaptiveConcurrency.
+
+    python -m benchmarks.bench_concurrency [--limits 1,4,16] [--users 16]
+
+Prints one JSON object per limit, append them to a file with --output to
+compare runs over time.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import platform
+import time
+import typing
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from benchmarks.bench_e2e import percentile
+from runpod_httpx_proxy.clients import AsyncClient
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.handlers.concurrency import AdaptiveConcurrency
+from runpod_httpx_proxy.worker.local.local_worker import LocalWorker
+
+BASE_URL = "http://runpod.test/v2/local"
+
+
+def saturating_app(capacity: int, work: float) -> Starlette:
+    inflight = 0
+
+    async def infer(request: Request) -> JSONResponse:
+        nonlocal inflight
+        inflight += 1
+        try:
+            await asyncio.sleep(work * max(1.0, inflight / capacity) ** 2)
+        finally:
+            inflight -= 1
+        return JSONResponse({"inflight": inflight})
+
+    return Starlette(routes=[Route("/infer", infer, methods=["POST"])])
+
+
+async def run_limit(
+    limit: typing.Optional[int],
+    users: int,
+    requests: int,
+    capacity: int = 4,
+    work: float = 0.02,
+    min_interval: float = 0.002,
+) -> dict[str, typing.Any]:
+    """Run with a fixed worker concurrency of `limit`, or adaptive for None."""
+    concurrency = AdaptiveConcurrency() if limit is None else None
+    worker = LocalWorker(
+        {
+            "handler": async_handler(
+                saturating_app(capacity, work), concurrency=concurrency
+            ),
+            "concurrency_modifier": (
+                concurrency.concurrency_modifier
+                if concurrency is not None
+                else lambda _: limit
+            ),
+        }
+    )
+    latencies: typing.List[float] = []
+    errors = 0
+    remaining = requests
+
+    async with AsyncClient(
+        base_url=BASE_URL,
+        transport=httpx.ASGITransport(
+            Starlette(routes=[Mount("/v2/local", app=worker)])
+        ),
+        poll_options={"min_interval": min_interval},
+        timeout=60,
+    ) as client:
+
+        async def user() -> None:
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/infer")
+                    response.raise_for_status()
+                except Exception:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(users)))
+        elapsed = time.perf_counter() - started
+
+    result: dict[str, typing.Any] = {
+        "limit": "adaptive" if limit is None else limit,
+        "users": users,
+        "requests": requests,
+        "capacity": capacity,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+    }
+    if concurrency is not None:
+        result["concurrency"] = concurrency.metrics()
+    return result
+
+
+async def run(args: argparse.Namespace) -> typing.List[dict[str, typing.Any]]:
+    meta = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "work": args.work,
+    }
+    limits: typing.List[typing.Optional[int]] = [
+        int(limit) for limit in args.limits.split(",")
+    ]
+    results = []
+    for limit in [*limits, None]:
+        result = await run_limit(
+            limit, args.users, args.requests, args.capacity, args.work
+        )
+        results.append({**result, **meta})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--limits", default="1,4,16")
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--work", type=float, default=0.02)
+    parser.add_argument("--output", help="append results to this JSON lines file")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    lines = [json.dumps(result) for result in results]
+    print("\n".join(lines))
+    if args.output:
+        with open(args.output, "a") as output:
+            output.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+End-to-end cost of the proxy, measured offline.
+
+AsyncClient talks through httpx.ASGITransport to a LocalWorker mounted under
+/v2/local, which runs async_handler over the example app in
+examples/worker/handler.py. Nothing leaves the process, so the numbers are the
+cost of the proxy layers plus polling.
+
+    python -m benchmarks.bench_e2e [--cases json,ndjson] [--concurrency 1,8]
+
+Prints one JSON object per case and concurrency level, append them to a file
+with --output to compare runs over time.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import platform
+import time
+import typing
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from examples.worker.handler import app
+from runpod_httpx_proxy.clients import AsyncClient
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.worker.local.local_worker import LocalWorker
+
+BASE_URL = "http://runpod.test/v2/local"
+LARGE_BODY = bytes(range(256)) * (4 * 1024 * 1024 // 256)
+
+Case = typing.Callable[[httpx.AsyncClient], typing.Awaitable[None]]
+
+
+async def get_json(client: httpx.AsyncClient) -> None:
+    response = await client.get("/json")
+    response.raise_for_status()
+
+
+async def get_ndjson(client: httpx.AsyncClient) -> None:
+    async with client.stream("GET", "/stream_ndjson?count=10&delay=0") as response:
+        response.raise_for_status()
+        lines = [line async for line in response.aiter_lines() if line]
+    assert len(lines) == 10, lines
+
+
+async def get_sse(client: httpx.AsyncClient) -> None:
+    async with client.stream("GET", "/stream_sse?count=10&delay=0") as response:
+        response.raise_for_status()
+        events = [
+            line async for line in response.aiter_lines() if line.startswith("data:")
+        ]
+    assert len(events) == 10, events
+
+
+async def post_large(client: httpx.AsyncClient) -> None:
+    response = await client.post(
+        "/echo",
+        content=LARGE_BODY,
+        headers={"content-type": "application/octet-stream"},
+    )
+    response.raise_for_status()
+    assert len(response.content) == len(LARGE_BODY)
+
+
+CASES: dict[str, Case] = {
+    "json": get_json,
+    "ndjson": get_ndjson,
+    "sse": get_sse,
+    "large": post_large,
+}
+
+
+def local_api(concurrency: int) -> Starlette:
+    worker = LocalWorker(
+        {
+            "handler": async_handler(app),
+            "return_aggregate_stream": True,
+            "concurrency_modifier": lambda _: concurrency,
+        }
+    )
+    return Starlette(routes=[Mount("/v2/local", app=worker)])
+
+
+def percentile(samples: typing.Sequence[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_case(
+    name: str,
+    requests: int,
+    concurrency: int,
+    **client_options: typing.Any,
+) -> dict[str, typing.Any]:
+    case = CASES[name]
+    latencies: typing.List[float] = []
+    errors = 0
+    remaining = requests
+
+    async with AsyncClient(
+        base_url=BASE_URL,
+        transport=httpx.ASGITransport(local_api(concurrency)),
+        timeout=60,
+        **client_options,
+    ) as client:
+
+        async def user() -> None:
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    await case(client)
+                except Exception:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "case": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+    }
+
+
+async def run(args: argparse.Namespace) -> typing.List[dict[str, typing.Any]]:
+    client_options: dict[str, typing.Any] = {
+        "poll_options": {"min_interval": args.min_interval},
+        "runsync": args.runsync,
+    }
+    meta = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "runsync": args.runsync,
+        "min_interval": args.min_interval,
+    }
+    results = []
+    for name in args.cases.split(","):
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            result = await run_case(name, args.requests, concurrency, **client_options)
+            results.append({**result, **meta})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--min-interval", type=float, default=0.005)
+    parser.add_argument("--runsync", action="store_true")
+    parser.add_argument("--output", help="append results to this JSON lines file")
+    args = parser.parse_args()
+    # one log line per poll would dominate the run
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    lines = [json.dumps(result) for result in results]
+    print("\n".join(lines))
+    if args.output:
+        with open(args.output, "a") as output:
+            output.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
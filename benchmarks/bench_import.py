@@ -0,0 +1,90 @@
+"""
+Import time of the package entry points, as `python -X importtime` reports it.
+
+Every module is imported in a fresh interpreter, --repeat times, and the
+fastest run is kept. The client is expected to stay clear of the worker SDK,
+`sdk_imported` says whether runpod was loaded along the way.
+
+    python -m benchmarks.bench_import [--modules runpod_httpx_proxy.clients]
+
+Prints one JSON object per module, append them to a file with --output to
+compare runs over time.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import typing
+
+PACKAGE = "runpod_httpx_proxy"
+MODULES = (
+    "runpod_httpx_proxy",
+    "runpod_httpx_proxy.clients",
+    "runpod_httpx_proxy.handlers",
+)
+WORKER_SDK = "runpod"
+
+
+def import_time(module: str) -> dict[str, typing.Any]:
+    """Import `module` once in a fresh interpreter and parse its -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            # the header line
+            continue
+        imported.append(name.strip())
+        # top level lines of the package hold everything the import pulled in
+        if name.startswith(f" {PACKAGE}"):
+            total_us += int(cumulative)
+    return {
+        "module": module,
+        "import_ms": round(total_us / 1000, 3),
+        "modules": len(imported),
+        "sdk_imported": WORKER_SDK in imported,
+    }
+
+
+def run(args: argparse.Namespace) -> typing.List[dict[str, typing.Any]]:
+    meta = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+    }
+    results = []
+    for module in args.modules.split(","):
+        runs = [import_time(module) for _ in range(args.repeat)]
+        results.append({**min(runs, key=lambda run: run["import_ms"]), **meta})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--modules", default=",".join(MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="append results to this JSON lines file")
+    args = parser.parse_args()
+    results = run(args)
+    lines = [json.dumps(result) for result in results]
+    print("\n".join(lines))
+    if args.output:
+        with open(args.output, "a") as output:
+            output.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-request cost of converting requests and responses to and from jobs.
+
+    python -m benchmarks.bench_models [--number N]
+
+Prints one JSON object per stage with the mean microseconds per conversion.
+"""
+
+import argparse
+import json
+import timeit
+import typing
+
+import httpx
+
+from runpod_httpx_proxy.models import (
+    RunRequest,
+    StreamResponse,
+    request_from_request_dict,
+    response_dict_from_response,
+)
+
+HEADERS = {
+    "accept": "application/json",
+    "accept-encoding": "gzip, deflate",
+    "authorization": "Bearer " + "x" * 40,
+    "content-type": "application/json",
+    "user-agent": "python-httpx/0.28.1",
+    "x-request-id": "0" * 32,
+    "x-trace-id": "1" * 32,
+    "x-forwarded-for": "10.0.0.1",
+    "x-custom-a": "a",
+    "x-custom-b": "b",
+}
+BODY = json.dumps({"prompt": "hello " * 150, "max_tokens": 256}).encode()
+
+
+def make_request() -> httpx.Request:
+    return httpx.Request(
+        "POST",
+        "http://runpod.test/v2/bench/generate?stream=false",
+        headers=HEADERS,
+        content=BODY,
+    )
+
+
+def make_response(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(
+        200,
+        headers={**HEADERS, "content-length": str(len(BODY))},
+        content=BODY,
+        request=request,
+    )
+
+
+def stages() -> dict[str, typing.Callable[[], typing.Any]]:
+    request = make_request()
+    run_request = RunRequest.from_request(request)
+    job_body = run_request.content
+    request_dict = json.loads(job_body)["input"]
+    response = make_response(request_from_request_dict(request_dict))
+    response_dict = response_dict_from_response(response)
+    poll_body = json.dumps(
+        {"status": "COMPLETED", "stream": [{"output": response_dict}]}
+    ).encode()
+
+    def client_encode():
+        return RunRequest.from_request(make_request()).content
+
+    def handler_decode():
+        return request_from_request_dict(json.loads(job_body)["input"])
+
+    def handler_encode():
+        return json.dumps(response_dict_from_response(response))
+
+    def client_decode():
+        output = json.loads(poll_body)["stream"][0]["output"]
+        return StreamResponse.from_response_dict(output)
+
+    return {
+        "client_encode": client_encode,
+        "handler_decode": handler_decode,
+        "handler_encode": handler_encode,
+        "client_decode": client_decode,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    total = 0.0
+    for name, stage in stages().items():
+        best = min(timeit.repeat(stage, number=args.number, repeat=args.repeat))
+        microseconds = best / args.number * 1e6
+        total += microseconds
+        print(json.dumps({"stage": name, "us_per_request": round(microseconds, 2)}))
+    print(json.dumps({"stage": "total", "us_per_request": round(total, 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from runpod_httpx_proxy.handlers.async_handler import async_handler
 import runpod
 import asyncio
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse, StreamingResponse
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from starlette.routing import Route
 import json
 
@@ -13,20 +13,33 @@ async def get_json(request: Request):
     return JSONResponse({"message": "Hello, World!"})
 
 
+async def post_echo(request: Request):
+    return Response(
+        await request.body(),
+        media_type=request.headers.get("content-type", "application/octet-stream"),
+    )
+
+
 async def get_stream_ndjson(request: Request):
+    count = int(request.query_params.get("count", 10))
+    delay = float(request.query_params.get("delay", 1))
+
     async def stream():
-        for i in range(10):
+        for i in range(count):
             yield f"{json.dumps({'data': i})}\n"
-            await asyncio.sleep(1)
+            await asyncio.sleep(delay)
 
     return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 async def get_stream_sse(request: Request):
+    count = int(request.query_params.get("count", 10))
+    delay = float(request.query_params.get("delay", 1))
+
     async def sse():
-        for i in range(10):
+        for i in range(count):
             yield {"data": i}
-            await asyncio.sleep(1)
+            await asyncio.sleep(delay)
 
     return EventSourceResponse(sse())
 
@@ -34,6 +47,7 @@ async def get_stream_sse(request: Request):
 app = Starlette(
     routes=[
         Route("/json", get_json, methods=["GET"]),
+        Route("/echo", post_echo, methods=["POST"]),
         Route("/stream_ndjson", get_stream_ndjson, methods=["GET"]),
         Route("/stream_sse", get_stream_sse, methods=["GET"]),
     ]
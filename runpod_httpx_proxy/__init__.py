@@ -1,2 +1,14 @@
-from . import clients
-from . import handlers
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from . import clients, handlers
+
+__all__ = ["clients", "handlers"]
+
+
+def __getattr__(name: str) -> typing.Any:
+    # loaded on first use, so a client never pays for importing the worker SDK
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,157 @@
+import asyncio
+import collections
+import time
+import typing
+
+Priority = typing.Annotated[
+    typing.Literal["interactive", "batch"],
+    "Admission class of a request, batch jobs are submitted as lowPriority",
+]
+PRIORITIES: typing.Tuple[Priority, ...] = ("interactive", "batch")
+
+
+class AdmissionOptionsDict(typing.TypedDict, total=False):
+    max_inflight: typing.Annotated[int, "Jobs in flight per endpoint"]
+    default_priority: typing.Annotated[
+        Priority, "Class of requests without a runpod_priority extension"
+    ]
+
+
+class AdmissionMetricsDict(typing.TypedDict):
+    inflight: typing.Annotated[int, "Jobs currently admitted"]
+    queued: typing.Annotated[dict[Priority, int], "Jobs waiting per class"]
+    admitted: typing.Annotated[dict[Priority, int], "Jobs admitted per class"]
+    wait_ms: typing.Annotated[
+        dict[Priority, float], "Mean time admitted requests waited per class"
+    ]
+    max_wait_ms: typing.Annotated[
+        dict[Priority, float], "Longest time an admitted request waited per class"
+    ]
+
+
+class EndpointAdmission:
+    def __init__(self, max_inflight: int):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.waiters: dict[Priority, typing.Deque[asyncio.Future[None]]] = {
+            priority: collections.deque() for priority in PRIORITIES
+        }
+        self.admitted = {priority: 0 for priority in PRIORITIES}
+        self.waited = {priority: 0.0 for priority in PRIORITIES}
+        self.max_waited = {priority: 0.0 for priority in PRIORITIES}
+
+    def free(self, priority: Priority) -> bool:
+        """Whether a `priority` request may take a slot without queueing."""
+        return self.inflight < self.max_inflight and not any(
+            self.waiters[other]
+            for other in PRIORITIES[: PRIORITIES.index(priority) + 1]
+        )
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self.wake()
+
+    def wake(self) -> None:
+        # interactive waiters are always admitted before batch waiters
+        for priority in PRIORITIES:
+            waiters = self.waiters[priority]
+            while waiters and self.inflight < self.max_inflight:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.inflight += 1
+                    waiter.set_result(None)
+
+    def metrics(self) -> AdmissionMetricsDict:
+        return AdmissionMetricsDict(
+            inflight=self.inflight,
+            queued={
+                priority: sum(not waiter.done() for waiter in self.waiters[priority])
+                for priority in PRIORITIES
+            },
+            admitted=dict(self.admitted),
+            wait_ms={
+                priority: (
+                    round(self.waited[priority] * 1000 / self.admitted[priority], 3)
+                    if self.admitted[priority]
+                    else 0.0
+                )
+                for priority in PRIORITIES
+            },
+            max_wait_ms={
+                priority: round(self.max_waited[priority] * 1000, 3)
+                for priority in PRIORITIES
+            },
+        )
+
+
+class AdmissionController:
+    """
+    Caps the jobs a client has in flight per endpoint. A batched job takes one
+    slot however many requests it carries.
+
+    Requests over the limit wait in one FIFO queue per priority class and a
+    freed slot always goes to the oldest interactive request before any batch
+    request. `admit` returns the callable that frees the slot again,
+    `try_admit` does the same without waiting for a slot.
+    """
+
+    endpoints: dict[str, EndpointAdmission]
+
+    def __init__(
+        self, max_inflight: int = 32, default_priority: Priority = "interactive"
+    ):
+        self.max_inflight = max_inflight
+        self.default_priority = default_priority
+        self.endpoints = {}
+
+    def endpoint(self, key: str) -> EndpointAdmission:
+        if key not in self.endpoints:
+            self.endpoints[key] = EndpointAdmission(self.max_inflight)
+        return self.endpoints[key]
+
+    async def admit(self, key: str, priority: Priority) -> typing.Callable[[], None]:
+        endpoint = self.endpoint(key)
+        started = time.perf_counter()
+        if endpoint.free(priority):
+            endpoint.inflight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            endpoint.waiters[priority].append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # the slot was handed over just as the request gave up
+                    endpoint.release()
+                elif waiter in endpoint.waiters[priority]:
+                    endpoint.waiters[priority].remove(waiter)
+                raise
+        return self.admitted(endpoint, priority, time.perf_counter() - started)
+
+    def try_admit(
+        self, key: str, priority: Priority
+    ) -> typing.Optional[typing.Callable[[], None]]:
+        endpoint = self.endpoint(key)
+        if not endpoint.free(priority):
+            return None
+        endpoint.inflight += 1
+        return self.admitted(endpoint, priority, 0.0)
+
+    def admitted(
+        self, endpoint: EndpointAdmission, priority: Priority, waited: float
+    ) -> typing.Callable[[], None]:
+        endpoint.admitted[priority] += 1
+        endpoint.waited[priority] += waited
+        endpoint.max_waited[priority] = max(endpoint.max_waited[priority], waited)
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                endpoint.release()
+
+        return release
+
+    def metrics(self) -> dict[str, AdmissionMetricsDict]:
+        return {key: endpoint.metrics() for key, endpoint in self.endpoints.items()}
@@ -1,91 +1,736 @@
+import asyncio
+import itertools
+import time
 import httpx
 import typing
 from urllib.parse import urljoin
-from runpod_httpx_proxy.utils import stream_type_from_headers
+from runpod_httpx_proxy.utils import (
+    DEADLINE_HEADER,
+    copy_request,
+    deadline_from_headers,
+    has_unread_body,
+    stream_type_from_headers,
+)
+from runpod_httpx_proxy.codecs import BodyCodec, default_body_codec, loads
+from runpod_httpx_proxy.streams import FrameCursor
 from runpod_httpx_proxy.models import (
     StreamResponse,
     RunRequest,
+    endpoint_from_url,
+)
+from runpod_httpx_proxy.response_cache import (
+    ResponseCache,
+    ResponseCacheOptionsDict,
+    Send,
+)
+from runpod_httpx_proxy.offload import (
+    OffloadedBodyDict,
+    S3Offload,
+    is_offloaded_body,
+)
+from runpod_httpx_proxy.clients.batcher import BatchOptionsDict, RequestBatcher
+from runpod_httpx_proxy.clients.poll_scheduler import (
+    PollOptionsDict,
+    PollScheduler,
+)
+from runpod_httpx_proxy.clients.timings import JobTimer, TimingsHook
+from runpod_httpx_proxy.clients.admission import (
+    AdmissionController,
+    AdmissionOptionsDict,
+    Priority,
+)
+from runpod_httpx_proxy.clients.hedging import HedgeOptionsDict, Hedging
+from runpod_httpx_proxy.clients.job_stream import JobStream
+from runpod_httpx_proxy.clients.single_flight import (
+    SingleFlight,
+    SingleFlightOptionsDict,
+)
+from runpod_httpx_proxy.clients.endpoint_pool import (
+    EndpointPool,
+    EndpointPoolOptionsDict,
+)
+from runpod_httpx_proxy.clients.prefetch import (
+    PrefetchBuffer,
+    StreamPrefetchDict,
+    prefetch,
 )
 
-from runpod_httpx_proxy.types import JSON
+from runpod_httpx_proxy.types import JSON, HealthResponseDict, PolicyDict, Status
 
 P = typing.ParamSpec("P")
 
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+# requests of these stream types are never batched or sent to /runsync
+STREAMING_TYPES = ("text/event-stream", "application/x-ndjson", "chunked")
+# RunPod rejects policies below these
+MIN_TTL_MS = 10_000
+MIN_EXECUTION_TIMEOUT_MS = 5_000
+
 
 class AsyncClient(httpx.AsyncClient):
+    poll_scheduler: PollScheduler
+    stream_prefetch: typing.Optional[StreamPrefetchDict]
+    runsync: bool
+    codec: BodyCodec
+    stream_retries: int
+    batcher: typing.Optional[RequestBatcher]
+    offload: typing.Optional[S3Offload]
+    timings_hooks: typing.List[TimingsHook]
+    endpoint_pool: typing.Optional[EndpointPool]
+    admission: typing.Optional[AdmissionController]
+    job_timeout: typing.Optional[float]
+    hedging: typing.Optional[Hedging]
+    single_flight: typing.Optional[SingleFlight]
+    response_cache: typing.Optional[ResponseCache]
+
+    def __init__(
+        self,
+        *args: typing.Any,
+        poll_options: typing.Optional[PollOptionsDict] = None,
+        stream_prefetch: typing.Optional[StreamPrefetchDict] = None,
+        runsync: bool = False,
+        codec: BodyCodec = default_body_codec,
+        stream_retries: int = 3,
+        batching: typing.Optional[BatchOptionsDict] = None,
+        offload: typing.Optional[S3Offload] = None,
+        timings_hooks: typing.Sequence[TimingsHook] = (),
+        endpoints: typing.Optional[typing.Sequence[str]] = None,
+        endpoint_pool_options: typing.Optional[EndpointPoolOptionsDict] = None,
+        admission: typing.Optional[AdmissionOptionsDict] = None,
+        job_timeout: typing.Optional[float] = None,
+        hedging: typing.Optional[HedgeOptionsDict] = None,
+        single_flight: typing.Optional[SingleFlightOptionsDict] = None,
+        cache: typing.Optional[ResponseCacheOptionsDict] = None,
+        **kwargs: typing.Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.poll_scheduler = PollScheduler(self._send_poll, **(poll_options or {}))
+        self.stream_prefetch = stream_prefetch
+        self.runsync = runsync
+        self.codec = codec
+        self.stream_retries = stream_retries
+        self.batcher = (
+            RequestBatcher(self.send_batch_run_request, **batching)
+            if batching is not None
+            else None
+        )
+        self.offload = offload
+        self.timings_hooks = list(timings_hooks)
+        # requests to base_url are spread over these endpoints' base URLs
+        self.endpoint_pool = (
+            EndpointPool(endpoints, self.fetch_health, **(endpoint_pool_options or {}))
+            if endpoints
+            else None
+        )
+        self.admission = (
+            AdmissionController(**admission) if admission is not None else None
+        )
+        # seconds a caller waits for a job, the runpod_timeout extension of a
+        # request overrides it
+        self.job_timeout = job_timeout
+        self.hedging = Hedging(**hedging) if hedging is not None else None
+        self.single_flight = (
+            SingleFlight(**single_flight) if single_flight is not None else None
+        )
+        # private to this client, so answers to its credentials can be kept
+        self.response_cache = (
+            ResponseCache(**{"shared": False, **cache}) if cache is not None else None
+        )
+        self._background: set[asyncio.Task[None]] = set()
+
+    async def _send_poll(self, request: httpx.Request) -> httpx.Response:
+        if (timings := request.extensions.get("runpod_timings")) is not None:
+            timings["polls"] += 1
+        return await super().send(request)
+
+    async def fetch_health(self, base_url: str) -> HealthResponseDict:
+        response = await super().send(
+            self.build_request(method="GET", url=f"{base_url}/health")
+        )
+        response.raise_for_status()
+        return loads(response.content)
+
     async def send_run_request(
         self,
         request: RunRequest,
         stream: bool = False,
         *args: typing.Any,
+        source_request: typing.Optional[httpx.Request] = None,
         **kwargs: typing.Any,
     ):
+        timer = JobTimer(self.timings_hooks)
+        if "content-length" in request.headers:
+            timer.timings["bytes_sent"] = int(request.headers["content-length"])
         run_response = await super().send(
             request,
             *args,
             **kwargs,
         )
+        timer.mark("submit_ms")
         if run_response.status_code != 200:
             return run_response
-        job = run_response.json()
-        stream_request = self.build_request(method="POST", url=f"stream/{job['id']}")
-
-        async def wait_for_output() -> (
-            typing.Tuple[httpx.Response, dict[str, typing.Any]]
-        ):
-            stream_response = await super(AsyncClient, self).send(stream_request)
-            while stream_response.status_code == 200:
-                stream_response_content = stream_response.json()
-                if stream_response_content.get("status") == "IN_QUEUE":
-                    stream_response = await super(AsyncClient, self).send(
-                        stream_request
+        job = loads(run_response.content)
+        timer.timings["job_id"] = job["id"]
+        try:
+            return await self.receive_job_response(
+                request, run_response, job, timer, stream, source_request
+            )
+        except asyncio.CancelledError:
+            # the caller gave up, the job would otherwise run to completion
+            self.cancel_job(request.url, job["id"])
+            raise
+
+    async def receive_job_response(
+        self,
+        request: RunRequest,
+        run_response: httpx.Response,
+        job: dict[str, typing.Any],
+        timer: JobTimer,
+        stream: bool,
+        source_request: typing.Optional[httpx.Request],
+    ) -> httpx.Response:
+        stream_request = self.build_request(
+            method="POST",
+            url=urljoin(str(request.url), f"stream/{job['id']}"),
+            extensions={"runpod_timings": timer.timings},
+        )
+
+        async def wait_for_output(
+            status: Status,
+        ) -> typing.Tuple[httpx.Response, dict[str, typing.Any]]:
+            # polls are retried on transient failures, the cursor drops replays
+            for attempt in itertools.count():
+                try:
+                    stream_response, stream_response_content = (
+                        await self.poll_scheduler.poll(stream_request, status)
                     )
-                    continue
-                output = [
-                    item["output"] for item in stream_response_content.pop("stream")
-                ]
-                return stream_response, {**stream_response_content, "output": output}
-            return stream_response, {"output": [None]}
+                except httpx.TransportError:
+                    if attempt >= self.stream_retries:
+                        raise
+                else:
+                    if stream_response_content is not None:
+                        break
+                    if (
+                        attempt >= self.stream_retries
+                        or stream_response.status_code not in RETRYABLE_STATUS_CODES
+                    ):
+                        return stream_response, {"output": [None]}
+                await asyncio.sleep(self.poll_scheduler.min_interval * 2**attempt)
+            timer.observe(stream_response_content)
+            output = [
+                item["output"] for item in stream_response_content.pop("stream", [])
+            ]
+            return stream_response, {**stream_response_content, "output": output}
 
-        stream_response, stream_response_content = await wait_for_output()
+        if job.get("status") == "FAILED" or isinstance(job.get("output"), list):
+            # /runsync finished the job and returned its aggregated output
+            stream_response, stream_response_content = run_response, {
+                **job,
+                "output": list(job.get("output") or []),
+            }
+            timer.observe(job)
+        else:
+            stream_response, stream_response_content = await wait_for_output(
+                job.get("status", "IN_QUEUE")
+            )
 
         if stream_response.status_code != 200:
             return stream_response
-        stream_response_dict = stream_response_content["output"].pop(0)
+        if stream_response_content.get("status") == "FAILED":
+            raise Exception(stream_response_content.get("error"))
+        stream_response_dict = (
+            stream_response_content["output"].pop(0)
+            if stream_response_content["output"]
+            else None
+        )
         if stream_response_dict is None:
             raise Exception("No output in stream response")
-        stream_response_is_streaming = stream_type_from_headers(stream_response_dict)
+        timer.mark("first_output_ms")
+        timer.observe_worker(stream_response_dict.get("timings"))
+        stream_response_is_streaming = stream_type_from_headers(
+            stream_response_dict["headers"]
+        )
         if not stream_response_is_streaming:
-            return StreamResponse.from_response_dict(stream_response_dict)
+            offload = self.offload
+            response = timer.attach(
+                StreamResponse.from_response_dict(
+                    stream_response_dict,
+                    codec=self.codec,
+                    fetch=(
+                        (lambda body: timer.count(offload.fetch(body)))
+                        if offload is not None
+                        else None
+                    ),
+                    request=source_request,
+                )
+            )
+            if not is_offloaded_body(stream_response_dict.get("content")):
+                timer.received(len(response.content))
+                timer.finish()
+            elif not stream:
+                # offloaded bodies are fetched from the store here
+                await response.aread()
+            return response
+
+        cursor = FrameCursor(self.codec)
+        finished = False
+
+        async def next_output() -> dict[str, typing.Any]:
+            stream_response, content = await wait_for_output("IN_PROGRESS")
+            if stream_response.status_code != 200:
+                raise Exception(stream_response.text)
+            return content
+
+        async def recover_output() -> dict[str, typing.Any]:
+            # frames lost with a failed poll are replayed from the job's
+            # aggregated output once it has finished
+            status_request = self.build_request(
+                method="POST",
+                url=urljoin(str(request.url), f"status/{job['id']}"),
+                extensions={"runpod_timings": timer.timings},
+            )
+            status_response, content = await self.poll_scheduler.poll(
+                status_request, "IN_PROGRESS"
+            )
+            if content is None:
+                raise Exception(status_response.text)
+            timer.observe(content)
+            if content.get("status") != "COMPLETED":
+                return {**content, "output": []}
+            if not isinstance(content.get("output"), list):
+                raise Exception(
+                    f"Stream of job {job['id']} lost frames and the job has no "
+                    "aggregated output to recover them from"
+                )
+            return {
+                **content,
+                "output": [
+                    output
+                    for output in content["output"]
+                    if isinstance(output, dict) and "seq" in output
+                ],
+            }
+
+        async def read_output(
+            content: dict[str, typing.Any],
+        ) -> typing.Tuple[list[bytes], dict[str, typing.Any]]:
+            chunks, complete = cursor.read(content["output"])
+            if complete and not (
+                content["status"] == "COMPLETED" and cursor.missing_tail
+            ):
+                return chunks, content
+            content = await recover_output()
+            recovered, complete = cursor.read(content["output"])
+            if not complete or (
+                content["status"] == "COMPLETED" and cursor.missing_tail
+            ):
+                raise Exception(
+                    f"Stream of job {job['id']} is missing frame {cursor.next_seq}"
+                )
+            return chunks + recovered, content
+
+        def end_stream(content: dict[str, typing.Any]) -> None:
+            nonlocal finished
+            finished = True
+            timer.observe_worker(cursor.timings)
+            if content["status"] == "FAILED":
+                raise Exception(content["error"])
+            if cursor.truncated:
+                # the worker stopped forwarding the body at the deadline
+                raise httpx.ReadTimeout(
+                    "The job missed the request's deadline", request=source_request
+                )
+
+        async def stream_output(content: dict[str, typing.Any]):
+            while True:
+                chunks, content = await read_output(content)
+                for chunk in chunks:
+                    yield chunk
+                if content["status"] != "IN_PROGRESS":
+                    break
+                content = await next_output()
+            end_stream(content)
+
+        async def prefetch_output(buffer: PrefetchBuffer) -> None:
+            content = stream_response_content
+            while True:
+                # the next poll is in flight while this batch is being consumed
+                await buffer.writable()
+                chunks, content = await read_output(content)
+                pending = (
+                    asyncio.ensure_future(next_output())
+                    if content["status"] == "IN_PROGRESS"
+                    else None
+                )
+                try:
+                    await buffer.extend(chunks)
+                    if pending is None:
+                        break
+                    content = await pending
+                finally:
+                    if pending is not None:
+                        pending.cancel()
+            end_stream(content)
+
+        def cancel_unfinished() -> None:
+            if not finished:
+                # the reader closed the stream before the job ended
+                self.cancel_job(request.url, job["id"])
 
-        async def stream_output(stream_response_content: dict[str, typing.Any]):
-            while stream_response_content["status"] == "IN_PROGRESS":
-                for output in stream_response_content["output"]:
-                    yield output.encode("utf-8")
-                stream_response, stream_response_content = await wait_for_output()
-                if stream_response.status_code != 200:
-                    raise Exception(stream_response.text)
-            if stream_response_content["status"] == "FAILED":
-                raise Exception(stream_response_content["error"])
+        job_stream = JobStream(
+            timer.count(
+                prefetch(prefetch_output, **self.stream_prefetch)
+                if self.stream_prefetch is not None
+                else stream_output(stream_response_content)
+            )
+        )
+        job_stream.on_close(cancel_unfinished)
+        response = timer.attach(
+            httpx.Response(
+                status_code=stream_response_dict["status_code"],
+                headers=stream_response_dict["headers"],
+                request=source_request,
+                stream=job_stream,
+            )
+        )
+        if not stream:
+            await response.aread()
+        return response
 
-        del stream_response_dict["content"]
-        return httpx.Response(
-            **stream_response_dict,
-            content=stream_output(stream_response_content),
+    def cancel_job(self, run_url: httpx.URL, job_id: str) -> None:
+        """Cancel a job in the background, it may already have ended."""
+        task = asyncio.get_running_loop().create_task(
+            self._cancel_job(
+                self.build_request(
+                    method="POST", url=urljoin(str(run_url), f"cancel/{job_id}")
+                )
+            )
         )
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _cancel_job(self, request: httpx.Request) -> None:
+        try:
+            await super().send(request)
+        except httpx.HTTPError:
+            pass
+
+    async def send_batch_run_request(
+        self,
+        requests: typing.List[httpx.Request],
+        futures: typing.List[asyncio.Future[httpx.Response]],
+    ) -> None:
+        run_request = RunRequest.from_requests(
+            requests,
+            codec=self.codec,
+            policy=self.job_policy(*requests),
+            credential=self.headers.get("authorization"),
+        )
+        if self.admission is None:
+            await self.receive_batch(run_request, requests, futures)
+            return
+        # batches are keyed by endpoint and priority, the whole job takes one
+        # slot
+        base_url, _ = endpoint_from_url(requests[0].url)
+        release = await self.admission.admit(base_url, self.priority(requests[0]))
+        try:
+            await self.receive_batch(run_request, requests, futures)
+        finally:
+            release()
+
+    async def receive_batch(
+        self,
+        run_request: RunRequest,
+        requests: typing.List[httpx.Request],
+        futures: typing.List[asyncio.Future[httpx.Response]],
+    ) -> None:
+        run_response = await super().send(run_request)
+        if run_response.status_code != 200:
+            for future in futures:
+                future.set_result(run_response)
+            return
+        job = loads(run_response.content)
+        stream_request = self.build_request(
+            method="POST", url=urljoin(str(run_request.url), f"stream/{job['id']}")
+        )
+        status = job.get("status", "IN_QUEUE")
+        # the handler yields each response tagged with its request's index
+        while not all(future.done() for future in futures):
+            stream_response, content = await self.poll_scheduler.poll(
+                stream_request, status
+            )
+            if content is None:
+                raise Exception(stream_response.text)
+            for item in content.get("stream", []):
+                future = futures[item["output"]["index"]]
+                if not future.done():
+                    future.set_result(
+                        StreamResponse.from_response_dict(
+                            item["output"]["response"],
+                            codec=self.codec,
+                            request=requests[item["output"]["index"]],
+                        )
+                    )
+            status = content["status"]
+            if status == "FAILED":
+                raise Exception(content.get("error"))
+            if status != "IN_PROGRESS":
+                break
+
+    async def offload_request_body(
+        self, request: httpx.Request
+    ) -> typing.Optional[OffloadedBodyDict]:
+        if self.offload is None:
+            return None
+        if has_unread_body(request):
+            # spool streamed bodies to the store instead of the job payload
+            return await self.offload.upload(
+                typing.cast(typing.AsyncIterable[bytes], request.stream)
+            )
+        if len(request.content) >= self.offload.threshold:
+            return await self.offload.upload(request.content)
+        return None
 
     async def send(
         self,
         request: httpx.Request,
         *args: typing.Any,
+        stream: bool = False,
         **kwargs: typing.Any,
     ) -> httpx.Response:
         if str(request.url).startswith(str(self.base_url)):
-            request_stream_type = stream_type_from_headers(request.headers)
-            # TODO: handle streaming requests
-            if request_stream_type in ("text/event-stream", "application/x-ndjson"):
-                pass
-            request = RunRequest.from_request(request)
-            return await self.send_run_request(request, *args, **kwargs)
-
-        return await super().send(request, *args, **kwargs)
+            if self.single_flight is None and self.response_cache is None:
+                return await self.send_job(request, *args, stream=stream, **kwargs)
+            response = await self.send_shared(request, *args, stream=stream, **kwargs)
+            if not stream:
+                await response.aread()
+            return response
+
+        return await super().send(request, *args, stream=stream, **kwargs)
+
+    async def send_shared(
+        self,
+        request: httpx.Request,
+        *args: typing.Any,
+        stream: bool = False,
+        **kwargs: typing.Any,
+    ) -> httpx.Response:
+        # sent with the caller's stream flag, so a request that is not
+        # streamed keeps going through /runsync or a batch. Callers joining a
+        # streamed flight get the headers as soon as the first one does.
+        async def send_uncached(request: httpx.Request) -> httpx.Response:
+            return await self.send_job(request, *args, stream=stream, **kwargs)
+
+        async def send_cached(request: httpx.Request) -> httpx.Response:
+            assert self.response_cache is not None
+            return await self.response_cache.send(request, send_uncached)
+
+        send: Send = send_cached if self.response_cache is not None else send_uncached
+        if self.single_flight is not None:
+            return await self.single_flight.send(request, send)
+        return await send(request)
+
+    async def send_job(
+        self,
+        request: httpx.Request,
+        *args: typing.Any,
+        stream: bool = False,
+        **kwargs: typing.Any,
+    ) -> httpx.Response:
+        if self.endpoint_pool is not None:
+            return await self.send_pooled(request, *args, stream=stream, **kwargs)
+        return await self.send_admitted(request, *args, stream=stream, **kwargs)
+
+    async def send_pooled(
+        self,
+        request: httpx.Request,
+        *args: typing.Any,
+        stream: bool = False,
+        **kwargs: typing.Any,
+    ) -> httpx.Response:
+        assert self.endpoint_pool is not None
+        endpoint = self.endpoint_pool.choose()
+        _, path = endpoint_from_url(request.url)
+        # the caller's request keeps pointing at base_url, it may be sent again
+        routed = copy_request(request, url=f"{endpoint.base_url}{path}")
+        started = time.perf_counter()
+        try:
+            response = await self.send_admitted(routed, *args, stream=stream, **kwargs)
+        except asyncio.CancelledError:
+            # cancelled callers, lost hedges and timeouts are not the
+            # endpoint's fault
+            self.endpoint_pool.abandoned(endpoint)
+            raise
+        except BaseException:
+            self.endpoint_pool.failed(endpoint)
+            raise
+        if response.status_code == 429 or response.status_code >= 500:
+            self.endpoint_pool.failed(endpoint)
+        else:
+            execution_ms = response.extensions.get("runpod_timings", {}).get(
+                "execution_ms"
+            )
+            self.endpoint_pool.succeeded(
+                endpoint,
+                time.perf_counter() - started,
+                execution_ms / 1000 if execution_ms is not None else None,
+            )
+        return response
+
+    def priority(self, request: httpx.Request) -> Priority:
+        return request.extensions.get(
+            "runpod_priority",
+            (
+                self.admission.default_priority
+                if self.admission is not None
+                else "interactive"
+            ),
+        )
+
+    def deadline(self, request: httpx.Request) -> typing.Optional[float]:
+        timeout = request.extensions.get("runpod_timeout", self.job_timeout)
+        return time.time() + timeout if timeout is not None else None
+
+    def job_policy(self, *requests: httpx.Request) -> typing.Optional[PolicyDict]:
+        policy = PolicyDict()
+        if all(self.priority(request) == "batch" for request in requests):
+            policy["lowPriority"] = True
+        deadlines = [deadline_from_headers(request.headers) for request in requests]
+        if all(deadline is not None for deadline in deadlines):
+            # the job is dropped once the last caller has stopped waiting
+            remaining_ms = int(
+                (max(typing.cast(typing.List[float], deadlines)) - time.time()) * 1000
+            )
+            policy["ttl"] = max(MIN_TTL_MS, remaining_ms)
+            policy["executionTimeout"] = max(MIN_EXECUTION_TIMEOUT_MS, remaining_ms)
+        return policy or None
+
+    async def before_deadline(
+        self,
+        response: typing.Awaitable[httpx.Response],
+        request: httpx.Request,
+        deadline: typing.Optional[float],
+    ) -> httpx.Response:
+        if deadline is None:
+            return await response
+        try:
+            return await asyncio.wait_for(response, deadline - time.time())
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout(
+                "The job missed the request's deadline", request=request
+            ) from None
+
+    async def send_admitted(
+        self,
+        request: httpx.Request,
+        *args: typing.Any,
+        stream: bool = False,
+        **kwargs: typing.Any,
+    ) -> httpx.Response:
+        if self.admission is None or self.is_batched(request, stream):
+            # a batched job takes one slot for all of its requests, see
+            # send_batch_run_request
+            return await self.send_proxied(request, *args, stream=stream, **kwargs)
+        base_url, _ = endpoint_from_url(request.url)
+        release = await self.admission.admit(base_url, self.priority(request))
+        try:
+            response = await self.send_proxied(request, *args, stream=stream, **kwargs)
+        except BaseException:
+            release()
+            raise
+        if isinstance(response.stream, JobStream) and not response.is_closed:
+            # the job holds its slot until its streamed body is done
+            response.stream.on_close(release)
+        else:
+            release()
+        return response
+
+    def is_batched(self, request: httpx.Request, stream: bool = False) -> bool:
+        """Whether `request` is sent as one input of a batched job."""
+        if self.batcher is None or stream or has_unread_body(request):
+            return False
+        if stream_type_from_headers(request.headers) in STREAMING_TYPES:
+            return False
+        # offloaded bodies are sent in a job of their own
+        return self.offload is None or len(request.content) < self.offload.threshold
+
+    async def send_proxied(
+        self,
+        request: httpx.Request,
+        *args: typing.Any,
+        stream: bool = False,
+        **kwargs: typing.Any,
+    ) -> httpx.Response:
+        request_stream_type = stream_type_from_headers(request.headers)
+        is_streaming = stream or request_stream_type in STREAMING_TYPES
+        # streamed request bodies are sent as ordered chunks of the job
+        # input, see RunRequest.from_request
+        is_streaming_upload = has_unread_body(request)
+        deadline = self.deadline(request)
+        if deadline is not None:
+            # the worker refuses and cuts short work for expired requests. The
+            # header goes into the job input through a copy, the caller's
+            # request may be sent again with a deadline of its own
+            request = copy_request(
+                request, headers={DEADLINE_HEADER: f"{deadline:.3f}"}
+            )
+        if self.is_batched(request, stream):
+            assert self.batcher is not None
+            base_url, _ = endpoint_from_url(request.url)
+            return await self.before_deadline(
+                self.batcher.submit(f"{base_url} {self.priority(request)}", request),
+                request,
+                deadline,
+            )
+        offloaded = await self.offload_request_body(request)
+        use_runsync = self.runsync and not is_streaming
+
+        def attempt() -> typing.Awaitable[httpx.Response]:
+            run_request = RunRequest.from_request(
+                request,
+                route="runsync" if use_runsync else "run",
+                codec=self.codec,
+                s3_config=self.offload.s3_config if self.offload is not None else None,
+                policy=self.job_policy(request),
+                credential=self.headers.get("authorization"),
+                **({"content": offloaded} if offloaded is not None else {}),
+            )
+            return self.send_run_request(
+                run_request, stream, *args, source_request=request, **kwargs
+            )
+
+        hedging = self.hedging
+        # a streamed body can only be sent once
+        if hedging is not None and not is_streaming_upload and hedging.applies(request):
+            base_url, _ = endpoint_from_url(request.url)
+            admission = self.admission
+            reserve = (
+                (lambda: admission.try_admit(base_url, self.priority(request)))
+                if admission is not None
+                else None
+            )
+            return await self.before_deadline(
+                hedging.send(attempt, reserve), request, deadline
+            )
+        return await self.before_deadline(attempt(), request, deadline)
+
+    async def close_jobs(self) -> None:
+        # pending job cancellations still need the transport
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        self.poll_scheduler.close()
+        if self.endpoint_pool is not None:
+            self.endpoint_pool.close()
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.offload is not None:
+            await self.offload.aclose()
+
+    async def aclose(self) -> None:
+        await self.close_jobs()
+        await super().aclose()
+
+    async def __aexit__(self, *args: typing.Any) -> None:
+        # httpx closes the transport here without calling aclose
+        await self.close_jobs()
+        await super().__aexit__(*args)
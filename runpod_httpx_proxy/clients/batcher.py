@@ -0,0 +1,92 @@
+import asyncio
+import typing
+
+import httpx
+
+SendBatch = typing.Callable[
+    [typing.List[httpx.Request], typing.List["asyncio.Future[httpx.Response]"]],
+    typing.Awaitable[None],
+]
+
+
+class BatchOptionsDict(typing.TypedDict, total=False):
+    max_size: typing.Annotated[int, "Requests per job before the batch is sent"]
+    max_wait: typing.Annotated[
+        float, "Seconds the first request of a batch waits for company"
+    ]
+
+
+class RequestBatcher:
+    """
+    Collects requests per endpoint and hands them to `send_batch` as one batch
+    once `max_size` requests are waiting or the oldest has waited `max_wait`
+    seconds. `send_batch` resolves each request's future with its response.
+    """
+
+    def __init__(
+        self, send_batch: SendBatch, max_size: int = 16, max_wait: float = 0.005
+    ):
+        self.send_batch = send_batch
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending: dict[
+            str,
+            typing.List[typing.Tuple[httpx.Request, asyncio.Future[httpx.Response]]],
+        ] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def submit(
+        self, key: str, request: httpx.Request
+    ) -> asyncio.Future[httpx.Response]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[httpx.Response] = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((request, future))
+        if len(batch) >= self.max_size:
+            self.flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait, self.flush, key)
+        return future
+
+    def flush(self, key: str) -> None:
+        if (timer := self._timers.pop(key, None)) is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(
+            self._send(
+                [request for request, _ in batch], [future for _, future in batch]
+            )
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def close(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for batch in self._pending.values():
+            for _, future in batch:
+                future.cancel()
+        self._pending.clear()
+        for task in self._tasks:
+            task.cancel()
+
+    async def _send(
+        self,
+        requests: typing.List[httpx.Request],
+        futures: typing.List[asyncio.Future[httpx.Response]],
+    ) -> None:
+        try:
+            await self.send_batch(requests, futures)
+        except BaseException as exc:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+        for future in futures:
+            if not future.done():
+                future.set_exception(Exception("No output for request in batch"))
@@ -0,0 +1,190 @@
+import asyncio
+import itertools
+import time
+import typing
+
+from runpod_httpx_proxy.types import HealthResponseDict
+
+FetchHealth = typing.Callable[[str], typing.Awaitable[HealthResponseDict]]
+
+
+class EndpointPoolOptionsDict(typing.TypedDict, total=False):
+    health_interval: typing.Annotated[
+        float, "Seconds before an endpoint's /health snapshot is refreshed"
+    ]
+    failure_threshold: typing.Annotated[
+        int, "Consecutive failures that open an endpoint's circuit"
+    ]
+    recovery_time: typing.Annotated[
+        float, "Seconds an open circuit waits before letting a trial job through"
+    ]
+    smoothing: typing.Annotated[float, "Weight of the newest latency sample"]
+
+
+class Endpoint:
+    base_url: str
+    health: typing.Optional[HealthResponseDict]
+    health_at: typing.Optional[float]
+    latency: typing.Optional[float]
+    execution: typing.Optional[float]
+    inflight: int
+    failures: int
+    open_until: typing.Optional[float]
+    trial: bool
+    jobs: int
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.health = None
+        self.health_at = None
+        self.latency = None
+        self.execution = None
+        self.inflight = 0
+        self.failures = 0
+        self.open_until = None
+        self.trial = False
+        self.jobs = 0
+
+    def available(self, now: float) -> bool:
+        if self.open_until is None:
+            return True
+        # half open: one trial job at a time once the recovery time is over
+        return now >= self.open_until and not self.trial
+
+    def expected_wait(self) -> float:
+        """Seconds a job sent now is expected to take until its first output."""
+        latency = self.latency or 0.0
+        if self.health is None:
+            return latency
+        jobs = self.health["jobs"]
+        workers = self.health["workers"]
+        capacity = workers.get("idle", 0) + workers.get("running", 0)
+        backlog = jobs.get("inQueue", 0) + self.inflight - workers.get("idle", 0)
+        service = self.execution if self.execution is not None else latency
+        return max(0, backlog) * service / max(1, capacity) + latency
+
+
+class EndpointPool:
+    """
+    Routes jobs across endpoints that serve the same model.
+
+    Each job goes to the available endpoint with the shortest expected wait,
+    estimated from its last `/health` snapshot, the jobs this client has in
+    flight there and the observed latency and execution time. Snapshots older
+    than `health_interval` are refreshed in the background as jobs are routed.
+    An endpoint whose circuit opened after `failure_threshold` consecutive
+    failures gets no jobs for `recovery_time` seconds, then a single trial job
+    that closes the circuit again on success.
+    """
+
+    endpoints: typing.List[Endpoint]
+
+    def __init__(
+        self,
+        base_urls: typing.Sequence[str],
+        fetch_health: typing.Optional[FetchHealth] = None,
+        health_interval: float = 5.0,
+        failure_threshold: int = 3,
+        recovery_time: float = 30.0,
+        smoothing: float = 0.2,
+    ):
+        if not base_urls:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = [Endpoint(base_url) for base_url in base_urls]
+        self.fetch_health = fetch_health
+        self.health_interval = health_interval
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.smoothing = smoothing
+        self._order = itertools.cycle(range(len(self.endpoints)))
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+
+    def choose(self) -> Endpoint:
+        now = time.monotonic()
+        self.refresh_stale(now)
+        # rotate the starting point so ties are spread round robin
+        start = next(self._order)
+        ordered = self.endpoints[start:] + self.endpoints[:start]
+        candidates = [endpoint for endpoint in ordered if endpoint.available(now)]
+        if candidates:
+            endpoint = min(candidates, key=Endpoint.expected_wait)
+        else:
+            # every circuit is open, try the one that has been open longest
+            endpoint = min(ordered, key=lambda endpoint: endpoint.open_until or 0.0)
+        if endpoint.open_until is not None:
+            endpoint.trial = True
+        endpoint.inflight += 1
+        endpoint.jobs += 1
+        return endpoint
+
+    def succeeded(
+        self,
+        endpoint: Endpoint,
+        latency: float,
+        execution: typing.Optional[float] = None,
+    ) -> None:
+        endpoint.inflight -= 1
+        endpoint.failures = 0
+        endpoint.open_until = None
+        endpoint.trial = False
+        endpoint.latency = self._smooth(endpoint.latency, latency)
+        if execution is not None:
+            endpoint.execution = self._smooth(endpoint.execution, execution)
+
+    def failed(self, endpoint: Endpoint) -> None:
+        endpoint.inflight -= 1
+        self._failure(endpoint)
+
+    def abandoned(self, endpoint: Endpoint) -> None:
+        """The caller gave up on the job, which says nothing about `endpoint`."""
+        endpoint.inflight -= 1
+        # an abandoned trial leaves the decision to the next one
+        endpoint.trial = False
+
+    def _failure(self, endpoint: Endpoint) -> None:
+        endpoint.failures += 1
+        if endpoint.trial or endpoint.failures >= self.failure_threshold:
+            endpoint.open_until = time.monotonic() + self.recovery_time
+        endpoint.trial = False
+
+    def _smooth(self, average: typing.Optional[float], sample: float) -> float:
+        if average is None:
+            return sample
+        return (1 - self.smoothing) * average + self.smoothing * sample
+
+    def refresh_stale(self, now: typing.Optional[float] = None) -> None:
+        if self.fetch_health is None:
+            return
+        now = time.monotonic() if now is None else now
+        for endpoint in self.endpoints:
+            if endpoint.base_url in self._tasks:
+                continue
+            if (
+                endpoint.health_at is not None
+                and now - endpoint.health_at < self.health_interval
+            ):
+                continue
+            task = asyncio.get_running_loop().create_task(self.refresh(endpoint))
+            self._tasks[endpoint.base_url] = task
+            task.add_done_callback(
+                lambda _, base_url=endpoint.base_url: self._tasks.pop(base_url, None)
+            )
+
+    async def refresh(self, endpoint: Endpoint) -> None:
+        assert self.fetch_health is not None
+        try:
+            health = await self.fetch_health(endpoint.base_url)
+        except Exception:
+            endpoint.health_at = time.monotonic()
+            self._failure(endpoint)
+            return
+        endpoint.health = health
+        endpoint.health_at = time.monotonic()
+
+    async def refresh_all(self) -> None:
+        await asyncio.gather(*(self.refresh(endpoint) for endpoint in self.endpoints))
+
+    def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
@@ -0,0 +1,167 @@
+import asyncio
+import collections
+import time
+import typing
+
+import httpx
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class HedgeOptionsDict(typing.TypedDict, total=False):
+    delay: typing.Annotated[
+        float, "Seconds without a response before a hedge is sent, else adaptive"
+    ]
+    percentile: typing.Annotated[
+        float, "Quantile of recent response latencies used as the adaptive delay"
+    ]
+    min_samples: typing.Annotated[int, "Latencies seen before hedging adaptively"]
+    window: typing.Annotated[int, "Recent latencies the adaptive delay is taken of"]
+    budget: typing.Annotated[float, "Largest fraction of requests that is hedged"]
+
+
+class HedgeMetricsDict(typing.TypedDict):
+    requests: typing.Annotated[int, "Requests eligible for hedging"]
+    hedged: typing.Annotated[int, "Requests a hedge was sent for"]
+    hedge_wins: typing.Annotated[int, "Hedged requests the hedge answered first"]
+    over_budget: typing.Annotated[int, "Hedges skipped because of the budget"]
+    no_capacity: typing.Annotated[
+        int, "Hedges skipped because admission had no free slot for them"
+    ]
+    delay_ms: typing.Annotated[
+        typing.Optional[float], "Current hedge delay, None while adaptive and warming"
+    ]
+
+
+class Hedging:
+    """
+    Sends a duplicate job for an idempotent request that has not been answered
+    after `delay` seconds, or after the `percentile` of recent response
+    latencies, and keeps whichever answers first. The other one is cancelled.
+
+    Hedges are paid for from a budget that grows by `budget` per request, so
+    at most that fraction of requests is ever hedged, even when the endpoint
+    is slow for everyone. A hedge also needs the slot `reserve` hands out,
+    when given, and is skipped if there is none, so hedged traffic stays
+    within the client's admission limit.
+    """
+
+    def __init__(
+        self,
+        delay: typing.Optional[float] = None,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+        budget: float = 0.05,
+    ):
+        self.fixed_delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies: typing.Deque[float] = collections.deque(maxlen=window)
+        self.budget = budget
+        # a handful of hedges may be saved up for a burst of slow requests
+        self.max_tokens = max(1.0, budget * 100)
+        self.tokens = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+        self.no_capacity = 0
+
+    @staticmethod
+    def applies(request: httpx.Request) -> bool:
+        if "runpod_idempotent" in request.extensions:
+            return bool(request.extensions["runpod_idempotent"])
+        return request.method in IDEMPOTENT_METHODS
+
+    def delay(self) -> typing.Optional[float]:
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def spend(self) -> bool:
+        if self.tokens < 1.0:
+            self.over_budget += 1
+            return False
+        self.tokens -= 1.0
+        self.hedged += 1
+        return True
+
+    async def send(
+        self,
+        attempt: typing.Callable[[], typing.Awaitable[httpx.Response]],
+        reserve: typing.Optional[
+            typing.Callable[[], typing.Optional[typing.Callable[[], None]]]
+        ] = None,
+    ) -> httpx.Response:
+        self.requests += 1
+        self.tokens = min(self.max_tokens, self.tokens + self.budget)
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(attempt())
+        tasks = {primary}
+        hedge: typing.Optional[asyncio.Future[httpx.Response]] = None
+        # frees the hedge's slot once the race is decided, the winner's job
+        # keeps the caller's slot
+        release: typing.Optional[typing.Callable[[], None]] = None
+        try:
+            delay = self.delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    release = reserve() if reserve is not None else lambda: None
+                    if release is None:
+                        self.no_capacity += 1
+                    elif self.spend():
+                        hedge = asyncio.ensure_future(attempt())
+                        tasks.add(hedge)
+            failure: typing.Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                # an attempt can be cancelled from within while the other
+                # one may still answer
+                answered = [
+                    task
+                    for task in done
+                    if not task.cancelled() and task.exception() is None
+                ]
+                if not answered:
+                    failure = failure or next(
+                        (task.exception() for task in done if not task.cancelled()),
+                        None,
+                    )
+                    continue
+                winner = primary if primary in answered else answered[0]
+                for task in answered:
+                    if task is not winner:
+                        # both answered at once, close the loser's stream
+                        await task.result().aclose()
+                if winner is hedge:
+                    self.hedge_wins += 1
+                self.latencies.append(time.perf_counter() - started)
+                return winner.result()
+            raise failure if failure is not None else asyncio.CancelledError()
+        finally:
+            if release is not None:
+                release()
+            for task in tasks:
+                # cancelling the loser cancels its job, see send_run_request
+                task.cancel()
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, httpx.Response):
+                    await result.aclose()
+
+    def metrics(self) -> HedgeMetricsDict:
+        delay = self.delay()
+        return HedgeMetricsDict(
+            requests=self.requests,
+            hedged=self.hedged,
+            hedge_wins=self.hedge_wins,
+            over_budget=self.over_budget,
+            no_capacity=self.no_capacity,
+            delay_ms=round(delay * 1000, 3) if delay is not None else None,
+        )
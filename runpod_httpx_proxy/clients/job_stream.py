@@ -0,0 +1,38 @@
+import inspect
+import typing
+
+import httpx
+
+OnClose = typing.Callable[[], typing.Union[None, typing.Awaitable[None]]]
+
+
+class JobStream(httpx.AsyncByteStream):
+    """
+    Body of a streamed job response. `on_close` callbacks run once, when the
+    body has been read to the end or the response is closed early.
+    """
+
+    def __init__(self, chunks: typing.AsyncIterable[bytes]):
+        self.chunks = chunks
+        self.callbacks: typing.List[OnClose] = []
+        self.closed = False
+
+    def on_close(self, callback: OnClose) -> None:
+        self.callbacks.append(callback)
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        async for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if (close := getattr(self.chunks, "aclose", None)) is not None:
+                await close()
+        finally:
+            for callback in self.callbacks:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
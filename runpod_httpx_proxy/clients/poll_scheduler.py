@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import itertools
+import typing
+
+import httpx
+
+from runpod_httpx_proxy.codecs import loads
+from runpod_httpx_proxy.types import Status
+
+SendPoll = typing.Callable[[httpx.Request], typing.Awaitable[httpx.Response]]
+PollResult = typing.Tuple[httpx.Response, typing.Optional[dict[str, typing.Any]]]
+
+
+class PollOptionsDict(typing.TypedDict, total=False):
+    min_interval: typing.Annotated[float, "Shortest delay between polls in seconds"]
+    max_interval: typing.Annotated[float, "Longest delay between polls in seconds"]
+    backoff: typing.Annotated[float, "Multiplier applied to the delay per empty poll"]
+    smoothing: typing.Annotated[
+        float, "Weight of the newest delayTime/executionTime sample"
+    ]
+
+
+class PollEntry:
+    request: httpx.Request
+    future: asyncio.Future[PollResult]
+    status: Status
+    attempts: int
+    phase_started: float
+
+    def __init__(
+        self,
+        request: httpx.Request,
+        future: asyncio.Future[PollResult],
+        status: Status,
+        now: float,
+    ):
+        self.request = request
+        self.future = future
+        self.status = status
+        self.attempts = 0
+        self.phase_started = now
+
+
+class PollScheduler:
+    """
+    Owns every outstanding `stream/{id}` poll of a client.
+
+    Polls are kept in a heap ordered by due time and driven by a single loop
+    timer, so idle jobs cost nothing between polls. A poll that comes back
+    without output is rescheduled with exponential backoff, stretched while in
+    the queue towards the observed `delayTime` and capped while running by the
+    observed `executionTime`. Anything else resolves the waiting future.
+    """
+
+    def __init__(
+        self,
+        send: SendPoll,
+        min_interval: float = 0.05,
+        max_interval: float = 2.0,
+        backoff: float = 1.5,
+        smoothing: float = 0.2,
+    ):
+        self.send = send
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.expected_delay: typing.Optional[float] = None
+        self.expected_execution: typing.Optional[float] = None
+        self.polls = 0
+        self._heap: list[tuple[float, int, PollEntry]] = []
+        self._counter = itertools.count()
+        self._timer: typing.Optional[asyncio.TimerHandle] = None
+        # polls being sent, with the entry each one answers
+        self._tasks: dict[asyncio.Task[None], PollEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap) + len(self._tasks)
+
+    def poll(
+        self, request: httpx.Request, status: Status = "IN_QUEUE"
+    ) -> asyncio.Future[PollResult]:
+        loop = asyncio.get_running_loop()
+        entry = PollEntry(request, loop.create_future(), status, loop.time())
+        # a running job that just produced output is likely to produce more
+        delay = 0.0 if status == "IN_PROGRESS" else self.interval(entry, loop.time())
+        self._push(entry, loop.time() + delay)
+        return entry.future
+
+    def interval(self, entry: PollEntry, now: float) -> float:
+        interval = self.min_interval * self.backoff**entry.attempts
+        if entry.status == "IN_QUEUE" and self.expected_delay is not None:
+            remaining = self.expected_delay - (now - entry.phase_started)
+            interval = max(interval, remaining / 2)
+        elif entry.status == "IN_PROGRESS" and self.expected_execution is not None:
+            interval = min(
+                interval, max(self.min_interval, self.expected_execution / 4)
+            )
+        return min(interval, self.max_interval)
+
+    def observe(self, content: dict[str, typing.Any]) -> None:
+        # RunPod reports both timings in milliseconds
+        if (delay_time := content.get("delayTime")) is not None:
+            self.expected_delay = self._smooth(self.expected_delay, delay_time / 1000)
+        if (execution_time := content.get("executionTime")) is not None:
+            self.expected_execution = self._smooth(
+                self.expected_execution, execution_time / 1000
+            )
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task, entry in self._tasks.items():
+            task.cancel()
+            entry.future.cancel()
+        self._tasks.clear()
+        for _, _, entry in self._heap:
+            entry.future.cancel()
+        self._heap.clear()
+
+    def _smooth(self, current: typing.Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def _push(self, entry: PollEntry, due: float) -> None:
+        heapq.heappush(self._heap, (due, next(self._counter), entry))
+        self._arm()
+
+    def _arm(self) -> None:
+        if not self._heap:
+            return
+        due = self._heap[0][0]
+        if self._timer is not None:
+            if self._timer.when() <= due:
+                return
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_at(due, self._fire)
+
+    def _fire(self) -> None:
+        self._timer = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, entry = heapq.heappop(self._heap)
+            if entry.future.done():
+                continue
+            task = loop.create_task(self._poll(entry))
+            self._tasks[task] = entry
+            task.add_done_callback(lambda task: self._tasks.pop(task, None))
+        self._arm()
+
+    async def _poll(self, entry: PollEntry) -> None:
+        self.polls += 1
+        try:
+            response = await self.send(entry.request)
+        except Exception as exc:
+            if not entry.future.done():
+                entry.future.set_exception(exc)
+            return
+        if entry.future.done():
+            return
+        if response.status_code != 200:
+            entry.future.set_result((response, None))
+            return
+        try:
+            content = loads(response.content)
+            if not isinstance(content, dict):
+                raise ValueError(f"expected a JSON object, got {type(content)}")
+        except ValueError as exc:
+            # e.g. an HTML error page from a proxy in front of the API
+            entry.future.set_exception(
+                httpx.DecodingError(
+                    f"unreadable poll response: {exc}", request=entry.request
+                )
+            )
+            return
+        self.observe(content)
+        status = content.get("status")
+        if status == "IN_QUEUE" or (
+            status == "IN_PROGRESS" and not content.get("stream")
+        ):
+            loop = asyncio.get_running_loop()
+            if status != entry.status:
+                entry.status = status
+                entry.attempts = 0
+                entry.phase_started = loop.time()
+            else:
+                entry.attempts += 1
+            self._push(entry, loop.time() + self.interval(entry, loop.time()))
+            return
+        entry.future.set_result((response, content))
@@ -0,0 +1,86 @@
+import asyncio
+import collections
+import typing
+
+
+class StreamPrefetchDict(typing.TypedDict, total=False):
+    max_chunks: typing.Annotated[int, "Buffered chunks before polling pauses"]
+    max_bytes: typing.Annotated[int, "Buffered bytes before polling pauses"]
+
+
+class PrefetchBuffer:
+    """
+    Bounded chunk buffer between a polling producer and a stream consumer.
+
+    The producer waits on `writable` before issuing its next poll, so once the
+    consumer falls `max_chunks` or `max_bytes` behind, polling pauses until it
+    catches up. A single poll batch may overshoot the budget.
+    """
+
+    chunks: collections.deque[bytes]
+    size: int
+
+    def __init__(self, max_chunks: int = 64, max_bytes: int = 1024 * 1024):
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.chunks = collections.deque()
+        self.size = 0
+        self._changed = asyncio.Condition()
+        self._done = False
+        self._error: typing.Optional[BaseException] = None
+
+    def is_full(self) -> bool:
+        return len(self.chunks) >= self.max_chunks or self.size >= self.max_bytes
+
+    async def writable(self) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: not self.is_full())
+
+    async def extend(self, chunks: typing.Iterable[bytes]) -> None:
+        async with self._changed:
+            for chunk in chunks:
+                self.chunks.append(chunk)
+                self.size += len(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: typing.Optional[BaseException] = None) -> None:
+        async with self._changed:
+            self._done = True
+            self._error = error
+            self._changed.notify_all()
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.chunks or self._done)
+                if not self.chunks:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                chunk = self.chunks.popleft()
+                self.size -= len(chunk)
+                self._changed.notify_all()
+            yield chunk
+
+
+async def prefetch(
+    produce: typing.Callable[[PrefetchBuffer], typing.Awaitable[None]],
+    max_chunks: int = 64,
+    max_bytes: int = 1024 * 1024,
+) -> typing.AsyncIterator[bytes]:
+    buffer = PrefetchBuffer(max_chunks=max_chunks, max_bytes=max_bytes)
+
+    async def run() -> None:
+        try:
+            await produce(buffer)
+        except Exception as exc:
+            await buffer.finish(exc)
+        else:
+            await buffer.finish()
+
+    task = asyncio.create_task(run())
+    try:
+        async for chunk in buffer:
+            yield chunk
+    finally:
+        task.cancel()
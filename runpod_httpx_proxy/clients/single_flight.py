@@ -0,0 +1,208 @@
+import asyncio
+import typing
+
+import httpx
+
+from runpod_httpx_proxy.response_cache import CachedResponse, Send, request_key
+from runpod_httpx_proxy.utils import has_unread_body
+
+
+class SingleFlightOptionsDict(typing.TypedDict, total=False):
+    methods: typing.Annotated[
+        typing.Collection[str], "Methods whose identical requests share one job"
+    ]
+    vary: typing.Annotated[
+        typing.Collection[str], "Headers that make otherwise identical requests differ"
+    ]
+
+
+class SingleFlightMetricsDict(typing.TypedDict):
+    leaders: typing.Annotated[int, "Requests sent on behalf of every identical caller"]
+    followers: typing.Annotated[int, "Requests answered by another caller's job"]
+    inflight: typing.Annotated[int, "Distinct requests in flight"]
+
+
+class Flight:
+    """
+    One request in flight and every caller waiting for it. A streamed body is
+    read from the job once and replayed from the start to each caller, so a
+    caller that joins late still sees the whole body.
+    """
+
+    def __init__(self, land: typing.Callable[[], None]):
+        self.land = land
+        self.task: typing.Optional[asyncio.Task[httpx.Response]] = None
+        self.waiters = 0
+        self.body: typing.Optional[typing.AsyncIterator[bytes]] = None
+        self.chunks: typing.List[bytes] = []
+        self.reading: typing.Optional[asyncio.Future[None]] = None
+        self.done = False
+        self.error: typing.Optional[BaseException] = None
+
+    async def lead(self, request: httpx.Request, send: Send) -> httpx.Response:
+        try:
+            response = await send(request)
+        except BaseException:
+            self.land()
+            raise
+        try:
+            response.content
+        except httpx.ResponseNotRead:
+            # raw chunks, the callers' responses decode them from the headers
+            self.body = response.aiter_raw()
+        else:
+            self.land()
+        return response
+
+    def response(self, request: httpx.Request) -> httpx.Response:
+        assert self.task is not None
+        leader = self.task.result()
+        if self.body is None:
+            response = CachedResponse(leader, 0.0).response(request)
+        else:
+            response = httpx.Response(
+                leader.status_code,
+                headers=leader.headers.multi_items(),
+                stream=FlightStream(self),
+                request=request,
+            )
+        response.extensions = {**leader.extensions}
+        return response
+
+    async def chunk(self, index: int) -> typing.Optional[bytes]:
+        while index >= len(self.chunks):
+            if self.error is not None:
+                raise self.error
+            if self.done:
+                return None
+            if self.reading is None:
+                self.reading = asyncio.ensure_future(self.read())
+            # a cancelled reader leaves the read to the others
+            await asyncio.wait({self.reading})
+        return self.chunks[index]
+
+    async def read(self) -> None:
+        assert self.body is not None
+        try:
+            self.chunks.append(await anext(self.body))
+        except StopAsyncIteration:
+            self.done = True
+            self.land()
+        except Exception as exc:
+            self.error = exc
+            self.land()
+        finally:
+            self.reading = None
+
+    async def release(self) -> None:
+        self.waiters -= 1
+        if self.waiters > 0:
+            return
+        assert self.task is not None
+        if not self.task.done():
+            # nobody is waiting any more, cancelling the send cancels the job
+            self.task.cancel()
+            return
+        if self.body is not None and not self.done:
+            self.done = True
+            self.land()
+            if self.reading is not None:
+                self.reading.cancel()
+                await asyncio.gather(self.reading, return_exceptions=True)
+            if not self.task.cancelled() and self.task.exception() is None:
+                await self.task.result().aclose()
+
+
+class FlightStream(httpx.AsyncByteStream):
+    def __init__(self, flight: Flight):
+        self.flight = flight
+        self.closed = False
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        index = 0
+        while (chunk := await self.flight.chunk(index)) is not None:
+            yield chunk
+            index += 1
+
+    async def aclose(self) -> None:
+        if not self.closed:
+            self.closed = True
+            await self.flight.release()
+
+
+class SingleFlight:
+    """
+    Coalesces identical requests that are in flight at the same time into a
+    single job, and answers every caller with its result, including streamed
+    responses.
+
+    Requests are identical when their method, path and query, `vary` headers
+    and body are. Only `methods` are coalesced, a request's
+    `runpod_idempotent` extension overrides its method either way. The job
+    is only cancelled once every caller has gone away.
+    """
+
+    def __init__(
+        self,
+        methods: typing.Collection[str] = ("GET", "HEAD"),
+        vary: typing.Collection[str] = (
+            "accept",
+            "accept-encoding",
+            "authorization",
+            "content-type",
+        ),
+    ):
+        self.methods = frozenset(method.upper() for method in methods)
+        self.vary = tuple(sorted(header.lower() for header in vary))
+        self.flights: typing.Dict[str, Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def key(self, request: httpx.Request) -> typing.Optional[str]:
+        if has_unread_body(request):
+            return None
+        if "runpod_idempotent" in request.extensions:
+            if not request.extensions["runpod_idempotent"]:
+                return None
+        elif request.method not in self.methods:
+            return None
+        return request_key(request, self.vary)
+
+    async def send(self, request: httpx.Request, send: Send) -> httpx.Response:
+        key = self.key(request)
+        if key is None:
+            return await send(request)
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.takeoff(key, request, send)
+            self.leaders += 1
+        else:
+            self.followers += 1
+        flight.waiters += 1
+        assert flight.task is not None
+        try:
+            await asyncio.shield(flight.task)
+            response = flight.response(request)
+        except BaseException:
+            await flight.release()
+            raise
+        if flight.body is None:
+            await flight.release()
+        return response
+
+    def takeoff(self, key: str, request: httpx.Request, send: Send) -> Flight:
+        def land() -> None:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+        flight = Flight(land)
+        flight.task = asyncio.ensure_future(flight.lead(request, send))
+        self.flights[key] = flight
+        return flight
+
+    def metrics(self) -> SingleFlightMetricsDict:
+        return SingleFlightMetricsDict(
+            leaders=self.leaders,
+            followers=self.followers,
+            inflight=len(self.flights),
+        )
@@ -0,0 +1,119 @@
+import time
+import typing
+
+import httpx
+
+from runpod_httpx_proxy.models import WorkerTimingsDict
+
+
+class JobTimingsDict(typing.TypedDict, total=False):
+    job_id: typing.Annotated[str, "Id of the job that served the request"]
+    submit_ms: typing.Annotated[float, "Until /run or /runsync answered"]
+    delay_ms: typing.Annotated[
+        int, "Server reported delayTime, queue wait including any cold start"
+    ]
+    execution_ms: typing.Annotated[int, "Server reported executionTime"]
+    worker_headers_ms: typing.Annotated[
+        float, "Until the app on the worker sent its response headers"
+    ]
+    worker_last_byte_ms: typing.Annotated[
+        float, "Until the app on the worker sent its last body byte"
+    ]
+    worker_startup_ms: typing.Annotated[
+        float, "Waited for the app on a cold worker to start up and warm up"
+    ]
+    first_output_ms: typing.Annotated[float, "Until the response head arrived"]
+    poll_overhead_ms: typing.Annotated[
+        float, "Part of first_output_ms not explained by the phases before it"
+    ]
+    first_byte_ms: typing.Annotated[float, "Until the first body byte was read"]
+    total_ms: typing.Annotated[float, "Until the body was read to the end"]
+    polls: typing.Annotated[int, "stream/ and status/ polls sent for the job"]
+    bytes_sent: typing.Annotated[int, "Size of the job payload, when known"]
+    bytes_received: typing.Annotated[int, "Body bytes handed to the reader"]
+
+
+TimingsHook = typing.Callable[[httpx.Response, JobTimingsDict], None]
+
+
+class JobTimer:
+    """
+    Collects the timings of one proxied request, all measured from the moment
+    the job was submitted. The timings dict is shared with
+    `response.extensions["runpod_timings"]` and handed to every hook once the
+    body has been read.
+    """
+
+    timings: JobTimingsDict
+    response: typing.Optional[httpx.Response]
+
+    def __init__(self, hooks: typing.Sequence[TimingsHook] = ()):
+        self.hooks = hooks
+        self.started = time.perf_counter()
+        self.timings = JobTimingsDict(polls=0, bytes_received=0)
+        self.response = None
+        self.finished = False
+
+    def elapsed(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+    def mark(self, phase: str) -> None:
+        typing.cast(dict[str, typing.Any], self.timings).setdefault(
+            phase, self.elapsed()
+        )
+
+    def observe(self, content: typing.Mapping[str, typing.Any]) -> None:
+        """Fold in the server reported timings of a job status payload."""
+        if content.get("delayTime") is not None:
+            self.timings["delay_ms"] = content["delayTime"]
+        if content.get("executionTime") is not None:
+            self.timings["execution_ms"] = content["executionTime"]
+
+    def observe_worker(self, timings: typing.Optional[WorkerTimingsDict]) -> None:
+        if not timings:
+            return
+        if "headers_ms" in timings:
+            self.timings["worker_headers_ms"] = timings["headers_ms"]
+        if "last_byte_ms" in timings:
+            self.timings["worker_last_byte_ms"] = timings["last_byte_ms"]
+        if "startup_ms" in timings:
+            self.timings["worker_startup_ms"] = timings["startup_ms"]
+
+    def received(self, size: int) -> None:
+        if size:
+            self.mark("first_byte_ms")
+        self.timings["bytes_received"] += size
+
+    def attach(self, response: httpx.Response) -> httpx.Response:
+        self.response = response
+        response.extensions["runpod_timings"] = self.timings
+        return response
+
+    def finish(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.mark("total_ms")
+        timings = self.timings
+        if "first_output_ms" in timings and "submit_ms" in timings:
+            explained = (
+                timings["submit_ms"]
+                + timings.get("delay_ms", 0)
+                + timings.get("worker_startup_ms", 0)
+                + timings.get("worker_headers_ms", 0)
+            )
+            timings["poll_overhead_ms"] = round(
+                max(0.0, timings["first_output_ms"] - explained), 3
+            )
+        if self.response is not None:
+            for hook in self.hooks:
+                hook(self.response, timings)
+
+    async def count(
+        self, chunks: typing.AsyncIterable[bytes]
+    ) -> typing.AsyncIterator[bytes]:
+        """Pass `chunks` through, finishing the timings once they run out."""
+        async for chunk in chunks:
+            self.received(len(chunk))
+            yield chunk
+        self.finish()
@@ -0,0 +1,112 @@
+import base64
+import gzip
+import json
+import typing
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+try:
+    # Python 3.14 and newer versions
+    from compression import zstd  # type: ignore
+except ImportError:
+    try:
+        from backports import zstd  # type: ignore
+    except ImportError:
+        zstd = None
+
+
+Buffer = typing.Union[bytes, bytearray, memoryview]
+BodyEncoding = typing.Literal["base64", "gzip", "zstd"]
+Compression = typing.Literal["gzip", "zstd"]
+
+
+class EncodedBodyDict(typing.TypedDict):
+    encoding: typing.Annotated[BodyEncoding, "How data was encoded"]
+    data: typing.Annotated[str, "Base64 of the (compressed) body"]
+
+
+EncodedBody = typing.Annotated[
+    typing.Union[str, EncodedBodyDict, None],
+    "UTF-8 text as is, anything else as an EncodedBodyDict",
+]
+
+
+class BodyCodec:
+    """
+    Encodes request and response bodies into JSON-safe job payloads.
+
+    Valid UTF-8 passes through as a plain string, which is also what older
+    handlers and clients send. Anything else is base64 encoded, and bodies of at
+    least `compress_threshold` bytes are compressed first when `compression` is
+    set. Decoding only looks at the payload, so any codec decodes the output of
+    any other.
+    """
+
+    def __init__(
+        self,
+        compression: typing.Optional[Compression] = None,
+        compress_threshold: int = 64 * 1024,
+        compress_level: typing.Optional[int] = None,
+    ):
+        if compression == "zstd" and zstd is None:
+            raise ValueError("zstd compression requires Python 3.14 or backports.zstd")
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def compress(self, data: memoryview) -> bytes:
+        if self.compression == "zstd":
+            return zstd.compress(data, self.compress_level)
+        return gzip.compress(
+            data, 6 if self.compress_level is None else self.compress_level
+        )
+
+    def encode(self, data: Buffer) -> EncodedBody:
+        view = memoryview(data)
+        if self.compression is not None and view.nbytes >= self.compress_threshold:
+            return EncodedBodyDict(
+                encoding=self.compression,
+                data=base64.b64encode(self.compress(view)).decode("ascii"),
+            )
+        try:
+            return str(view, "utf-8")
+        except UnicodeDecodeError:
+            return EncodedBodyDict(
+                encoding="base64", data=base64.b64encode(view).decode("ascii")
+            )
+
+    def decode(self, body: EncodedBody) -> bytes:
+        if body is None:
+            return b""
+        if isinstance(body, str):
+            return body.encode("utf-8")
+        encoding = body["encoding"]
+        data = base64.b64decode(body["data"])
+        if encoding == "base64":
+            return data
+        if encoding == "gzip":
+            return gzip.decompress(data)
+        if encoding == "zstd":
+            if zstd is None:
+                raise ValueError("zstd body received but zstd is not available")
+            return zstd.decompress(data)
+        raise ValueError(f"Unsupported body encoding: {encoding}")
+
+
+default_body_codec = BodyCodec()
+
+
+def dumps(obj: typing.Any) -> bytes:
+    """Serialize a job payload, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: typing.Union[bytes, str]) -> typing.Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,149 @@
+import asyncio
+import typing
+
+import httpx
+from httpx._transports.asgi import _ASGIApp  # type: ignore
+
+_Message = typing.MutableMapping[str, typing.Any]
+
+
+class ASGIAppStream(httpx.AsyncByteStream):
+    """
+    Body of a response the app is still sending. Closing it disconnects the
+    client and cancels the app.
+    """
+
+    def __init__(
+        self,
+        chunks: "asyncio.Queue[typing.Optional[bytes]]",
+        app: "asyncio.Task[None]",
+        disconnected: asyncio.Event,
+    ):
+        self.chunks = chunks
+        self.app = app
+        self.disconnected = disconnected
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        while True:
+            if self.app.done() and self.chunks.empty():
+                # an app that failed after its headers fails the body read
+                self.app.result()
+                return
+            get = asyncio.ensure_future(self.chunks.get())
+            try:
+                await asyncio.wait({get, self.app}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not get.done():
+                    get.cancel()
+            if not get.done() or get.cancelled():
+                continue
+            chunk = get.result()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def aclose(self) -> None:
+        self.disconnected.set()
+        if not self.app.done():
+            self.app.cancel()
+        await asyncio.gather(self.app, return_exceptions=True)
+
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    """
+    Sends requests straight to an ASGI app like `httpx.ASGITransport`, but
+    returns the response as soon as the app has sent its headers and streams
+    the body while the app is still producing it. At most `max_buffered` body
+    messages are held before the app is made to wait for the reader. Every
+    request gets a copy of the lifespan `state`.
+    """
+
+    def __init__(
+        self,
+        app: _ASGIApp,
+        root_path: str = "",
+        client: typing.Tuple[str, int] = ("127.0.0.1", 123),
+        max_buffered: int = 64,
+        state: typing.Optional[dict[str, typing.Any]] = None,
+    ):
+        self.app = app
+        self.root_path = root_path
+        self.client = client
+        self.max_buffered = max_buffered
+        self.state = state
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        assert isinstance(request.stream, httpx.AsyncByteStream)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "headers": [(k.lower(), v) for (k, v) in request.headers.raw],
+            "scheme": request.url.scheme,
+            "path": request.url.path,
+            "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query,
+            "server": (request.url.host, request.url.port),
+            "client": self.client,
+            "root_path": self.root_path,
+        }
+        if self.state is not None:
+            scope["state"] = self.state.copy()
+        request_body_chunks = request.stream.__aiter__()
+        request_complete = False
+        loop = asyncio.get_running_loop()
+        head: asyncio.Future[typing.Tuple[int, typing.Any]] = loop.create_future()
+        chunks: asyncio.Queue[typing.Optional[bytes]] = asyncio.Queue(self.max_buffered)
+        disconnected = asyncio.Event()
+
+        async def receive() -> dict[str, typing.Any]:
+            nonlocal request_complete
+            if request_complete:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            try:
+                body = await request_body_chunks.__anext__()
+            except StopAsyncIteration:
+                request_complete = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.request", "body": body, "more_body": True}
+
+        async def send(message: _Message) -> None:
+            if message["type"] == "http.response.start":
+                head.set_result((message["status"], message.get("headers", [])))
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if body and request.method != "HEAD":
+                    await chunks.put(body)
+                if not message.get("more_body", False):
+                    await chunks.put(None)
+
+        async def run() -> None:
+            try:
+                await self.app(scope, receive, send)
+            except asyncio.CancelledError:
+                if not head.done():
+                    head.cancel()
+                raise
+            except Exception as exc:
+                if head.done():
+                    raise
+                # raised from handle_async_request instead
+                head.set_exception(exc)
+
+        app = loop.create_task(run())
+        try:
+            await asyncio.wait({head, app}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            app.cancel()
+            raise
+        if not head.done():
+            app.result()
+            raise RuntimeError("ASGI app returned without sending a response")
+        status_code, headers = head.result()
+        return httpx.Response(
+            status_code,
+            headers=headers,
+            stream=ASGIAppStream(chunks, app, disconnected),
+        )
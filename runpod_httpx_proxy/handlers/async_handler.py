@@ -1,29 +1,174 @@
 from typing import AsyncGenerator
+import asyncio
+import time
 import typing
 from httpx._transports.asgi import _ASGIApp  # type: ignore i'm not sure why this is not exported by httpx
 import httpx
 
 
 from runpod_httpx_proxy.models import (
+    BatchResponseDict,
     RequestDict,
     ResponseDict,
+    WorkerTimingsDict,
     request_from_request_dict,
     response_dict_from_response,
 )
 from runpod import RunPodLogger
-from runpod_httpx_proxy.utils import stream_type_from_headers
+from runpod_httpx_proxy.codecs import BodyCodec, default_body_codec
+from runpod_httpx_proxy.handlers.asgi_transport import StreamingASGITransport
+from runpod_httpx_proxy.handlers.concurrency import AdaptiveConcurrency
+from runpod_httpx_proxy.handlers.lifespan import Lifespan
+from runpod_httpx_proxy.response_cache import ResponseCache
+from runpod_httpx_proxy.offload import S3Offload
+from runpod_httpx_proxy.streams import (
+    CoalesceOptionsDict,
+    StreamFrameDict,
+    coalesce,
+    frame,
+    split_lines,
+    until,
+)
+from runpod_httpx_proxy.utils import deadline_from_headers, stream_type_from_headers
 from runpod_httpx_proxy.types import JobDict
 
 
 logger = RunPodLogger()
 
+T = typing.TypeVar("T")
+
+
+def async_handler(
+    app: _ASGIApp,
+    codec: BodyCodec = default_body_codec,
+    coalesce_options: typing.Optional[CoalesceOptionsDict] = None,
+    offload: typing.Optional[S3Offload] = None,
+    cache: typing.Optional[ResponseCache] = None,
+    concurrency: typing.Optional[AdaptiveConcurrency] = None,
+    lifespan: typing.Optional[Lifespan] = None,
+):
+    if concurrency is not None:
+        # measures the app for the worker's concurrency_modifier
+        app = concurrency.wrap(app)
+    # the app is started once, by the first job unless the caller does sooner
+    lifespan = lifespan if lifespan is not None else Lifespan()
+    client = httpx.AsyncClient(
+        transport=StreamingASGITransport(app, state=lifespan.state)
+    )
+
+    async def send(request: httpx.Request) -> httpx.Response:
+        # repeated requests are answered from the cache without the app
+        if cache is not None:
+            return await cache.send(
+                request, lambda request: client.send(request, stream=True)
+            )
+        return await client.send(request, stream=True)
+
+    lifespan.attach(app, send)
+    job_offloads: dict[typing.Tuple[str, str, str], S3Offload] = {}
+
+    def offload_for_job(job: JobDict) -> typing.Optional[S3Offload]:
+        # without a configured store, bodies go to the bucket the job names
+        s3_config = job.get("s3Config")
+        if offload is not None or not s3_config:
+            return offload
+        key = (
+            s3_config["endpointUrl"],
+            s3_config["bucketName"],
+            s3_config["accessId"],
+        )
+        if key not in job_offloads:
+            job_offloads[key] = S3Offload(s3_config)
+        return job_offloads[key]
+
+    async def encode_content(
+        response: httpx.Response, store: typing.Optional[S3Offload]
+    ) -> typing.Any:
+        try:
+            content = response.content
+        except httpx.ResponseNotRead:
+            content_length = int(response.headers.get("content-length", -1))
+            if store is not None and content_length >= store.threshold:
+                return await store.upload(response.aiter_raw())
+            # the raw bytes, like offloaded and streamed bodies, so the body
+            # still matches its content-encoding header
+            content = b"".join([chunk async for chunk in response.aiter_raw()])
+        else:
+            # read and decoded by the cache on the way, its encoding is gone
+            if "content-encoding" in response.headers:
+                del response.headers["content-encoding"]
+                response.headers["content-length"] = str(len(content))
+        if store is not None and len(content) >= store.threshold:
+            return await store.upload(content)
+        return codec.encode(content)
+
+    def expired(deadline: typing.Optional[float]) -> bool:
+        return deadline is not None and time.time() >= deadline
+
+    def deadline_exceeded() -> ResponseDict:
+        return ResponseDict(
+            status_code=504,
+            headers={"content-type": "text/plain"},
+            content=codec.encode(b"deadline exceeded"),
+        )
+
+    async def within(
+        awaitable: typing.Awaitable[T], deadline: typing.Optional[float]
+    ) -> T:
+        """Await `awaitable`, raising asyncio.TimeoutError once `deadline` passes."""
+        if deadline is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, max(0.0, deadline - time.time()))
+
+    async def send_batch_request(
+        index: int, request_dict: RequestDict
+    ) -> BatchResponseDict:
+        deadline = deadline_from_headers(request_dict["headers"])
+        try:
+            if expired(deadline):
+                raise asyncio.TimeoutError()
+            response = await within(
+                send(request_from_request_dict(request_dict, codec=codec)),
+                deadline,
+            )
+            try:
+                await within(response.aread(), deadline)
+            finally:
+                await response.aclose()
+            response_dict = response_dict_from_response(response, codec=codec)
+        except asyncio.TimeoutError:
+            response_dict = deadline_exceeded()
+        except Exception as exc:
+            response_dict = ResponseDict(
+                status_code=500, headers={}, content=str(exc), request=request_dict
+            )
+        return BatchResponseDict(index=index, response=response_dict)
 
-def async_handler(app: _ASGIApp):
-    client = httpx.AsyncClient(transport=httpx.ASGITransport(app))
+    async def handle_batch(
+        request_dicts: list[RequestDict],
+    ) -> AsyncGenerator[BatchResponseDict, None]:
+        # dispatch every request at once and yield responses as they complete
+        tasks = [
+            asyncio.ensure_future(send_batch_request(index, request_dict))
+            for index, request_dict in enumerate(request_dicts)
+        ]
+        try:
+            for next_response in asyncio.as_completed(tasks):
+                yield await next_response
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def handle(
-        job: JobDict[RequestDict],
-    ) -> AsyncGenerator[typing.Union[ResponseDict, str], None]:
+        job: JobDict[typing.Union[RequestDict, list[RequestDict]]],
+    ) -> AsyncGenerator[
+        typing.Union[ResponseDict, StreamFrameDict, BatchResponseDict], None
+    ]:
+        startup_ms = None
+        if not lifespan.started:
+            waiting = time.perf_counter()
+            await lifespan.startup()
+            startup_ms = round((time.perf_counter() - waiting) * 1000, 3)
         request_dict = job.get("input", None)
         logger.info(f"request_dict: {request_dict}")  # type: ignore
         if request_dict is None:  # type: ignore
@@ -33,29 +178,90 @@ def async_handler(app: _ASGIApp):
                 content="missing request input",
                 request=request_dict,
             )
+            return
+        if isinstance(request_dict, list):
+            async for batch_response in handle_batch(request_dict):
+                yield batch_response
+            return
         request_stream_type = stream_type_from_headers(request_dict["headers"])
         logger.info(f"request_stream_type: {request_stream_type}")  # type: ignore
+        # nobody waits for the response after the caller's deadline
+        deadline = deadline_from_headers(request_dict["headers"])
+        if expired(deadline):
+            logger.warn(f"job {job.get('id')} expired before it ran")  # type: ignore
+            yield deadline_exceeded()
+            return
 
-        request = request_from_request_dict(request_dict)
-
-        # we attempt to stream the response
-        response = await client.send(request, stream=True)
-        response_stream_type = stream_type_from_headers(response.headers)
-        # yield the response collecting the content if this is not a streaming response
-        yield response_dict_from_response(
-            response,
-            content=(
-                (await response.aread()).decode() if not response_stream_type else None
-            ),
+        store = offload_for_job(job)
+        request = request_from_request_dict(
+            request_dict,
+            codec=codec,
+            fetch=store.fetch if store is not None else None,
         )
-        # if we are streaming yield the data from the stream
-        if response_stream_type in ("text/event-stream", "application/x-ndjson"):
-            async for data in response.aiter_lines():
-                yield data
-        elif response_stream_type is not None:
-            async for data in response.aiter_raw(1024 * 1024):  # 1MB chunks
-                yield data.decode("utf-8")
-        # close the response
-        await response.aclose()
+
+        started = time.perf_counter()
+
+        def elapsed() -> float:
+            return round((time.perf_counter() - started) * 1000, 3)
+
+        # we attempt to stream the response, the app keeps running while its
+        # body is forwarded
+        try:
+            response = await within(send(request), deadline)
+        except asyncio.TimeoutError:
+            yield deadline_exceeded()
+            return
+        try:
+            timings = WorkerTimingsDict(headers_ms=elapsed())
+            if startup_ms is not None:
+                timings["startup_ms"] = startup_ms
+            response_stream_type = stream_type_from_headers(response.headers)
+            # yield the response collecting the content if it is not streaming
+            content = None
+            if not response_stream_type:
+                try:
+                    content = await within(encode_content(response, store), deadline)
+                except asyncio.TimeoutError:
+                    yield deadline_exceeded()
+                    return
+                timings["last_byte_ms"] = elapsed()
+            yield response_dict_from_response(
+                response, codec=codec, content=content, timings=timings
+            )
+            # if we are streaming yield the data from the stream as numbered frames
+            if response_stream_type is not None:
+                if response_stream_type in (
+                    "text/event-stream",
+                    "application/x-ndjson",
+                ):
+                    # keep line terminators so the client rebuilds the exact bytes
+                    chunks = split_lines(response.aiter_raw())
+                else:
+                    chunks = response.aiter_raw(1024 * 1024)  # 1MB chunks
+                # the last frame tells the client when the body was cut short
+                cut_short = False
+
+                def stop_at_deadline() -> None:
+                    nonlocal cut_short
+                    cut_short = True
+
+                if deadline is not None:
+                    chunks = until(chunks, deadline, stop_at_deadline)
+                batches = (
+                    coalesce(chunks, **coalesce_options)
+                    if coalesce_options is not None
+                    else ([chunk] async for chunk in chunks)
+                )
+                async for stream_frame in frame(
+                    batches,
+                    codec,
+                    lambda: {"last_byte_ms": elapsed()},
+                    lambda: cut_short,
+                ):
+                    yield stream_frame
+        finally:
+            # also runs when the job is cancelled or the generator is closed
+            # early, which stops the app instead of draining its response
+            await response.aclose()
 
     return handle
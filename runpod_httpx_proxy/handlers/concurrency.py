@@ -0,0 +1,177 @@
+import time
+import typing
+
+import httpx
+from httpx._transports.asgi import _ASGIApp  # type: ignore
+
+from runpod_httpx_proxy.utils import stream_type_from_headers
+
+# how fast the lowest latency seen is forgotten, per completed request, so a
+# workload that got slower for good sets a new baseline
+BASELINE_DRIFT = 0.001
+
+
+class ConcurrencyOptionsDict(typing.TypedDict, total=False):
+    initial_limit: typing.Annotated[int, "Jobs a worker takes before any feedback"]
+    min_limit: typing.Annotated[int, "Fewest jobs a worker is ever limited to"]
+    max_limit: typing.Annotated[int, "Most jobs a worker is ever allowed"]
+    tolerance: typing.Annotated[
+        float, "Latency over the baseline, as a ratio, before the limit is cut"
+    ]
+    backoff: typing.Annotated[float, "Factor the limit is cut by when congested"]
+    smoothing: typing.Annotated[float, "Weight of a new sample in the latency EWMAs"]
+
+
+class ConcurrencyMetricsDict(typing.TypedDict):
+    limit: typing.Annotated[int, "Jobs the worker currently takes at once"]
+    inflight: typing.Annotated[int, "Requests the ASGI app is working on"]
+    ttfb_ms: typing.Annotated[
+        typing.Optional[float], "Smoothed time until the app sent its headers"
+    ]
+    latency_ms: typing.Annotated[
+        typing.Optional[float], "Smoothed time until the app finished a response"
+    ]
+    baseline_ms: typing.Annotated[
+        typing.Optional[float], "Uncongested latency the current one is judged by"
+    ]
+    gradient: typing.Annotated[
+        typing.Optional[float], "Baseline over current latency, below 1 is queueing"
+    ]
+    completed: typing.Annotated[int, "Responses measured"]
+    increases: typing.Annotated[int, "Times the limit was raised"]
+    decreases: typing.Annotated[int, "Times the limit was cut"]
+
+
+def _ewma(average: typing.Optional[float], sample: float, smoothing: float) -> float:
+    return sample if average is None else average + smoothing * (sample - average)
+
+
+class AdaptiveConcurrency:
+    """
+    Sizes a worker's concurrency from how its ASGI app is coping, for the
+    `concurrency_modifier` of the start config:
+
+        concurrency = AdaptiveConcurrency()
+        runpod.serverless.start({
+            "handler": async_handler(app, concurrency=concurrency),
+            "concurrency_modifier": concurrency.concurrency_modifier,
+        })
+
+    The limit grows by one per `limit` responses while the app is kept busy
+    up to it, and is cut by `backoff` when the smoothed latency rises past
+    `tolerance` times the lowest seen (AIMD). Latency is time to first byte
+    for streamed responses, whose length says nothing about load, and time to
+    completion otherwise.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        tolerance: float = 1.5,
+        backoff: float = 0.9,
+        smoothing: float = 0.2,
+    ):
+        self.limit = float(min(max_limit, max(min_limit, initial_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.inflight = 0
+        # most requests in flight since the limit last changed
+        self.peak_inflight = 0
+        self.ttfb: typing.Optional[float] = None
+        self.latency: typing.Optional[float] = None
+        self.signal: typing.Optional[float] = None
+        self.baseline: typing.Optional[float] = None
+        # responses to wait for after a cut before judging the new limit
+        self.cooldown = 0
+        self.completed = 0
+        self.increases = 0
+        self.decreases = 0
+
+    def wrap(self, app: _ASGIApp) -> _ASGIApp:
+        """ASGI middleware measuring every request `app` serves."""
+
+        async def measured(
+            scope: typing.MutableMapping[str, typing.Any],
+            receive: typing.Callable[[], typing.Awaitable[typing.Any]],
+            send: typing.Callable[[typing.Any], typing.Awaitable[None]],
+        ) -> None:
+            if scope["type"] != "http":
+                return await app(scope, receive, send)
+            started = time.perf_counter()
+            ttfb: typing.Optional[float] = None
+            streamed = False
+
+            async def send_measured(message: typing.Any) -> None:
+                nonlocal ttfb, streamed
+                if message["type"] == "http.response.start":
+                    ttfb = time.perf_counter() - started
+                    headers = httpx.Headers(message.get("headers", []))
+                    streamed = stream_type_from_headers(headers) is not None
+                await send(message)
+
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+            try:
+                await app(scope, receive, send_measured)
+            finally:
+                self.inflight -= 1
+                # a request abandoned before its headers says nothing
+                if ttfb is not None:
+                    self.record(ttfb, time.perf_counter() - started, streamed)
+
+        return measured
+
+    def record(self, ttfb: float, latency: float, streamed: bool = False) -> None:
+        self.completed += 1
+        self.ttfb = _ewma(self.ttfb, ttfb, self.smoothing)
+        self.latency = _ewma(self.latency, latency, self.smoothing)
+        self.signal = _ewma(self.signal, ttfb if streamed else latency, self.smoothing)
+        self.baseline = (
+            min(self.baseline * (1 + BASELINE_DRIFT), self.signal)
+            if self.baseline is not None
+            else self.signal
+        )
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        if self.signal > self.baseline * self.tolerance:
+            limit = max(float(self.min_limit), self.limit * self.backoff)
+            if int(limit) < int(self.limit):
+                self.decreases += 1
+            self.limit = limit
+            self.cooldown = int(self.limit)
+            self.peak_inflight = self.inflight
+        elif self.peak_inflight >= int(self.limit):
+            limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            if int(limit) > int(self.limit):
+                self.increases += 1
+                self.peak_inflight = self.inflight
+            self.limit = limit
+
+    def concurrency_modifier(self, current: int) -> int:
+        return int(self.limit)
+
+    def metrics(self) -> ConcurrencyMetricsDict:
+        def ms(seconds: typing.Optional[float]) -> typing.Optional[float]:
+            return round(seconds * 1000, 3) if seconds is not None else None
+
+        return ConcurrencyMetricsDict(
+            limit=int(self.limit),
+            inflight=self.inflight,
+            ttfb_ms=ms(self.ttfb),
+            latency_ms=ms(self.latency),
+            baseline_ms=ms(self.baseline),
+            gradient=(
+                round(self.baseline / self.signal, 3)
+                if self.baseline is not None and self.signal
+                else None
+            ),
+            completed=self.completed,
+            increases=self.increases,
+            decreases=self.decreases,
+        )
@@ -0,0 +1,195 @@
+import asyncio
+import time
+import typing
+
+import httpx
+from httpx._transports.asgi import _ASGIApp  # type: ignore
+from runpod import RunPodLogger
+
+from runpod_httpx_proxy.response_cache import Send
+
+logger = RunPodLogger()
+
+_Message = typing.MutableMapping[str, typing.Any]
+
+
+class LifespanMetricsDict(typing.TypedDict):
+    started: typing.Annotated[bool, "Whether startup and warm-up have finished"]
+    supported: typing.Annotated[
+        typing.Optional[bool], "Whether the app speaks ASGI lifespan, None until asked"
+    ]
+    startup_ms: typing.Annotated[
+        typing.Optional[float], "Lifespan startup and warm-up together"
+    ]
+    warm_up_ms: typing.Annotated[typing.Optional[float], "Warm-up requests alone"]
+    warm_up_failures: typing.Annotated[int, "Warm-up requests that failed"]
+
+
+class Lifespan:
+    """
+    Runs the app's ASGI lifespan startup once per worker process, before the
+    first job is served, followed by the `warm_up` requests so that loading
+    models or compiling kernels lands on nobody's request. Jobs that arrive
+    meanwhile wait for it. Apps without lifespan support are served as they
+    are.
+
+    async_handler starts it on its first job, `await lifespan.startup()` does
+    so sooner, from wherever the worker reports ready. `await
+    lifespan.shutdown()` runs the app's shutdown.
+    """
+
+    def __init__(
+        self,
+        warm_up: typing.Sequence[httpx.Request] = (),
+        timeout: typing.Optional[float] = None,
+    ):
+        self.warm_up = list(warm_up)
+        self.timeout = timeout
+        # shared with the app's requests, as lifespan state
+        self.state: dict[str, typing.Any] = {}
+        self.app: typing.Optional[_ASGIApp] = None
+        self.send: typing.Optional[Send] = None
+        self.supported: typing.Optional[bool] = None
+        self.startup_ms: typing.Optional[float] = None
+        self.warm_up_ms: typing.Optional[float] = None
+        self.warm_up_failures = 0
+        self._starting: typing.Optional[asyncio.Future[None]] = None
+        self._task: typing.Optional[asyncio.Task[None]] = None
+        self._receive: asyncio.Queue[_Message] = asyncio.Queue()
+        self._shutdown: typing.Optional[asyncio.Future[None]] = None
+
+    def attach(self, app: _ASGIApp, send: Send) -> None:
+        self.app = app
+        self.send = send
+
+    @property
+    def started(self) -> bool:
+        return (
+            self._starting is not None
+            and self._starting.done()
+            and not self._starting.cancelled()
+            and self._starting.exception() is None
+        )
+
+    async def startup(self) -> None:
+        """Start the app, or raise why it failed to start, on every call."""
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._startup())
+        # a job cancelled while waiting leaves the startup to the others
+        await asyncio.shield(self._starting)
+
+    async def _startup(self) -> None:
+        assert self.app is not None and self.send is not None
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        complete = loop.create_future()
+
+        async def receive() -> _Message:
+            return await self._receive.get()
+
+        async def send(message: _Message) -> None:
+            if message["type"] == "lifespan.startup.complete":
+                self.supported = True
+                complete.set_result(None)
+            elif message["type"] == "lifespan.startup.failed":
+                self.supported = True
+                complete.set_exception(
+                    RuntimeError(f"app startup failed: {message.get('message', '')}")
+                )
+            elif self._shutdown is None or self._shutdown.done():
+                # an app torn down with the loop reports a failed shutdown
+                # nobody asked for
+                return
+            elif message["type"] == "lifespan.shutdown.complete":
+                self._shutdown.set_result(None)
+            elif message["type"] == "lifespan.shutdown.failed":
+                self._shutdown.set_exception(
+                    RuntimeError(f"app shutdown failed: {message.get('message', '')}")
+                )
+
+        async def run() -> None:
+            scope = {
+                "type": "lifespan",
+                "asgi": {"version": "3.0", "spec_version": "2.0"},
+                "state": self.state,
+            }
+            try:
+                await self.app(scope, receive, send)  # type: ignore
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if not complete.done():
+                    complete.set_exception(exc)
+                else:
+                    logger.error(f"app lifespan failed: {exc!r}")  # type: ignore
+            finally:
+                if not complete.done():
+                    # returned without answering, lifespan is not supported
+                    complete.set_result(None)
+
+        await self._receive.put({"type": "lifespan.startup"})
+        self._task = asyncio.ensure_future(run())
+        try:
+            await asyncio.wait_for(asyncio.shield(complete), self.timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            raise
+        except Exception as exc:
+            if self.supported:
+                raise
+            # the spec has servers carry on when the app raises on the
+            # lifespan scope without having answered it
+            logger.warn(f"app does not support lifespan: {exc!r}")  # type: ignore
+        if not self.supported:
+            self.supported = False
+        warm_up_started = time.perf_counter()
+        for request in self.warm_up:
+            try:
+                response = await self.send(request)
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+                response.raise_for_status()
+            except Exception as exc:
+                self.warm_up_failures += 1
+                logger.warn(f"warm-up {request.url} failed: {exc!r}")  # type: ignore
+        finished = time.perf_counter()
+        self.warm_up_ms = round((finished - warm_up_started) * 1000, 3)
+        self.startup_ms = round((finished - started) * 1000, 3)
+        logger.info(f"app started in {self.startup_ms}ms")  # type: ignore
+
+    async def shutdown(self) -> None:
+        if self._starting is None:
+            return
+        try:
+            await self._starting
+        except Exception:
+            return
+        assert self._task is not None
+        if self.supported and not self._task.done():
+            shutdown = self._shutdown = asyncio.get_running_loop().create_future()
+            await self._receive.put({"type": "lifespan.shutdown"})
+            try:
+                await asyncio.wait_for(
+                    asyncio.wait(
+                        {shutdown, self._task},
+                        return_when=asyncio.FIRST_COMPLETED,
+                    ),
+                    self.timeout,
+                )
+            finally:
+                if not self._task.done():
+                    self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+            if shutdown.done():
+                shutdown.result()
+
+    def metrics(self) -> LifespanMetricsDict:
+        return LifespanMetricsDict(
+            started=self.started,
+            supported=self.supported,
+            startup_ms=self.startup_ms,
+            warm_up_ms=self.warm_up_ms,
+            warm_up_failures=self.warm_up_failures,
+        )
@@ -1,7 +1,17 @@
+import json
 import typing
 from urllib.parse import urljoin
 import httpx
 import re
+from runpod_httpx_proxy.codecs import (
+    BodyCodec,
+    EncodedBody,
+    default_body_codec,
+    dumps,
+)
+from runpod_httpx_proxy.offload import OffloadedBodyDict, is_offloaded_body
+from runpod_httpx_proxy.types import PolicyDict, S3ConfigDict
+from runpod_httpx_proxy.utils import has_unread_body
 
 
 try:
@@ -10,61 +20,86 @@ except ImportError:
     from typing_extensions import TypedDict
 
 
+Headers = typing.Annotated[
+    typing.Union[typing.List[typing.Tuple[str, str]], dict[str, str]],
+    "Header pairs in order, payloads from older versions use a dict",
+]
+
+
 class RequestDict(TypedDict):
     method: str
     url: str
-    headers: dict[str, str]
+    headers: Headers
     content: typing.NotRequired[typing.Any]
 
 
 class PartialRequestDict(typing.TypedDict, total=False):
     method: str
     url: str
-    headers: dict[str, str]
+    headers: Headers
     content: typing.NotRequired[typing.Any]
 
 
 def request_dict_from_request(
     request: httpx.Request,
     /,
+    *,
+    codec: BodyCodec = default_body_codec,
     **request_dict_overrides: typing.Unpack[PartialRequestDict],
 ) -> RequestDict:
     request_dict_overrides.setdefault("method", request.method)
-    request_dict_overrides.setdefault("url", str(request.url))
-    request_dict_overrides.setdefault("headers", dict(request.headers))
+    if "url" not in request_dict_overrides:
+        request_dict_overrides["url"] = str(request.url)
+    if "headers" not in request_dict_overrides:
+        # pairs keep repeated headers and skip httpx's per key lookups
+        request_dict_overrides["headers"] = request.headers.multi_items()
     if "content" not in request_dict_overrides:
+        # a streamed body is gone once it has been sent
         request_dict_overrides["content"] = (
-            request.content.decode() if request.content else None
+            codec.encode(request.content)
+            if not has_unread_body(request) and request.content
+            else None
         )
     return RequestDict(**request_dict_overrides)
 
 
+class WorkerTimingsDict(typing.TypedDict, total=False):
+    headers_ms: typing.Annotated[float, "Until the app sent its response headers"]
+    last_byte_ms: typing.Annotated[float, "Until the app sent its last body byte"]
+    startup_ms: typing.Annotated[
+        float, "Waited for the app to start up before the request, cold starts only"
+    ]
+
+
 class ResponseDict(typing.TypedDict):
     status_code: int
-    headers: dict[str, str]
+    headers: Headers
     content: typing.NotRequired[typing.Any]
-    request: RequestDict
+    request: typing.NotRequired[RequestDict]
+    timings: typing.NotRequired[WorkerTimingsDict]
 
 
 class PartialResponseDict(typing.TypedDict, total=False):
     status_code: int
-    headers: dict[str, str]
+    headers: Headers
     content: typing.NotRequired[typing.Any]
     request: RequestDict
+    timings: WorkerTimingsDict
 
 
 def response_dict_from_response(
     response: httpx.Response,
     /,
+    *,
+    codec: BodyCodec = default_body_codec,
     **response_dict_overrides: typing.Unpack[PartialResponseDict],
 ) -> ResponseDict:
-    response_dict_overrides.setdefault(
-        "request", request_dict_from_request(response.request)
-    )
+    # the request is not echoed back, the client still holds it
     response_dict_overrides.setdefault("status_code", response.status_code)
-    response_dict_overrides.setdefault("headers", dict(response.headers))
+    if "headers" not in response_dict_overrides:
+        response_dict_overrides["headers"] = response.headers.multi_items()
     if "content" not in response_dict_overrides:
-        response_dict_overrides["content"] = response.content
+        response_dict_overrides["content"] = codec.encode(response.content)
     return ResponseDict(**response_dict_overrides)
 
 
@@ -79,22 +114,95 @@ def job_dict_from_request(
     return JobDict(input=request_dict_from_request(request, **overrides))
 
 
+class ChunkedBodyDict(typing.TypedDict):
+    encoding: typing.Literal["chunks"]
+    chunks: typing.Annotated[
+        typing.List[EncodedBody], "Encoded chunks of a streamed body, in order"
+    ]
+
+
+def is_chunked_body(content: typing.Any) -> bool:
+    return isinstance(content, dict) and content.get("encoding") == "chunks"
+
+
+async def iter_chunked_body(
+    content: ChunkedBodyDict, codec: BodyCodec = default_body_codec
+) -> typing.AsyncIterator[bytes]:
+    for chunk in content["chunks"]:
+        yield codec.decode(chunk)
+
+
+async def iter_job_body(
+    job: dict[str, typing.Any],
+    chunks: typing.AsyncIterable[bytes],
+    codec: BodyCodec = default_body_codec,
+) -> typing.AsyncIterator[bytes]:
+    """
+    Serialize a job whose input carries a streamed request body, encoding each
+    chunk of `chunks` as it arrives instead of buffering the whole body.
+    """
+    request_dict = {
+        key: value for key, value in job["input"].items() if key != "content"
+    }
+    request_dict["content"] = ChunkedBodyDict(encoding="chunks", chunks=[])
+    job = {key: value for key, value in job.items() if key != "input"}
+    job["input"] = request_dict
+    # the chunk list is the last value in the document, stream it in between
+    head, tail = json.dumps(job).rsplit("[]", 1)
+    yield head.encode("utf-8") + b"["
+    separator = b""
+    async for chunk in chunks:
+        if chunk:
+            yield separator + json.dumps(codec.encode(chunk)).encode("utf-8")
+            separator = b", "
+    yield b"]" + tail.encode("utf-8")
+
+
+Fetch = typing.Callable[[OffloadedBodyDict], typing.AsyncIterator[bytes]]
+
+
+def decode_content(
+    content: typing.Any,
+    codec: BodyCodec = default_body_codec,
+    fetch: typing.Optional[Fetch] = None,
+) -> typing.Union[bytes, typing.AsyncIterator[bytes]]:
+    """Decode job content into bytes, or a byte stream for streamed bodies."""
+    if is_chunked_body(content):
+        return iter_chunked_body(content, codec)
+    if is_offloaded_body(content):
+        if fetch is None:
+            raise ValueError("Body was offloaded but there is no store to fetch it")
+        return fetch(content)
+    return codec.decode(content)
+
+
 def request_from_request_dict(
-    request_dict: RequestDict, **overrides: typing.Unpack[PartialRequestDict]
+    request_dict: RequestDict,
+    *,
+    codec: BodyCodec = default_body_codec,
+    fetch: typing.Optional[Fetch] = None,
+    **overrides: typing.Unpack[PartialRequestDict],
 ) -> httpx.Request:
     return httpx.Request(
         method=overrides.get("method", request_dict["method"]),
         url=overrides.get("url", request_dict["url"]),
         headers=overrides.get("headers", request_dict.get("headers", {})),
-        content=overrides.get("content", request_dict.get("content", None)),
+        content=decode_content(
+            overrides.get("content", request_dict.get("content", None)), codec, fetch
+        ),
     )
 
 
-def response_from_response_dict(response_dict: ResponseDict) -> httpx.Response:
+def response_from_response_dict(
+    response_dict: ResponseDict,
+    *,
+    codec: BodyCodec = default_body_codec,
+    fetch: typing.Optional[Fetch] = None,
+) -> httpx.Response:
     return httpx.Response(
         status_code=response_dict["status_code"],
         headers=response_dict.get("headers", {}),
-        content=response_dict.get("content", None),
+        content=decode_content(response_dict.get("content", None), codec, fetch),
     )
 
 
@@ -117,15 +225,25 @@ class StreamResponse(httpx.Response):
     def from_response_dict(
         cls,
         response_dict: ResponseDict,
+        *,
+        codec: BodyCodec = default_body_codec,
+        fetch: typing.Optional[Fetch] = None,
+        request: typing.Optional[httpx.Request] = None,
         **overrides: typing.Unpack[PartialResponseDict],
     ) -> "StreamResponse":
+        if request is None and response_dict.get("request") is not None:
+            request = request_from_request_dict(
+                response_dict["request"], codec=codec, fetch=fetch
+            )
         return cls(
             status_code=response_dict["status_code"],
             headers=overrides.get("headers", response_dict.get("headers", {})),
-            content=overrides.get("content", response_dict.get("content", None)),
-            request=request_from_request_dict(
-                response_dict.get("request"), **overrides
+            content=decode_content(
+                overrides.get("content", response_dict.get("content", None)),
+                codec,
+                fetch,
             ),
+            request=request,
         )
 
 
@@ -134,27 +252,162 @@ RUNPOD_ENDPOINT_PATTERN = re.compile(
 )
 
 
+def endpoint_from_url(url: httpx.URL) -> tuple[str, str]:
+    """Split a proxied request URL into its RunPod endpoint and app path."""
+    match = RUNPOD_ENDPOINT_PATTERN.match(url.path)
+    if match is not None:
+        version, endpoint_id, path = match.groups()
+        base_url = f"{url.scheme}://{url.host}/{version}/{endpoint_id}"
+    else:
+        base_url = ""
+        path = url.path
+    if url.query:
+        path = f"{path}?{url.query.decode('ascii')}"
+    return base_url, path
+
+
+class BatchResponseDict(typing.TypedDict):
+    index: int
+    response: ResponseDict
+
+
+JOB_EXCLUDED_HEADERS = frozenset(
+    (
+        b"content-length",
+        b"content-type",
+        b"content-encoding",
+        b"transfer-encoding",
+        b"x-runpod-deadline",
+    )
+)
+
+
 class RunRequest(httpx.Request):
     @classmethod
     def from_request(
-        cls, request: httpx.Request, **override: typing.Unpack[PartialRequestDict]
+        cls,
+        request: httpx.Request,
+        route: typing.Literal["run", "runsync"] = "run",
+        *,
+        codec: BodyCodec = default_body_codec,
+        s3_config: typing.Optional[S3ConfigDict] = None,
+        policy: typing.Optional[PolicyDict] = None,
+        credential: typing.Optional[str] = None,
+        **override: typing.Unpack[PartialRequestDict],
     ) -> "RunRequest":
-        url = httpx.URL(override.pop("url", str(request.url)))
-        match = RUNPOD_ENDPOINT_PATTERN.match(request.url.path)
-        if match is not None:
-            version, endpoint_id, path = match.groups()
-            base_url = f"{url.scheme}://{url.host}/{version}/{endpoint_id}"
-        else:
-            base_url = ""
-            path = request.url.path
-        content = request.content.decode() if request.content else None
+        url = httpx.URL(override.pop("url")) if "url" in override else request.url
+        base_url, path = endpoint_from_url(url)
+        headers = cls.job_headers(override.get("headers", request.headers))
+        headers["content-type"] = "application/json"
+        input_headers = cls.input_headers(request, credential)
+        job: dict[str, typing.Any] = {}
+        if s3_config is not None:
+            job["s3Config"] = s3_config
+        if policy:
+            job["policy"] = policy
+        if "content" in override:
+            job["input"] = request_dict_from_request(
+                request,
+                codec=codec,
+                url=urljoin(base_url, path),
+                headers=input_headers,
+                content=override["content"],
+            )
+            return cls(
+                method="POST",
+                url=f"{base_url}/{route}",
+                headers=headers,
+                content=dumps(job),
+            )
+        if has_unread_body(request):
+            # streamed bodies are forwarded chunk by chunk as the job is sent
+            return cls(
+                method="POST",
+                url=f"{base_url}/{route}",
+                headers=headers,
+                content=iter_job_body(
+                    {
+                        **job,
+                        "input": request_dict_from_request(
+                            request,
+                            codec=codec,
+                            url=urljoin(base_url, path),
+                            headers=input_headers,
+                            content=None,
+                        ),
+                    },
+                    typing.cast(typing.AsyncIterable[bytes], request.stream),
+                    codec,
+                ),
+            )
+        job["input"] = request_dict_from_request(
+            request, codec=codec, url=urljoin(base_url, path), headers=input_headers
+        )
         return cls(
             method="POST",
-            url=f"{base_url}/run",
-            headers=override.get("headers", request.headers),
-            json={
-                "input": request_dict_from_request(
-                    request, url=urljoin(base_url, path), content=content
-                ),
-            },
+            url=f"{base_url}/{route}",
+            headers=headers,
+            content=dumps(job),
+        )
+
+    @classmethod
+    def from_requests(
+        cls,
+        requests: typing.Sequence[httpx.Request],
+        route: typing.Literal["run", "runsync"] = "run",
+        *,
+        codec: BodyCodec = default_body_codec,
+        policy: typing.Optional[PolicyDict] = None,
+        credential: typing.Optional[str] = None,
+    ) -> "RunRequest":
+        """Pack requests to the same endpoint into one job with a list input."""
+        inputs = []
+        for request in requests:
+            base_url, path = endpoint_from_url(request.url)
+            inputs.append(
+                request_dict_from_request(
+                    request,
+                    codec=codec,
+                    url=urljoin(base_url, path),
+                    headers=cls.input_headers(request, credential),
+                )
+            )
+        job: dict[str, typing.Any] = {"input": inputs}
+        if policy:
+            job["policy"] = policy
+        headers = cls.job_headers(requests[0].headers)
+        headers["content-type"] = "application/json"
+        return cls(
+            method="POST",
+            url=f"{base_url}/{route}",
+            headers=headers,
+            content=dumps(job),
+        )
+
+    @staticmethod
+    def input_headers(
+        request: httpx.Request, credential: typing.Optional[str]
+    ) -> Headers:
+        """
+        Headers of the proxied request, without the `credential` Authorization
+        the client authenticates with RunPod. The worker's app never sees the
+        API key, and its answers stay cacheable by a shared cache.
+        """
+        return [
+            (name, value)
+            for name, value in request.headers.multi_items()
+            if name != "authorization" or value != credential
+        ]
+
+    @staticmethod
+    def job_headers(headers: httpx.Headers) -> httpx.Headers:
+        if not isinstance(headers, httpx.Headers):
+            headers = httpx.Headers(headers)
+        # the job JSON replaces the proxied body, so its framing headers don't apply
+        return httpx.Headers(
+            [
+                (name, value)
+                for name, value in headers.raw
+                if name.lower() not in JOB_EXCLUDED_HEADERS
+            ]
         )
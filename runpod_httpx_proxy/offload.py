@@ -0,0 +1,193 @@
+import asyncio
+import itertools
+import typing
+
+import httpx
+from uuid_extensions import uuid7str  # type: ignore
+
+from runpod_httpx_proxy.codecs import Buffer
+from runpod_httpx_proxy.types import S3ConfigDict
+
+
+class OffloadedBodyDict(typing.TypedDict):
+    encoding: typing.Literal["url"]
+    url: typing.Annotated[str, "Presigned URL the body is fetched from"]
+    size: typing.Annotated[int, "Size of the body in bytes"]
+
+
+class OffloadOptionsDict(typing.TypedDict, total=False):
+    threshold: typing.Annotated[int, "Bodies of at least this many bytes are offloaded"]
+    part_size: typing.Annotated[int, "Bytes per multipart upload part, at least 5MiB"]
+    max_concurrency: typing.Annotated[int, "Parts uploaded at the same time"]
+    expires_in: typing.Annotated[int, "Seconds presigned URLs stay valid"]
+    prefix: typing.Annotated[str, "Prefix of the keys bodies are stored under"]
+
+
+def is_offloaded_body(content: typing.Any) -> bool:
+    return isinstance(content, dict) and content.get("encoding") == "url"
+
+
+class S3Offload:
+    """
+    Moves large bodies out of job payloads into an S3 compatible bucket.
+
+    Bodies are uploaded with a multipart upload whose parts are sent
+    concurrently while the body is still being read, so at most
+    `max_concurrency` parts are held in memory. The job only carries a
+    presigned URL that the other side streams the body from. Uploaded objects
+    are not deleted, use a lifecycle rule on `prefix` to expire them.
+    """
+
+    s3_config: S3ConfigDict
+
+    def __init__(
+        self,
+        s3_config: S3ConfigDict,
+        threshold: int = 1024 * 1024,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        expires_in: int = 3600,
+        prefix: str = "runpod-httpx-proxy/",
+    ):
+        # imported here, it takes longer to import than the rest of the client
+        try:
+            import boto3  # type: ignore
+        except ImportError:
+            raise ValueError("S3 offload requires boto3") from None
+        self.s3_config = s3_config
+        self.threshold = threshold
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.expires_in = expires_in
+        self.prefix = prefix
+        self.bucket = s3_config["bucketName"]
+        self.s3 = boto3.client(
+            "s3",
+            endpoint_url=s3_config["endpointUrl"],
+            aws_access_key_id=s3_config["accessId"],
+            aws_secret_access_key=s3_config["accessSecret"],
+        )
+        self._http: typing.Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient()
+        return self._http
+
+    async def upload(
+        self, body: typing.Union[Buffer, typing.AsyncIterable[bytes]]
+    ) -> OffloadedBodyDict:
+        key = f"{self.prefix}{uuid7str()}"
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            body = self._slices(memoryview(body))
+        parts = self._parts(body)
+        first = await anext(parts, b"")
+        second = await anext(parts, None)
+        if second is None:
+            await asyncio.to_thread(
+                self.s3.put_object, Bucket=self.bucket, Key=key, Body=first
+            )
+            size = len(first)
+        else:
+            size = await self._upload_multipart(key, first, second, parts)
+        url = await asyncio.to_thread(
+            self.s3.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=self.expires_in,
+        )
+        return OffloadedBodyDict(encoding="url", url=url, size=size)
+
+    async def _upload_multipart(
+        self,
+        key: str,
+        first: bytes,
+        second: bytes,
+        parts: typing.AsyncIterator[bytes],
+    ) -> int:
+        upload = await asyncio.to_thread(
+            self.s3.create_multipart_upload, Bucket=self.bucket, Key=key
+        )
+        upload_id = upload["UploadId"]
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks: typing.List[asyncio.Task[dict[str, typing.Any]]] = []
+        size = 0
+
+        async def upload_part(number: int, data: bytes) -> dict[str, typing.Any]:
+            try:
+                part = await asyncio.to_thread(
+                    self.s3.upload_part,
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=data,
+                )
+            finally:
+                slots.release()
+            return {"PartNumber": number, "ETag": part["ETag"]}
+
+        async def chain() -> typing.AsyncIterator[bytes]:
+            yield first
+            yield second
+            async for part in parts:
+                yield part
+
+        try:
+            datas = chain()
+            for number in itertools.count(1):
+                # a part is only read once there is a slot to upload it in
+                await slots.acquire()
+                data = await anext(datas, None)
+                if data is None:
+                    slots.release()
+                    break
+                size += len(data)
+                tasks.append(asyncio.create_task(upload_part(number, data)))
+            completed = await asyncio.gather(*tasks)
+            await asyncio.to_thread(
+                self.s3.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.to_thread(
+                self.s3.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+            )
+            raise
+        return size
+
+    async def _slices(self, view: memoryview) -> typing.AsyncIterator[bytes]:
+        for start in range(0, view.nbytes, self.part_size):
+            yield bytes(view[start : start + self.part_size])
+
+    async def _parts(
+        self, chunks: typing.AsyncIterable[bytes]
+    ) -> typing.AsyncIterator[bytes]:
+        buffer = bytearray()
+        async for chunk in chunks:
+            buffer += chunk
+            while len(buffer) >= self.part_size:
+                yield bytes(buffer[: self.part_size])
+                del buffer[: self.part_size]
+        if buffer:
+            yield bytes(buffer)
+
+    async def fetch(self, body: OffloadedBodyDict) -> typing.AsyncIterator[bytes]:
+        async with self.http.stream("GET", body["url"]) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                yield chunk
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -0,0 +1,245 @@
+import collections
+import hashlib
+import time
+import typing
+
+import httpx
+
+from runpod_httpx_proxy.utils import has_unread_body, stream_type_from_headers
+
+Send = typing.Callable[[httpx.Request], typing.Awaitable[httpx.Response]]
+
+CACHEABLE_STATUS_CODES = frozenset((200, 203, 204, 300, 301, 404, 405, 410, 414, 501))
+
+
+class ResponseCacheOptionsDict(typing.TypedDict, total=False):
+    max_bytes: typing.Annotated[int, "Body bytes kept before evicting the oldest"]
+    ttl: typing.Annotated[float, "Seconds a response without a max-age is kept"]
+    methods: typing.Annotated[
+        typing.Collection[str], "Methods whose responses are kept"
+    ]
+    vary: typing.Annotated[
+        typing.Collection[str], "Request headers that are part of the cache key"
+    ]
+    shared: typing.Annotated[bool, "Serves many users, unlike a client's own cache"]
+
+
+class ResponseCacheMetricsDict(typing.TypedDict):
+    hits: typing.Annotated[int, "Requests answered from the cache"]
+    misses: typing.Annotated[int, "Cacheable requests sent to the app"]
+    revalidated: typing.Annotated[int, "Stale entries the app confirmed with a 304"]
+    stores: typing.Annotated[int, "Responses added to the cache"]
+    evictions: typing.Annotated[int, "Entries dropped to stay within max_bytes"]
+    entries: typing.Annotated[int, "Entries in the cache"]
+    bytes: typing.Annotated[int, "Body bytes held by the cache"]
+
+
+class CachedResponse:
+    def __init__(self, response: httpx.Response, expires: float):
+        self.status_code = response.status_code
+        # the content is decoded, so its encoded length and encoding are gone
+        decoded = "content-encoding" in response.headers
+        self.headers = [
+            (name, value)
+            for name, value in response.headers.multi_items()
+            if not decoded or name.lower() not in ("content-encoding", "content-length")
+        ]
+        self.content = response.content
+        self.etag = response.headers.get("etag")
+        self.expires = expires
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def response(self, request: httpx.Request) -> httpx.Response:
+        if self.etag is not None and self.etag in _tags(
+            request.headers.get("if-none-match")
+        ):
+            headers = [
+                (name, value)
+                for name, value in self.headers
+                if name.lower() != "content-length"
+            ]
+            return httpx.Response(304, headers=headers, request=request)
+        return httpx.Response(
+            self.status_code,
+            headers=self.headers,
+            content=self.content,
+            request=request,
+        )
+
+
+def request_key(request: httpx.Request, vary: typing.Iterable[str]) -> str:
+    """Hash of what makes two requests ask for the same response."""
+    key = hashlib.sha256()
+    key.update(request.method.encode())
+    key.update(b"\0" + request.url.raw_path)
+    for header in vary:
+        key.update(b"\0" + ",".join(request.headers.get_list(header)).encode())
+    key.update(b"\0" + hashlib.sha256(request.content).digest())
+    return key.hexdigest()
+
+
+def _tags(value: typing.Optional[str]) -> typing.List[str]:
+    return [tag.strip() for tag in value.split(",")] if value else []
+
+
+def _directives(value: typing.Optional[str]) -> dict[str, typing.Optional[str]]:
+    directives: dict[str, typing.Optional[str]] = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+class ResponseCache:
+    """
+    In-process cache of the app's responses for repeated identical requests.
+
+    Requests are keyed by method, path and query, the `vary` headers and a
+    hash of the body, and only `methods` are cached, add POST for
+    deterministic endpoints such as embeddings. Responses are kept for their
+    Cache-Control max-age, or `ttl` seconds without one, and never when they
+    are no-store, private or streamed, or answer a request with an
+    Authorization header without being marked public. A cache that is not
+    `shared` serves a single user agent, it keeps private responses and keys
+    them by Authorization instead. Stale entries with an ETag are revalidated
+    with If-None-Match. The least recently used entries are evicted to keep
+    the bodies within `max_bytes`.
+    """
+
+    entries: "collections.OrderedDict[str, CachedResponse]"
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 60.0,
+        methods: typing.Collection[str] = ("GET", "HEAD"),
+        vary: typing.Collection[str] = ("accept", "accept-encoding", "content-type"),
+        shared: bool = True,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.methods = frozenset(method.upper() for method in methods)
+        self.shared = shared
+        if not shared:
+            # a private cache keeps each credential's answers apart instead
+            vary = {*vary, "authorization"}
+        self.vary = tuple(sorted({header.lower() for header in vary}))
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def key(self, request: httpx.Request) -> typing.Optional[str]:
+        if request.method not in self.methods or has_unread_body(request):
+            return None
+        if "no-store" in _directives(request.headers.get("cache-control")):
+            return None
+        return request_key(request, self.vary)
+
+    async def send(self, request: httpx.Request, send: Send) -> httpx.Response:
+        """Answer `request` from the cache, or with `send` and cache the answer."""
+        key = self.key(request)
+        if key is None:
+            return await send(request)
+        entry = self.entries.get(key)
+        revalidate = "no-cache" in _directives(request.headers.get("cache-control"))
+        if entry is not None and not revalidate and entry.expires > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.response(request)
+        validating = entry is not None and entry.etag is not None
+        sent = request
+        if validating:
+            assert entry is not None and entry.etag is not None
+            sent = httpx.Request(
+                request.method,
+                request.url,
+                headers=[
+                    *request.headers.multi_items(),
+                    ("if-none-match", entry.etag),
+                ],
+                content=request.content,
+            )
+        self.misses += 1
+        response = await send(sent)
+        if validating and response.status_code == 304:
+            assert entry is not None
+            await response.aclose()
+            self.revalidated += 1
+            entry.expires = self.expires(response)
+            self.entries.move_to_end(key)
+            return entry.response(request)
+        if self.storable(request, response):
+            await response.aread()
+            self.store(key, response)
+        return response
+
+    def expires(self, response: httpx.Response) -> float:
+        directives = _directives(response.headers.get("cache-control"))
+        if "no-cache" in directives:
+            return 0.0
+        max_age = directives.get("s-maxage") or directives.get("max-age")
+        ttl = self.ttl
+        if max_age is not None:
+            try:
+                ttl = float(max_age)
+            except ValueError:
+                pass
+        return time.monotonic() + ttl
+
+    def storable(self, request: httpx.Request, response: httpx.Response) -> bool:
+        if response.status_code not in CACHEABLE_STATUS_CODES:
+            return False
+        if stream_type_from_headers(response.headers) is not None:
+            return False
+        directives = _directives(response.headers.get("cache-control"))
+        if "no-store" in directives:
+            return False
+        if self.shared and "private" in directives:
+            return False
+        if (
+            self.shared
+            and "authorization" in request.headers
+            and not directives.keys() & {"public", "s-maxage", "must-revalidate"}
+        ):
+            # a shared cache must not hand one caller's answer to another
+            # unless the response says so, RFC 9111 section 3.5
+            return False
+        vary = {name.strip().lower() for name in _tags(response.headers.get("vary"))}
+        if not vary <= set(self.vary):
+            # the key does not cover every header the response varies on
+            return False
+        content_length = response.headers.get("content-length")
+        return content_length is None or int(content_length) <= self.max_bytes
+
+    def store(self, key: str, response: httpx.Response) -> None:
+        entry = CachedResponse(response, self.expires(response))
+        if entry.size > self.max_bytes:
+            return
+        if (previous := self.entries.pop(key, None)) is not None:
+            self.bytes -= previous.size
+        self.entries[key] = entry
+        self.bytes += entry.size
+        self.stores += 1
+        while self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def metrics(self) -> ResponseCacheMetricsDict:
+        return ResponseCacheMetricsDict(
+            hits=self.hits,
+            misses=self.misses,
+            revalidated=self.revalidated,
+            stores=self.stores,
+            evictions=self.evictions,
+            entries=len(self.entries),
+            bytes=self.bytes,
+        )
@@ -0,0 +1,183 @@
+import asyncio
+import time
+import typing
+
+from runpod_httpx_proxy.codecs import BodyCodec, EncodedBody
+from runpod_httpx_proxy.types import JSON
+
+T = typing.TypeVar("T")
+
+
+class CoalesceOptionsDict(typing.TypedDict, total=False):
+    max_items: typing.Annotated[int, "Items per frame before it is flushed"]
+    max_bytes: typing.Annotated[int, "Bytes per frame before it is flushed"]
+    max_linger: typing.Annotated[
+        float, "Seconds the first item of a frame may wait for company"
+    ]
+
+
+async def coalesce(
+    items: typing.AsyncIterable[T],
+    max_items: int = 256,
+    max_bytes: int = 64 * 1024,
+    max_linger: float = 0.02,
+    size: typing.Callable[[T], int] = len,  # type: ignore
+) -> typing.AsyncIterator[typing.List[T]]:
+    """
+    Batch `items` into lists, flushing a batch once it holds `max_items` items or
+    `max_bytes` bytes, or once its first item has waited `max_linger` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = aiter(items)
+    pending: typing.Optional[asyncio.Future[T]] = None
+    batch: typing.List[T] = []
+    batch_size = 0
+    flush_at = 0.0
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            timeout = max(0.0, flush_at - loop.time()) if batch else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield batch
+                batch, batch_size = [], 0
+                continue
+            future, pending = pending, None
+            try:
+                item = future.result()
+            except StopAsyncIteration:
+                break
+            if not batch:
+                flush_at = loop.time() + max_linger
+            batch.append(item)
+            batch_size += size(item)
+            if len(batch) >= max_items or batch_size >= max_bytes:
+                yield batch
+                batch, batch_size = [], 0
+        if batch:
+            yield batch
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+class StreamFrameDict(typing.TypedDict):
+    seq: typing.Annotated[int, "Position of the frame in the stream, from 0"]
+    chunks: typing.Annotated[typing.List[EncodedBody], "Encoded body chunks"]
+    last: typing.Annotated[
+        typing.NotRequired[bool], "Set on the empty frame that ends the stream"
+    ]
+    timings: typing.Annotated[
+        typing.NotRequired[dict[str, float]], "Worker timings, on the last frame"
+    ]
+    truncated: typing.Annotated[
+        typing.NotRequired[bool],
+        "Set on the last frame when the body was cut short at the deadline",
+    ]
+
+
+async def split_lines(
+    chunks: typing.AsyncIterable[bytes],
+) -> typing.AsyncIterator[bytes]:
+    """Re-chunk a byte stream into lines, keeping each line's terminator."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield bytes(buffer[start : end + 1])
+            start = end + 1
+        del buffer[:start]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def until(
+    items: typing.AsyncIterable[T],
+    deadline: float,
+    expired: typing.Optional[typing.Callable[[], None]] = None,
+) -> typing.AsyncIterator[T]:
+    """
+    Pass `items` through until the unix time `deadline` has passed, calling
+    `expired` if that happens before the items ran out.
+    """
+    iterator = aiter(items)
+    while (remaining := deadline - time.time()) > 0:
+        try:
+            item = await asyncio.wait_for(anext(iterator), remaining)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            break
+        yield item
+    if expired is not None:
+        expired()
+
+
+async def frame(
+    batches: typing.AsyncIterable[typing.List[bytes]],
+    codec: BodyCodec,
+    timings: typing.Optional[typing.Callable[[], dict[str, float]]] = None,
+    truncated: typing.Optional[typing.Callable[[], bool]] = None,
+) -> typing.AsyncIterator[StreamFrameDict]:
+    seq = 0
+    async for batch in batches:
+        yield StreamFrameDict(seq=seq, chunks=[codec.encode(chunk) for chunk in batch])
+        seq += 1
+    last = StreamFrameDict(seq=seq, chunks=[], last=True)
+    if timings is not None:
+        last["timings"] = timings()
+    if truncated is not None and truncated():
+        last["truncated"] = True
+    yield last
+
+
+class FrameCursor:
+    """
+    Tracks the next expected frame of a stream so replayed frames are dropped
+    and lost ones are noticed. Plain outputs from handlers that do not frame
+    their stream are passed through as they are.
+    """
+
+    next_seq: int
+    framed: bool
+    finished: bool
+    truncated: bool
+    timings: typing.Optional[dict[str, float]]
+
+    def __init__(self, codec: BodyCodec):
+        self.codec = codec
+        self.next_seq = 0
+        self.framed = False
+        self.finished = False
+        self.truncated = False
+        self.timings = None
+
+    @property
+    def missing_tail(self) -> bool:
+        """Whether a framed stream has not delivered its last frame yet."""
+        return self.framed and not self.finished
+
+    def read(self, outputs: typing.Iterable[JSON]) -> typing.Tuple[list[bytes], bool]:
+        """
+        Decode `outputs` into chunks, stopping at the first gap. The flag is
+        False when frames are missing before the remaining outputs.
+        """
+        chunks: list[bytes] = []
+        for output in outputs:
+            if isinstance(output, dict) and "seq" in output:
+                if output["seq"] < self.next_seq:
+                    continue
+                if output["seq"] > self.next_seq:
+                    return chunks, False
+                self.next_seq += 1
+                self.framed = True
+                self.finished = output.get("last", False)
+                if self.finished:
+                    self.timings = output.get("timings")
+                    self.truncated = output.get("truncated", False)
+                chunks.extend(self.codec.decode(chunk) for chunk in output["chunks"])
+            else:
+                chunks.append(self.codec.decode(output))
+        return chunks, True
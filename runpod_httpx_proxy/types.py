@@ -8,6 +8,7 @@ Note: These types are intentionally verbose and explicit to make them understanb
       Additionally, you can use these with `Unpack` to accept them as keyword arguments.
 """
 
+import concurrent.futures
 import typing
 import enum
 
@@ -51,6 +52,13 @@ JobOutput = typing.Annotated[
 class JobDict(typing.Generic[JobInput], TypedDict):
     id: typing.Annotated[str, "Unique identifier for the job"]
     input: typing.Annotated[JobInput, "the input for the job"]
+    s3Config: typing.Annotated[
+        typing.NotRequired[typing.Optional["S3ConfigDict"]],
+        "S3 config the job was submitted with",
+    ]
+    policy: typing.Annotated[
+        typing.NotRequired["PolicyDict"], "Execution policy of the job"
+    ]
 
 
 Handler = typing.Annotated[
@@ -76,6 +84,16 @@ class RunpodArgsDict(TypedDict):
     test_input: typing.Annotated[typing.Optional[str], "Test input for the worker"]
 
 
+ExecutorKind = typing.Annotated[
+    typing.Literal[
+        typing.Annotated[typing.Literal["inline"], "Run on the event loop"],
+        typing.Annotated[typing.Literal["thread"], "Run in a thread pool"],
+        typing.Annotated[typing.Literal["process"], "Run in a process pool"],
+    ],
+    "Where sync handlers are executed",
+]
+
+
 class StartConfigDict(typing.Generic[JobInput], TypedDict):
     handler: Handler[JobInput]
     return_aggregate_stream: typing.Annotated[
@@ -85,6 +103,14 @@ class StartConfigDict(typing.Generic[JobInput], TypedDict):
         typing.NotRequired[typing.Callable[[int], int]],
         "Function to modify concurrency",
     ]
+    executor: typing.Annotated[
+        typing.NotRequired[typing.Union[ExecutorKind, concurrent.futures.Executor]],
+        "Executor for sync handlers, inline by default",
+    ]
+    max_workers: typing.Annotated[
+        typing.NotRequired[typing.Optional[int]],
+        "Size of the pool created for a thread or process executor",
+    ]
 
 
 class WorkerConfigDict(StartConfigDict[JobInput]):
@@ -180,8 +206,8 @@ class HealthResponseDict(TypedDict):
 
 
 class RunSyncResponseDict(StatusDict):
-    delayTime: typing.Annotated[int, "Delay time in seconds"]
-    executionTime: typing.Annotated[int, "Execution time in seconds"]
+    delayTime: typing.Annotated[int, "Delay time in milliseconds"]
+    executionTime: typing.Annotated[int, "Execution time in milliseconds"]
     output: typing.Annotated[JSON, "Output of the job"]
 
 
@@ -194,11 +220,16 @@ class JobErrorDict(TypedDict):
 
 
 class PolicyDict(TypedDict):
-    executionTimeout: typing.Annotated[typing.NotRequired[int], "Timeout for the job"]
+    executionTimeout: typing.Annotated[
+        typing.NotRequired[int], "Milliseconds the job may run, at least 5000"
+    ]
     lowPriority: typing.Annotated[
         typing.NotRequired[bool], "Flag to run the job as low priority"
     ]
-    ttl: typing.Annotated[typing.NotRequired[int], "Number of retries for the job"]
+    ttl: typing.Annotated[
+        typing.NotRequired[int],
+        "Milliseconds the job may exist, queued or running, at least 10000",
+    ]
 
 
 class S3ConfigDict(TypedDict):
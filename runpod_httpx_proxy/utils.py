@@ -29,14 +29,51 @@ def is_content_type_multipart(headers: dict[str, str]) -> typing.Optional[str]:
     return content_type if "multipart/" in content_type else None
 
 
+def has_unread_body(request: httpx.Request) -> bool:
+    """Whether the request body is a stream that has not been read yet."""
+    try:
+        request.content
+    except httpx.RequestNotRead:
+        return True
+    return False
+
+
+def copy_request(
+    request: httpx.Request,
+    url: typing.Optional[str] = None,
+    headers: typing.Optional[dict[str, str]] = None,
+) -> httpx.Request:
+    """
+    Copy of `request` sharing its body, sent to `url` and with `headers` set,
+    so the caller's request is left as it was.
+    """
+    copied_headers = request.headers.copy()
+    copied_headers.update(headers or {})
+    body: dict[str, typing.Any] = {}
+    if has_unread_body(request):
+        body["stream"] = request.stream
+    elif request.content:
+        body["content"] = request.content
+    return httpx.Request(
+        request.method,
+        url if url is not None else request.url,
+        headers=copied_headers,
+        extensions=request.extensions,
+        **body,
+    )
+
+
 def is_content_length_missing(headers: dict[str, str]) -> bool:
     return headers.get("content-length") is None
 
 
 def stream_type_from_headers(
-    headers: httpx.Headers | dict[str, str]
+    headers: httpx.Headers | dict[str, str] | list[tuple[str, str]],
 ) -> typing.Optional[str]:
-    headers = {**headers} if isinstance(headers, httpx.Headers) else headers
+    if isinstance(headers, httpx.Headers):
+        headers = dict(headers.multi_items())
+    elif not isinstance(headers, dict):
+        headers = {name.lower(): value for name, value in headers}
     return (
         is_content_type_event_stream(headers)
         or is_chunked_transfer_encoding(headers)
@@ -50,6 +87,26 @@ def stream_type_from_headers(
     )
 
 
+DEADLINE_HEADER = "x-runpod-deadline"
+
+
+def deadline_from_headers(
+    headers: httpx.Headers | dict[str, str] | list[tuple[str, str]],
+) -> typing.Optional[float]:
+    """Unix time by which the caller stops waiting for the response, if any."""
+    if isinstance(headers, (httpx.Headers, dict)):
+        value = headers.get(DEADLINE_HEADER)
+    else:
+        value = next(
+            (value for name, value in headers if name.lower() == DEADLINE_HEADER),
+            None,
+        )
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
 def is_generator(handler: Handler[JobInput]) -> int:
     if inspect.isgeneratorfunction(handler):
         return 0b10
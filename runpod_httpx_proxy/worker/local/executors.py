@@ -0,0 +1,184 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import multiprocessing.managers
+import queue
+import typing
+
+from runpod_httpx_proxy.types import JSON, ExecutorKind
+
+T = typing.TypeVar("T")
+
+_OUTPUT, _ERROR, _DONE = 0, 1, 2
+# how often a pool process blocked on a full queue checks for cancellation
+_STOP_INTERVAL = 0.1
+
+
+def executor_from_kind(
+    kind: typing.Union[ExecutorKind, concurrent.futures.Executor, None],
+    max_workers: typing.Optional[int] = None,
+) -> typing.Optional[concurrent.futures.Executor]:
+    """Create the pool for `kind`, None meaning the handler runs inline."""
+    if kind is None or kind == "inline":
+        return None
+    if isinstance(kind, concurrent.futures.Executor):
+        return kind
+    if kind == "thread":
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix="local-worker"
+        )
+    if kind == "process":
+        return concurrent.futures.ProcessPoolExecutor(max_workers)
+    raise ValueError(f"Unsupported executor: {kind}")
+
+
+def _put(
+    outputs: "queue.Queue[typing.Tuple[int, typing.Any]]",
+    stop: typing.Any,
+    item: typing.Tuple[int, typing.Any],
+) -> bool:
+    while not stop.is_set():
+        try:
+            outputs.put(item, timeout=_STOP_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _exhaust(
+    generator_function: typing.Callable[..., typing.Iterator[JSON]],
+    input: typing.Any,
+    outputs: "queue.Queue[typing.Tuple[int, typing.Any]]",
+    stop: typing.Any,
+) -> None:
+    # runs in the pool process and hands each output over as it is produced,
+    # waiting while the queue is full and giving up once the job is cancelled
+    generator = generator_function(input)
+    try:
+        for output in generator:
+            if not _put(outputs, stop, (_OUTPUT, output)):
+                return
+    except BaseException as exc:
+        _put(outputs, stop, (_ERROR, exc))
+    else:
+        _put(outputs, stop, (_DONE, None))
+    finally:
+        generator.close()
+
+
+class SyncRunner:
+    """
+    Runs sync handlers and sync generator handlers without blocking the event
+    loop. With a thread pool each `next()` of a generator runs in the pool. A
+    process pool runs the whole generator in a pool process and sends the
+    outputs back through a manager queue holding at most `max_pending` of
+    them, so process handlers must be picklable, i.e. defined at module level.
+    """
+
+    executor: typing.Optional[concurrent.futures.Executor]
+
+    def __init__(
+        self,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+        owned: bool = False,
+        max_pending: int = 16,
+    ):
+        self.executor = executor
+        self.owned = owned
+        self.max_pending = max_pending
+        self._manager: typing.Optional[multiprocessing.managers.SyncManager] = None
+
+    @property
+    def is_process(self) -> bool:
+        return isinstance(self.executor, concurrent.futures.ProcessPoolExecutor)
+
+    async def call(self, function: typing.Callable[..., T], *args: typing.Any) -> T:
+        if self.executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args
+        )
+
+    async def iterate(
+        self,
+        generator_function: typing.Callable[..., typing.Iterator[JSON]],
+        input: typing.Any,
+    ) -> typing.AsyncIterator[JSON]:
+        if self.executor is None:
+            for output in generator_function(input):
+                yield output
+        elif self.is_process:
+            async for output in self._iterate_process(generator_function, input):
+                yield output
+        else:
+            async for output in self._iterate_thread(generator_function, input):
+                yield output
+
+    async def _iterate_thread(
+        self,
+        generator_function: typing.Callable[..., typing.Iterator[JSON]],
+        input: typing.Any,
+    ) -> typing.AsyncIterator[JSON]:
+        loop = asyncio.get_running_loop()
+        generator = generator_function(input)
+        sentinel = object()
+        pending: typing.Optional[asyncio.Future[typing.Any]] = None
+        try:
+            while True:
+                pending = loop.run_in_executor(self.executor, next, generator, sentinel)
+                output = await pending
+                pending = None
+                if output is sentinel:
+                    return
+                yield output
+        finally:
+            # a generator can not be closed while another thread is inside it
+            if pending is not None:
+                pending.add_done_callback(lambda _: generator.close())
+            else:
+                generator.close()
+
+    async def _iterate_process(
+        self,
+        generator_function: typing.Callable[..., typing.Iterator[JSON]],
+        input: typing.Any,
+    ) -> typing.AsyncIterator[JSON]:
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        loop = asyncio.get_running_loop()
+        outputs = self._manager.Queue(self.max_pending)
+        stop = self._manager.Event()
+        done = loop.run_in_executor(
+            self.executor, _exhaust, generator_function, input, outputs, stop
+        )
+        finished = False
+        try:
+            while True:
+                kind, value = await loop.run_in_executor(None, outputs.get)
+                if kind == _DONE:
+                    break
+                if kind == _ERROR:
+                    raise value
+                yield value
+            finished = True
+            await done
+        finally:
+            if not finished:
+                # a process can not be interrupted, the stop event ends the
+                # generator at its next output, and the sentinel releases the
+                # thread still waiting in outputs.get
+                stop.set()
+                try:
+                    outputs.put_nowait((_DONE, None))
+                except queue.Full:
+                    # the waiting thread returns with an output already
+                    pass
+            done.cancel()
+
+    def close(self) -> None:
+        if self.owned and self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
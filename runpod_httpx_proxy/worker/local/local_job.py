@@ -1,4 +1,5 @@
 from runpod_httpx_proxy.utils import is_generator, is_coroutine
+from runpod_httpx_proxy.worker.local.executors import SyncRunner
 from uuid_extensions import uuid7str  # type: ignore
 from runpod_httpx_proxy.types import (
     JSON,
@@ -8,10 +9,15 @@ from runpod_httpx_proxy.types import (
     Handler,
     JobDict,
     JobInput,
-    JobOutputDict,
     JobType,
+    S3ConfigDict,
+    Status,
     SyncFunctionOutput,
 )
+import asyncio
+import collections
+import contextlib
+import time
 import typing
 
 
@@ -21,28 +27,140 @@ def job_type_from_handler(handler: Handler[JobInput]) -> JobType:
 
 class LocalJob(typing.Generic[JobInput]):
     handler: Handler[JobInput]
+    runner: SyncRunner
     id: str
     type: JobType
+    input: typing.Optional[JobDict[JobInput]]
     output: JSON
-    stream: typing.List[JobOutputDict]
+    stream: collections.deque[JSON]
+    max_stream_size: int
+    aggregate: bool
+    status: Status
+    error: typing.Optional[str]
+    created_at: float
+    started_at: typing.Optional[float]
+    finished_at: typing.Optional[float]
+    finished: asyncio.Event
 
-    def __init__(self, handler: Handler[JobInput]):
+    def __init__(
+        self,
+        handler: Handler[JobInput],
+        input: typing.Optional[JobInput] = None,
+        max_stream_size: int = 1024,
+        aggregate: bool = False,
+        runner: typing.Optional[SyncRunner] = None,
+        s3_config: typing.Optional[S3ConfigDict] = None,
+    ):
         self.handler = handler
+        self.runner = runner if runner is not None else SyncRunner()
         self.id = uuid7str()
         self.type = job_type_from_handler(self.handler)
+        self.input = JobDict(id=self.id, input=input) if input is not None else None
+        if self.input is not None and s3_config is not None:
+            self.input["s3Config"] = s3_config
         self.output = []
+        self.stream = collections.deque()
+        # set by the first /stream read, nobody waits for the buffer before
+        self.has_reader = False
+        self.max_stream_size = max_stream_size
+        self.aggregate = aggregate
+        self.stream_writable = asyncio.Event()
+        self.stream_writable.set()
+        self.status = "IN_QUEUE"
+        self.error = None
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.finished = asyncio.Event()
 
-    async def run(self, input: JobDict[JobInput]) -> JSON:
+    @property
+    def is_generator(self) -> bool:
+        return self.type in (JobType.SYNC_GENERATOR, JobType.ASYNC_GENERATOR)
+
+    @property
+    def delay_time(self) -> typing.Optional[int]:
+        if self.started_at is None:
+            return None
+        return int((self.started_at - self.created_at) * 1000)
+
+    @property
+    def execution_time(self) -> typing.Optional[int]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return int((self.finished_at - self.started_at) * 1000)
+
+    async def run(self, input: typing.Optional[JobDict[JobInput]] = None) -> JSON:
+        input = input if input is not None else self.input
+        self.input = None
+        self.status = "IN_PROGRESS"
+        self.started_at = time.monotonic()
+        try:
+            await self.execute(typing.cast(JobDict[JobInput], input))
+            self.status = "COMPLETED"
+        except asyncio.CancelledError:
+            self.status = "CANCELLED"
+            raise
+        except Exception as exc:
+            self.status = "FAILED"
+            self.error = str(exc)
+        finally:
+            self.finished_at = time.monotonic()
+            self.finished.set()
+        return self.output
+
+    async def execute(self, input: JobDict[JobInput]) -> None:
         if self.type == JobType.SYNC_FUNCTION:
-            self.output = typing.cast(SyncFunctionOutput, self.handler(input))
+            self.output = typing.cast(
+                SyncFunctionOutput, await self.runner.call(self.handler, input)
+            )
+            self.stream.append(self.output)
         elif self.type == JobType.ASYNC_FUNCTION:
             self.output = await typing.cast(CoroutineJobOutput, self.handler(input))
+            self.stream.append(self.output)
         elif self.type == JobType.SYNC_GENERATOR:
             self.output = []
-            for output in typing.cast(GeneratorOutput, self.handler(input)):
-                self.output.append(output)
+            outputs = self.runner.iterate(
+                typing.cast(typing.Callable[..., GeneratorOutput], self.handler), input
+            )
+            # closed right away when the job is cancelled while pushing, so the
+            # runner stops the handler instead of leaving it to the gc
+            async with contextlib.aclosing(outputs):
+                async for output in outputs:
+                    await self.push(output)
         elif self.type == JobType.ASYNC_GENERATOR:
             self.output = []
             async for output in typing.cast(AsyncGeneratorOutput, self.handler(input)):
-                self.output.append(output)
-        return self.output
+                await self.push(output)
+
+    async def push(self, output: JSON) -> None:
+        if self.has_reader:
+            # the handler is paused while the stream buffer is full, so a
+            # reader that falls behind bounds the memory of the job instead of
+            # growing it
+            while len(self.stream) >= self.max_stream_size:
+                self.stream_writable.clear()
+                await self.stream_writable.wait()
+        elif len(self.stream) >= self.max_stream_size:
+            # without a reader there is nobody to wait for, jobs answered
+            # through /runsync or /status run to completion and only the
+            # newest outputs are kept for a reader that shows up late
+            self.stream.popleft()
+        self.stream.append(output)
+        if self.aggregate:
+            typing.cast(typing.List[JSON], self.output).append(output)
+
+    def drain(self) -> typing.List[JSON]:
+        """Take every output produced since the last call."""
+        self.has_reader = True
+        outputs = list(self.stream)
+        self.stream.clear()
+        self.stream_writable.set()
+        return outputs
+
+    def cancel(self) -> None:
+        # only used for jobs that never started, running ones are cancelled
+        # through their task
+        self.input = None
+        self.status = "CANCELLED"
+        self.finished_at = time.monotonic()
+        self.finished.set()
@@ -3,24 +3,54 @@ from starlette.applications import Starlette
 from starlette.routing import Route
 from collections import OrderedDict
 from starlette.requests import Request
+from starlette.responses import JSONResponse
 import asyncio
+import functools
 from runpod_httpx_proxy.types import (
     JSON,
     ConcurrencyModifier,
     Handler,
+    HealthResponseDict,
+    JobHealthDict,
     JobInput,
+    S3ConfigDict,
     StartConfigDict,
+    WorkerHealthDict,
 )
+from runpod_httpx_proxy.worker.local.executors import SyncRunner, executor_from_kind
 from runpod_httpx_proxy.worker.local.local_job import LocalJob
 
+FINISHED_STATUSES = ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT")
+
 
 class LocalWorker(typing.Generic[JobInput], Starlette):
-    job_queue: OrderedDict[str, asyncio.Task[JSON]]
+    """
+    Local stand-in for a RunPod serverless endpoint.
+
+    Jobs wait in a bounded FIFO queue and are admitted whenever one is
+    submitted or finishes, as long as fewer than `concurrency` jobs are
+    running. `concurrency` is re-evaluated through `concurrency_modifier` on
+    every admission, the same way the RunPod worker scales its job fetching.
+    """
+
+    jobs: OrderedDict[str, LocalJob[JobInput]]
+    job_queue: OrderedDict[str, LocalJob[JobInput]]
+    running: dict[str, asyncio.Task[JSON]]
+    concurrency: int
     concurrency_modifier: ConcurrencyModifier
     config: StartConfigDict[JobInput]
     handler: Handler[JobInput]
+    runner: SyncRunner
+    job_health: JobHealthDict
 
-    def __init__(self, start_config_dict: StartConfigDict[JobInput]):
+    def __init__(
+        self,
+        start_config_dict: StartConfigDict[JobInput],
+        max_queue_size: int = 1024,
+        max_finished_jobs: int = 1024,
+        runsync_timeout: float = 90.0,
+        max_stream_size: int = 1024,
+    ):
         super().__init__(
             routes=[
                 Route("/runsync", self.run_sync, methods=["POST"]),
@@ -37,38 +67,162 @@ class LocalWorker(typing.Generic[JobInput], Starlette):
         self.concurrency_modifier = start_config_dict.get(
             "concurrency_modifier", lambda concurrency: concurrency
         )
+        self.concurrency = 1
+        executor = start_config_dict.get("executor")
+        self.runner = SyncRunner(
+            executor_from_kind(executor, start_config_dict.get("max_workers")),
+            owned=isinstance(executor, str),
+        )
+        self.max_queue_size = max_queue_size
+        self.max_finished_jobs = max_finished_jobs
+        self.runsync_timeout = runsync_timeout
+        self.max_stream_size = max_stream_size
+        self.jobs = OrderedDict()
         self.job_queue = OrderedDict()
+        self.running = {}
+        self.job_health = JobHealthDict(
+            completed=0, failed=0, cancelled=0, timedOut=0, inQueue=0, retried=0
+        )
 
-    async def run_sync(self, request: Request):
-        await self.wait_for_concurrency()
-        job = LocalJob(self.handler)
-        task = asyncio.create_task(
-            job.run(input=await request.json()),
-            name=job.id,
+    def submit(
+        self,
+        input: JobInput,
+        s3_config: typing.Optional[S3ConfigDict] = None,
+    ) -> typing.Optional[LocalJob[JobInput]]:
+        if len(self.job_queue) >= self.max_queue_size:
+            return None
+        job = LocalJob(
+            self.handler,
+            input,
+            max_stream_size=self.max_stream_size,
+            aggregate=self.config.get("return_aggregate_stream", False),
+            runner=self.runner,
+            s3_config=s3_config,
         )
-        await task
+        self.jobs[job.id] = job
+        self.job_queue[job.id] = job
+        self.admit()
+        return job
+
+    def admit(self) -> None:
+        while self.job_queue:
+            self.concurrency = max(1, self.concurrency_modifier(self.concurrency))
+            if len(self.running) >= self.concurrency:
+                return
+            _, job = self.job_queue.popitem(last=False)
+            task = asyncio.create_task(job.run(), name=job.id)
+            self.running[job.id] = task
+            task.add_done_callback(functools.partial(self.finish, job))
 
-    async def run(self):
-        pass
+    def finish(self, job: LocalJob[JobInput], task: typing.Any = None) -> None:
+        self.running.pop(job.id, None)
+        if not job.finished.is_set():
+            # the task was cancelled before the job got to run
+            job.cancel()
+        if job.status == "COMPLETED":
+            self.job_health["completed"] += 1
+        elif job.status == "FAILED":
+            self.job_health["failed"] += 1
+        elif job.status == "CANCELLED":
+            self.job_health["cancelled"] += 1
+        elif job.status == "TIMED_OUT":
+            self.job_health["timedOut"] += 1
+        self.evict()
+        self.admit()
 
-    async def stream(self, job_id: str):
-        pass
+    def evict(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.status in FINISHED_STATUSES
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
 
-    async def status(self, job_id: str):
-        pass
+    def close(self) -> None:
+        for task in self.running.values():
+            task.cancel()
+        self.runner.close()
 
-    async def cancel(self, job_id: str):
-        pass
+    def job_from_request(self, request: Request) -> typing.Optional[LocalJob]:
+        return self.jobs.get(request.path_params["job_id"])
 
-    async def purge_queue(self):
-        pass
+    def status_dict(
+        self, job: LocalJob[JobInput], output: bool = True
+    ) -> dict[str, JSON]:
+        content: dict[str, JSON] = {"id": job.id, "status": job.status}
+        if job.delay_time is not None:
+            content["delayTime"] = job.delay_time
+        if job.execution_time is not None:
+            content["executionTime"] = job.execution_time
+        if job.error is not None:
+            content["error"] = job.error
+        if output and job.status == "COMPLETED":
+            if not job.is_generator or job.aggregate:
+                content["output"] = job.output
+        return content
 
-    async def health(self):
-        pass
+    async def run_sync(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        job = self.submit(body["input"], body.get("s3Config"))
+        if job is None:
+            return JSONResponse({"error": "queue is full"}, status_code=429)
+        try:
+            await asyncio.wait_for(job.finished.wait(), self.runsync_timeout)
+        except asyncio.TimeoutError:
+            pass
+        return JSONResponse(self.status_dict(job))
 
-    async def wait_for_concurrency(self):
-        async def check_concurrency():
-            while not self.concurrency_modifier(len(self.job_queue)) > 0:
-                await asyncio.sleep(0)
+    async def run(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        job = self.submit(body["input"], body.get("s3Config"))
+        if job is None:
+            return JSONResponse({"error": "queue is full"}, status_code=429)
+        return JSONResponse({"id": job.id, "status": job.status})
 
-        await asyncio.wait_for(check_concurrency(), timeout=1)
+    async def stream(self, request: Request) -> JSONResponse:
+        job = self.job_from_request(request)
+        if job is None:
+            return JSONResponse({"error": "job not found"}, status_code=404)
+        content = self.status_dict(job, output=False)
+        # outputs are handed out as they are produced and only streamed once
+        content["stream"] = [{"output": output} for output in job.drain()]
+        return JSONResponse(content)
+
+    async def status(self, request: Request) -> JSONResponse:
+        job = self.job_from_request(request)
+        if job is None:
+            return JSONResponse({"error": "job not found"}, status_code=404)
+        return JSONResponse(self.status_dict(job))
+
+    async def cancel(self, request: Request) -> JSONResponse:
+        job = self.job_from_request(request)
+        if job is None:
+            return JSONResponse({"error": "job not found"}, status_code=404)
+        if self.job_queue.pop(job.id, None) is not None:
+            job.cancel()
+            self.finish(job)
+        elif (task := self.running.get(job.id)) is not None:
+            task.cancel()
+            await asyncio.wait({task})
+        return JSONResponse({"id": job.id, "status": job.status})
+
+    async def purge_queue(self, request: Request) -> JSONResponse:
+        removed = len(self.job_queue)
+        while self.job_queue:
+            _, job = self.job_queue.popitem(last=False)
+            job.cancel()
+            self.job_health["cancelled"] += 1
+        self.evict()
+        return JSONResponse({"removed": removed, "status": "COMPLETED"})
+
+    async def health(self, request: Request) -> JSONResponse:
+        running = len(self.running)
+        return JSONResponse(
+            HealthResponseDict(
+                jobs={**self.job_health, "inQueue": len(self.job_queue)},
+                workers=WorkerHealthDict(
+                    idle=max(0, self.concurrency - running), running=running
+                ),
+            )
+        )
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+async def get_json(request: Request):
+    return JSONResponse({"message": "Hello, World!"})
+
+
+async def post_echo(request: Request):
+    return Response(
+        await request.body(),
+        media_type=request.headers.get("content-type", "application/octet-stream"),
+    )
+
+
+async def get_stream_ndjson(request: Request):
+    count = int(request.query_params.get("count", 3))
+    delay = float(request.query_params.get("delay", 0))
+
+    async def stream():
+        for i in range(count):
+            yield f"{json.dumps({'data': i})}\n"
+            await asyncio.sleep(delay)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+async def get_slow(request: Request):
+    await asyncio.sleep(float(request.query_params.get("delay", 0.2)))
+    return JSONResponse({"message": "Hello, World!"})
+
+
+app = Starlette(
+    routes=[
+        Route("/json", get_json, methods=["GET"]),
+        Route("/echo", post_echo, methods=["POST"]),
+        Route("/stream_ndjson", get_stream_ndjson, methods=["GET"]),
+        Route("/slow", get_slow, methods=["GET"]),
+    ]
+)
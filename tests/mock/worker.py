@@ -1,84 +1,184 @@
+import asyncio
+import time
+import typing
+import uuid
+
 from starlette.applications import Starlette
-from starlette.routing import Route
+from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.routing import Route
 
-
-async def runsync():
-    return JSONResponse({"message": "Hello, World!"})
-
-
-async def run():
-    return JSONResponse({"message": "Hello, World!"})
-
-
-async def stream(job_id: str):
-    return JSONResponse({"message": f"Hello, World! {job_id}"})
-
-
-core = Starlette(
-    routes=[
-        Route("/runsync", runsync),
-        Route("/run", run),
-        Route("/stream/{job_id:str}", stream),
-    ]
-)
-
-
-class Worker(Starlette):
-    def __init__(self):
+from runpod_httpx_proxy.types import JSON, Status
+
+
+class MockJob:
+    id: str
+    input: JSON
+    s3_config: typing.Optional[JSON]
+    policy: typing.Optional[JSON]
+    status: Status
+    stream: typing.List[JSON]
+    output: typing.List[JSON]
+    error: typing.Optional[str]
+    created: float
+    started: typing.Optional[float]
+    finished: typing.Optional[float]
+    task: typing.Optional[asyncio.Task[None]]
+
+    def __init__(
+        self,
+        input: JSON,
+        s3_config: typing.Optional[JSON] = None,
+        policy: typing.Optional[JSON] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.input = input
+        self.s3_config = s3_config
+        self.policy = policy
+        self.status = "IN_QUEUE"
+        self.stream = []
+        self.output = []
+        self.error = None
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.task = None
+
+    def timings(self) -> dict[str, int]:
+        if self.started is None or self.finished is None:
+            return {}
+        return {
+            "delayTime": int((self.started - self.created) * 1000),
+            "executionTime": int((self.finished - self.started) * 1000),
+        }
+
+
+class MockWorker(Starlette):
+    """
+    In-memory stand-in for the RunPod serverless API used by the client tests.
+
+    Jobs run the given async generator handler in the background after
+    `queue_delay` seconds, and every route counts its calls in `calls`. The
+    stream calls numbered in `failed_polls` answer 503 without consuming any
+    output. Of the stream calls that deliver output, the ones numbered in
+    `lost_polls` consume it and answer 502.
+    """
+
+    def __init__(
+        self,
+        handler: typing.Callable[[dict[str, JSON]], typing.AsyncGenerator[JSON, None]],
+        queue_delay: float = 0.0,
+        runsync_timeout: float = 1.0,
+        failed_polls: typing.Collection[int] = (),
+        lost_polls: typing.Collection[int] = (),
+    ):
         super().__init__(
             routes=[
-                Route("/runsync", runsync),
-                Route("/run", run),
-                Route("/stream/{job_id:str}", stream),
+                Route("/v2/{endpoint_id}/runsync", self.runsync, methods=["POST"]),
+                Route("/v2/{endpoint_id}/run", self.run, methods=["POST"]),
+                Route(
+                    "/v2/{endpoint_id}/stream/{job_id}",
+                    self.stream,
+                    methods=["GET", "POST"],
+                ),
+                Route(
+                    "/v2/{endpoint_id}/status/{job_id}",
+                    self.status,
+                    methods=["GET", "POST"],
+                ),
+                Route(
+                    "/v2/{endpoint_id}/cancel/{job_id}", self.cancel, methods=["POST"]
+                ),
             ]
         )
-
-    def runsync(self):
-        
-@app.get("/stream")
-async def stream():
-    async def streamer():
-        yield MESSAGE
-        await asyncio.sleep(5)
-        yield MESSAGE
-        await asyncio.sleep(5)
-        yield MESSAGE
-
-    return StreamingResponse(
-        streamer(),
-        headers={"Transfer-Encoding": "chunked"},
-    )
-
-
-@app.get("/stream_sse")
-async def stream_sse():
-    async def event_publisher():
-        for i in range(10):
-            yield dict(data=i)
-            await asyncio.sleep(0.2)
-
-    return EventSourceResponse(event_publisher())
-
-
-@app.get("/json")
-async def json():
-    return {"message": "Hello, World!"}
-
-
-runpod.serverless.start(
-    {
-        "handler": runpod_httpx_proxy.handlers.AsyncHandler(app),
-    }
-)
-
-# worker = WorkerAPI(
-#     {
-#         "handler": runpod_httpx_proxy.handlers.AsyncHandler(app),
-#     }
-# ).rp_app
-
-if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(worker, host="localhost", port=8000)
+        self.handler = handler
+        self.queue_delay = queue_delay
+        self.runsync_timeout = runsync_timeout
+        self.failed_polls = failed_polls
+        self.lost_polls = lost_polls
+        self.deliveries = 0
+        self.jobs: dict[str, MockJob] = {}
+        self.calls: dict[str, int] = {}
+
+    def count(self, route: str) -> None:
+        self.calls[route] = self.calls.get(route, 0) + 1
+
+    async def execute(self, job: MockJob) -> None:
+        try:
+            await asyncio.sleep(self.queue_delay)
+        except asyncio.CancelledError:
+            job.status = "CANCELLED"
+            return
+        job.status = "IN_PROGRESS"
+        job.started = time.monotonic()
+        try:
+            job_dict = {"id": job.id, "input": job.input}
+            if job.s3_config is not None:
+                job_dict["s3Config"] = job.s3_config
+            async for output in self.handler(job_dict):
+                job.stream.append(output)
+                job.output.append(output)
+            job.status = "COMPLETED"
+        except asyncio.CancelledError:
+            job.status = "CANCELLED"
+        except Exception as exc:
+            job.status = "FAILED"
+            job.error = str(exc)
+        job.finished = time.monotonic()
+
+    async def run(self, request: Request) -> JSONResponse:
+        self.count("run")
+        body = await request.json()
+        job = MockJob(body["input"], body.get("s3Config"), body.get("policy"))
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self.execute(job))
+        return JSONResponse({"id": job.id, "status": job.status})
+
+    async def runsync(self, request: Request) -> JSONResponse:
+        self.count("runsync")
+        body = await request.json()
+        job = MockJob(body["input"], body.get("s3Config"), body.get("policy"))
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self.execute(job))
+        await asyncio.wait({job.task}, timeout=self.runsync_timeout)
+        content: dict[str, JSON] = {"id": job.id, "status": job.status}
+        if job.status == "COMPLETED":
+            content["output"] = job.output
+        if job.error is not None:
+            content["error"] = job.error
+        return JSONResponse({**content, **job.timings()})
+
+    async def stream(self, request: Request) -> JSONResponse:
+        self.count("stream")
+        if self.calls["stream"] in self.failed_polls:
+            return JSONResponse({"error": "unavailable"}, status_code=503)
+        job = self.jobs[request.path_params["job_id"]]
+        stream, job.stream = job.stream, []
+        if stream:
+            self.deliveries += 1
+            if self.deliveries in self.lost_polls:
+                return JSONResponse({"error": "bad gateway"}, status_code=502)
+        content: dict[str, JSON] = {
+            "id": job.id,
+            "status": job.status,
+            "stream": [{"output": output} for output in stream],
+            **job.timings(),
+        }
+        if job.error is not None:
+            content["error"] = job.error
+        return JSONResponse(content)
+
+    async def status(self, request: Request) -> JSONResponse:
+        self.count("status")
+        job = self.jobs[request.path_params["job_id"]]
+        content: dict[str, JSON] = {"id": job.id, "status": job.status}
+        if job.status == "COMPLETED":
+            content["output"] = job.output
+        return JSONResponse({**content, **job.timings()})
+
+    async def cancel(self, request: Request) -> JSONResponse:
+        self.count("cancel")
+        job = self.jobs[request.path_params["job_id"]]
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        return JSONResponse({"id": job.id, "status": "CANCELLED"})
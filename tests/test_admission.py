@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+
+import httpx
+
+import runpod_httpx_proxy
+from runpod_httpx_proxy.clients.admission import AdmissionController
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from tests.mock.app import app
+from tests.mock.worker import MockWorker
+
+
+class TestAdmission(unittest.IsolatedAsyncioTestCase):
+
+    async def test_interactive_requests_are_admitted_first(self):
+        admission = AdmissionController(max_inflight=1)
+        release = await admission.admit("endpoint", "batch")
+        admitted = []
+
+        async def wait(name, priority):
+            release = await admission.admit("endpoint", priority)
+            admitted.append(name)
+            release()
+
+        batch = asyncio.create_task(wait("batch", "batch"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait("interactive", "interactive"))
+        await asyncio.sleep(0)
+        metrics = admission.metrics()["endpoint"]
+        self.assertEqual(metrics["queued"], {"interactive": 1, "batch": 1})
+        release()
+        release()
+        await asyncio.gather(batch, interactive)
+        self.assertEqual(admitted, ["interactive", "batch"])
+        metrics = admission.metrics()["endpoint"]
+        self.assertEqual(metrics["inflight"], 0)
+        self.assertEqual(metrics["admitted"], {"interactive": 1, "batch": 2})
+        self.assertGreater(metrics["max_wait_ms"]["batch"], 0)
+
+    async def test_cancelled_waiters_leave_the_queue(self):
+        admission = AdmissionController(max_inflight=1)
+        release = await admission.admit("endpoint", "interactive")
+        waiter = asyncio.create_task(admission.admit("endpoint", "interactive"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        release()
+        metrics = admission.metrics()["endpoint"]
+        self.assertEqual(
+            (metrics["inflight"], metrics["queued"]["interactive"]), (0, 0)
+        )
+
+    async def test_client_limits_jobs_in_flight_and_marks_batch_jobs(self):
+        running = peak = 0
+        handler = async_handler(app)
+
+        async def counting_handler(job):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                async for output in handler(job):
+                    yield output
+            finally:
+                running -= 1
+
+        worker = MockWorker(counting_handler)
+        async with runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=httpx.ASGITransport(worker),
+            admission={"max_inflight": 2},
+            poll_options={"min_interval": 0.001},
+        ) as client:
+
+            async def stream(priority):
+                async with client.stream(
+                    "GET",
+                    "/stream_ndjson?count=3&delay=0.01",
+                    extensions={"runpod_priority": priority},
+                ) as response:
+                    return [line async for line in response.aiter_lines() if line]
+
+            results = await asyncio.gather(
+                *(stream("batch" if i % 2 else "interactive") for i in range(6))
+            )
+            metrics = client.admission.metrics()["http://runpod.test/v2/mock"]
+        self.assertTrue(all(len(lines) == 3 for lines in results))
+        self.assertLessEqual(peak, 2)
+        self.assertEqual(metrics["inflight"], 0)
+        self.assertEqual(metrics["admitted"], {"interactive": 3, "batch": 3})
+        policies = [job.policy for job in worker.jobs.values()]
+        self.assertEqual(policies.count({"lowPriority": True}), 3)
+        self.assertEqual(policies.count(None), 3)
+
+    async def test_batched_job_takes_one_slot(self):
+        worker = MockWorker(async_handler(app))
+        async with runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=httpx.ASGITransport(worker),
+            admission={"max_inflight": 1},
+            batching={"max_size": 4, "max_wait": 0.01},
+            poll_options={"min_interval": 0.001},
+        ) as client:
+            responses = await asyncio.gather(
+                *(client.post("/echo", content=f"{i}") for i in range(8))
+            )
+            metrics = client.admission.metrics()["http://runpod.test/v2/mock"]
+        self.assertEqual(
+            [response.text for response in responses], [f"{i}" for i in range(8)]
+        )
+        # requests waiting in the batcher hold no slot, so both jobs are full
+        self.assertEqual(sorted(len(job.input) for job in worker.jobs.values()), [4, 4])
+        self.assertEqual(
+            (metrics["inflight"], metrics["admitted"]["interactive"]), (0, 2)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,20 @@
 import asyncio
+import json
+import time
 import httpx
 from httpx_sse import aconnect_sse
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
 import runpod_httpx_proxy
 import unittest
+from runpod_httpx_proxy.codecs import BodyCodec
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.response_cache import ResponseCache
+from tests.mock.app import app
+from tests.mock.worker import MockWorker
 
 
 class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
@@ -51,5 +63,373 @@ class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
                 i += 1
 
 
+class TestAsyncClientMockWorker(unittest.IsolatedAsyncioTestCase):
+
+    def mock_client(self, worker: MockWorker, **kwargs):
+        return runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=httpx.ASGITransport(worker),
+            **kwargs,
+        )
+
+    async def test_get_json(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(worker) as client:
+            response = await client.get("/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"message": "Hello, World!"})
+
+    async def test_stream_prefetch_matches_serial_stream(self):
+        worker = MockWorker(async_handler(app))
+        contents = []
+        for stream_prefetch in (None, {"max_chunks": 2}):
+            async with self.mock_client(
+                worker, stream_prefetch=stream_prefetch
+            ) as client:
+                async with client.stream("GET", "/stream_ndjson") as response:
+                    contents.append(
+                        b"".join([chunk async for chunk in response.aiter_bytes()])
+                    )
+        self.assertTrue(contents[0])
+        self.assertEqual(contents[0], contents[1])
+
+    async def test_get_stream_ndjson(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(worker) as client:
+            async with client.stream("GET", "/stream_ndjson?count=5") as response:
+                lines = [line async for line in response.aiter_lines()]
+        self.assertEqual(lines, [f'{{"data": {i}}}' for i in range(5)])
+
+    async def test_stream_retries_failed_polls(self):
+        worker = MockWorker(async_handler(app), failed_polls={2, 3})
+        async with self.mock_client(worker) as client:
+            response = await client.get("/stream_ndjson?count=5&delay=0.02")
+        self.assertEqual(response.text, "".join(f'{{"data": {i}}}\n' for i in range(5)))
+
+    async def test_stream_recovers_lost_frames(self):
+        async def handler(job):
+            yield {
+                "status_code": 200,
+                "headers": {"content-type": "application/x-ndjson"},
+                "content": None,
+                "request": job["input"],
+            }
+            for seq in range(5):
+                await asyncio.sleep(0.03)
+                yield {"seq": seq, "chunks": [f"{seq}\n"]}
+            yield {"seq": 5, "chunks": [], "last": True}
+
+        for lost_polls in ({2}, {3}):
+            for stream_prefetch in (None, {"max_chunks": 2}):
+                worker = MockWorker(handler, lost_polls=lost_polls)
+                async with self.mock_client(
+                    worker,
+                    poll_options={"min_interval": 0.01},
+                    stream_prefetch=stream_prefetch,
+                ) as client:
+                    response = await client.get("/stream_ndjson")
+                self.assertEqual(response.text, "0\n1\n2\n3\n4\n")
+                self.assertGreaterEqual(worker.calls["status"], 1)
+
+    async def test_post_binary_body(self):
+        worker = MockWorker(async_handler(app))
+        body = bytes(range(256)) * 64
+        async with self.mock_client(
+            worker, codec=BodyCodec(compression="gzip", compress_threshold=1024)
+        ) as client:
+            response = await client.post(
+                "/echo",
+                content=body,
+                headers={"content-type": "application/octet-stream"},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, body)
+
+    async def test_compressed_responses_round_trip(self):
+        body = "compressible " * 1000
+
+        async def text(request):
+            return PlainTextResponse(body)
+
+        compressed = Starlette(
+            routes=[Route("/text", text)], middleware=[Middleware(GZipMiddleware)]
+        )
+        for cache in (None, ResponseCache()):
+            worker = MockWorker(async_handler(compressed, cache=cache))
+            async with self.mock_client(
+                worker, poll_options={"min_interval": 0.001}
+            ) as client:
+                responses = [await client.get("/text") for _ in range(2)]
+            with self.subTest(cache=cache is not None):
+                self.assertEqual([response.text for response in responses], [body] * 2)
+                job, *_ = worker.jobs.values()
+                # the app's gzip body is forwarded as it was sent
+                self.assertEqual(
+                    dict(job.output[0]["headers"]).get("content-encoding"),
+                    None if cache is not None else "gzip",
+                )
+
+    async def test_post_streamed_body(self):
+        worker = MockWorker(async_handler(app))
+
+        async def ndjson_generator():
+            for i in range(3):
+                yield f'{{"data": {i}}}\n'.encode("utf-8")
+
+        async with self.mock_client(worker) as client:
+            response = await client.post(
+                "/echo",
+                content=ndjson_generator(),
+                headers={"content-type": "application/x-ndjson"},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [json.loads(line) for line in response.text.splitlines()],
+            [{"data": i} for i in range(3)],
+        )
+
+    async def test_timings_cover_each_phase(self):
+        worker = MockWorker(async_handler(app), queue_delay=0.02)
+        reported = []
+        async with self.mock_client(
+            worker,
+            poll_options={"min_interval": 0.005},
+            timings_hooks=[lambda response, timings: reported.append(timings)],
+        ) as client:
+            response = await client.get("/json")
+            timings = response.extensions["runpod_timings"]
+            self.assertEqual(reported, [timings])
+            self.assertEqual(timings["job_id"], next(iter(worker.jobs)))
+            self.assertGreaterEqual(timings["delay_ms"], 20)
+            self.assertGreaterEqual(timings["polls"], 1)
+            self.assertEqual(timings["bytes_received"], len(response.content))
+            self.assertIn("worker_headers_ms", timings)
+            self.assertIn("worker_last_byte_ms", timings)
+            self.assertLessEqual(timings["submit_ms"], timings["first_output_ms"])
+            self.assertGreaterEqual(timings["poll_overhead_ms"], 0)
+
+            async with client.stream("GET", "/stream_ndjson?count=5") as response:
+                timings = response.extensions["runpod_timings"]
+                self.assertNotIn("total_ms", timings)
+                body = await response.aread()
+        self.assertEqual(reported[-1], timings)
+        self.assertEqual(timings["bytes_received"], len(body))
+        self.assertLessEqual(timings["first_byte_ms"], timings["total_ms"])
+        self.assertIn("worker_last_byte_ms", timings)
+
+    async def test_coalesced_stream_matches_line_stream(self):
+        contents = []
+        for coalesce_options in (None, {"max_items": 4}):
+            worker = MockWorker(async_handler(app, coalesce_options=coalesce_options))
+            async with self.mock_client(worker) as client:
+                response = await client.get("/stream_ndjson?count=10")
+                contents.append(response.content)
+            outputs = next(iter(worker.jobs.values())).output
+        self.assertEqual(contents[0], contents[1])
+        self.assertEqual(
+            [len(output["chunks"]) for output in outputs[1:]], [4, 4, 2, 0]
+        )
+
+    async def test_batching_packs_requests_into_jobs(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(
+            worker, batching={"max_size": 8, "max_wait": 0.01}
+        ) as client:
+            responses = await asyncio.gather(
+                *(client.post("/echo", content=f"{i}") for i in range(20))
+            )
+        self.assertEqual(
+            [response.text for response in responses], [f"{i}" for i in range(20)]
+        )
+        self.assertEqual(worker.calls["run"], 3)
+        self.assertEqual(
+            sorted(len(job.input) for job in worker.jobs.values()), [4, 8, 8]
+        )
+
+    async def test_runsync_returns_without_polling(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(worker, runsync=True) as client:
+            response = await client.get("/json")
+            streamed = await client.get("/stream_ndjson")
+        self.assertEqual(response.json(), {"message": "Hello, World!"})
+        self.assertEqual(streamed.headers["content-type"], "application/x-ndjson")
+        self.assertTrue(streamed.content)
+        self.assertEqual(worker.calls, {"runsync": 2})
+
+    async def test_runsync_falls_back_to_stream(self):
+        worker = MockWorker(async_handler(app), runsync_timeout=0.01)
+        async with self.mock_client(worker, runsync=True) as client:
+            response = await client.get("/slow?delay=0.1")
+            async with client.stream("GET", "/json") as streamed:
+                await streamed.aread()
+        self.assertEqual(response.json(), {"message": "Hello, World!"})
+        self.assertEqual(streamed.json(), {"message": "Hello, World!"})
+        self.assertEqual(worker.calls["runsync"], 1)
+        self.assertEqual(worker.calls["run"], 1)
+        self.assertGreaterEqual(worker.calls["stream"], 2)
+
+    async def test_queued_jobs_share_backoff(self):
+        worker = MockWorker(async_handler(app), queue_delay=0.5)
+        polls: dict[str, list[tuple[float, str]]] = {}
+
+        class RecordingTransport(httpx.ASGITransport):
+            async def handle_async_request(self, request):
+                sent = time.monotonic()
+                response = await super().handle_async_request(request)
+                if "/stream/" in request.url.path:
+                    content = json.loads(await response.aread())
+                    polls.setdefault(content["id"], []).append(
+                        (sent, content["status"])
+                    )
+                return response
+
+        async with runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=RecordingTransport(worker),
+            poll_options={"min_interval": 0.01, "max_interval": 0.2},
+        ) as client:
+            responses = await asyncio.gather(*(client.get("/json") for _ in range(50)))
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(len(polls), 50)
+        # the gap after the n-th poll answered IN_QUEUE grows by `backoff`,
+        # a slow loop can only make it longer
+        for job_polls in polls.values():
+            queued = 0
+            for (sent, status), (next_sent, _) in zip(job_polls, job_polls[1:]):
+                if status != "IN_QUEUE":
+                    break
+                queued += 1
+                expected = min(0.01 * 1.5**queued, 0.2)
+                self.assertGreater(next_sent - sent, expected * 0.9)
+            self.assertGreater(queued, 2)
+
+    async def test_job_timeout_sets_policy_and_deadline(self):
+        worker = MockWorker(async_handler(app), queue_delay=1.0)
+        async with self.mock_client(
+            worker, job_timeout=0.1, poll_options={"min_interval": 0.01}
+        ) as client:
+            with self.assertRaises(httpx.ReadTimeout):
+                await client.get("/json")
+            response = await client.get(
+                "/stream_ndjson", extensions={"runpod_timeout": 30}
+            )
+        self.assertEqual(response.status_code, 200)
+        expired, served = worker.jobs.values()
+        self.assertEqual(expired.policy, {"ttl": 10000, "executionTimeout": 5000})
+        self.assertGreater(served.policy["ttl"], 29000)
+        headers = dict(expired.input["headers"])
+        self.assertAlmostEqual(
+            float(headers["x-runpod-deadline"]), time.time(), delta=1.5
+        )
+
+    async def test_handler_refuses_expired_requests(self):
+        handler = async_handler(app)
+
+        async def outputs(path, deadline):
+            job = {
+                "id": "job",
+                "input": {
+                    "url": f"http://runpod.test{path}",
+                    "method": "GET",
+                    "headers": [["x-runpod-deadline", str(deadline)]],
+                    "content": None,
+                },
+            }
+            return [output async for output in handler(job)]
+
+        expired = await outputs("/json", time.time() - 1)
+        started = time.perf_counter()
+        overrun = await outputs("/slow?delay=1", time.time() + 0.05)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        served = await outputs("/json", time.time() + 30)
+        self.assertEqual(
+            [output[0]["status_code"] for output in (expired, overrun, served)],
+            [504, 504, 200],
+        )
+
+    async def test_deadline_leaves_the_request_alone(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(
+            worker, job_timeout=30, poll_options={"min_interval": 0.001}
+        ) as client:
+            request = client.build_request("GET", "/json")
+            await client.send(request)
+            self.assertNotIn("x-runpod-deadline", request.headers)
+            # the body is cut short at the deadline, which the reader is told
+            async with client.stream(
+                "GET",
+                "/stream_ndjson?count=100&delay=0.02",
+                extensions={"runpod_timeout": 0.3},
+            ) as response:
+                self.assertEqual(response.status_code, 200)
+                with self.assertRaises(httpx.ReadTimeout):
+                    await response.aread()
+        served, cut_short = worker.jobs.values()
+        self.assertIn("x-runpod-deadline", dict(served.input["headers"]))
+        self.assertTrue(cut_short.output[-1]["truncated"])
+
+    async def test_closing_a_stream_early_cancels_the_job(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(
+            worker, poll_options={"min_interval": 0.001}
+        ) as client:
+            async with client.stream(
+                "GET", "/stream_ndjson?count=1000&delay=0.01"
+            ) as response:
+                async for line in response.aiter_lines():
+                    break
+        (job,) = worker.jobs.values()
+        await asyncio.wait({job.task})
+        self.assertEqual(worker.calls["cancel"], 1)
+        self.assertEqual(job.status, "CANCELLED")
+        self.assertLess(len(job.output), 100)
+
+    async def test_cancelled_caller_cancels_the_job(self):
+        worker = MockWorker(async_handler(app), queue_delay=1.0)
+        async with self.mock_client(worker) as client:
+            request = asyncio.create_task(client.get("/json"))
+            await asyncio.sleep(0.05)
+            request.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await request
+            finished = await client.get("/json", extensions={"runpod_timeout": 5})
+        self.assertEqual(finished.status_code, 200)
+        self.assertEqual(worker.calls["cancel"], 1)
+        self.assertEqual(next(iter(worker.jobs.values())).status, "CANCELLED")
+
+    async def test_handler_stops_the_app_when_closed(self):
+        stopped = asyncio.Event()
+
+        async def endless(request):
+            async def lines():
+                try:
+                    while True:
+                        yield b"line\n"
+                        await asyncio.sleep(0.001)
+                finally:
+                    stopped.set()
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        handler = async_handler(Starlette(routes=[Route("/endless", endless)]))
+        outputs = handler(
+            {
+                "id": "job",
+                "input": {
+                    "url": "http://runpod.test/endless",
+                    "method": "GET",
+                    "headers": [],
+                    "content": None,
+                },
+            }
+        )
+        head = await anext(outputs)
+        first = await anext(outputs)
+        await outputs.aclose()
+        self.assertEqual(head["status_code"], 200)
+        self.assertEqual(first["chunks"], ["line\n"])
+        await asyncio.wait_for(stopped.wait(), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
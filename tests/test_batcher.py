@@ -0,0 +1,55 @@
+import asyncio
+import httpx
+import unittest
+
+from runpod_httpx_proxy.clients.batcher import RequestBatcher
+
+
+class TestRequestBatcher(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.batches = []
+
+        async def send_batch(requests, futures):
+            self.batches.append([str(request.url) for request in requests])
+            for request, future in zip(requests, futures):
+                future.set_result(httpx.Response(200, text=str(request.url)))
+
+        self.batcher = RequestBatcher(send_batch, max_size=3, max_wait=0.01)
+
+    async def test_flushes_full_batches_and_stragglers(self):
+        responses = await asyncio.gather(
+            *(
+                self.batcher.submit("a", httpx.Request("GET", f"http://a/{i}"))
+                for i in range(7)
+            )
+        )
+        self.assertEqual(
+            [response.text for response in responses],
+            [f"http://a/{i}" for i in range(7)],
+        )
+        self.assertEqual([len(batch) for batch in self.batches], [3, 3, 1])
+
+    async def test_batches_per_key(self):
+        await asyncio.gather(
+            self.batcher.submit("a", httpx.Request("GET", "http://a/")),
+            self.batcher.submit("b", httpx.Request("GET", "http://b/")),
+        )
+        self.assertEqual(sorted(self.batches), [["http://a/"], ["http://b/"]])
+
+    async def test_send_errors_reach_every_request(self):
+        async def send_batch(requests, futures):
+            futures[0].set_result(httpx.Response(200))
+
+        batcher = RequestBatcher(send_batch, max_size=2)
+        first, second = await asyncio.gather(
+            batcher.submit("a", httpx.Request("GET", "http://a/")),
+            batcher.submit("a", httpx.Request("GET", "http://a/")),
+            return_exceptions=True,
+        )
+        self.assertEqual(first.status_code, 200)
+        self.assertIsInstance(second, Exception)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from benchmarks.bench_concurrency import run_limit
+from benchmarks.bench_e2e import CASES, run_case
+from benchmarks.bench_import import import_time
+
+
+class TestEndToEndBenchmark(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cases_run_offline(self):
+        for name in CASES:
+            with self.subTest(case=name):
+                result = await run_case(
+                    name, 2, 2, poll_options={"min_interval": 0.001}
+                )
+                self.assertEqual(result["errors"], 0)
+                self.assertGreater(result["throughput_rps"], 0)
+                self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+
+
+class TestConcurrencyBenchmark(unittest.IsolatedAsyncioTestCase):
+
+    async def test_fixed_and_adaptive_limits_run_offline(self):
+        for limit in (2, None):
+            with self.subTest(limit=limit):
+                result = await run_limit(limit, 4, 8, capacity=2, work=0.002)
+                self.assertEqual(result["errors"], 0)
+                self.assertGreater(result["throughput_rps"], 0)
+        self.assertEqual(result["concurrency"]["completed"], 8)
+
+
+class TestImportBenchmark(unittest.TestCase):
+
+    def test_client_does_not_import_the_worker_sdk(self):
+        for module in ("runpod_httpx_proxy", "runpod_httpx_proxy.clients"):
+            with self.subTest(module=module):
+                result = import_time(module)
+                self.assertFalse(result["sdk_imported"])
+                self.assertGreater(result["import_ms"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import unittest
+
+from runpod_httpx_proxy.codecs import BodyCodec, zstd
+
+
+class TestBodyCodec(unittest.TestCase):
+
+    def test_text_passes_through(self):
+        codec = BodyCodec()
+        self.assertEqual(codec.encode("héllo".encode()), "héllo")
+        self.assertEqual(codec.decode("héllo"), "héllo".encode())
+        self.assertEqual(codec.decode(None), b"")
+
+    def test_binary_round_trips_as_base64(self):
+        codec = BodyCodec()
+        data = os.urandom(4096)
+        encoded = codec.encode(memoryview(data))
+        self.assertEqual(encoded["encoding"], "base64")
+        self.assertEqual(codec.decode(encoded), data)
+
+    def test_split_multibyte_character_is_lossless(self):
+        codec = BodyCodec()
+        data = "€".encode()
+        chunks = [codec.encode(data[:1]), codec.encode(data[1:])]
+        self.assertEqual(b"".join(codec.decode(chunk) for chunk in chunks), data)
+
+    def test_compresses_above_threshold(self):
+        codec = BodyCodec(compression="gzip", compress_threshold=1024)
+        self.assertEqual(codec.encode(b"a" * 1023), "a" * 1023)
+        encoded = codec.encode(b"a" * 1024 * 1024)
+        self.assertEqual(encoded["encoding"], "gzip")
+        self.assertLess(len(encoded["data"]), 10 * 1024)
+        # decoding does not depend on the receiving codec's settings
+        self.assertEqual(BodyCodec().decode(encoded), b"a" * 1024 * 1024)
+
+    @unittest.skipIf(zstd is None, "zstd is not available")
+    def test_zstd(self):
+        codec = BodyCodec(compression="zstd", compress_threshold=0)
+        data = os.urandom(1024) * 8
+        encoded = codec.encode(data)
+        self.assertEqual(encoded["encoding"], "zstd")
+        self.assertEqual(BodyCodec().decode(encoded), data)
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            BodyCodec().decode({"encoding": "brotli", "data": ""})
+
+
+if __name__ == "__main__":
+    unittest.main()
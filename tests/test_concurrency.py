@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.handlers.concurrency import AdaptiveConcurrency
+from tests.mock.app import app
+
+
+class TestAdaptiveConcurrency(unittest.IsolatedAsyncioTestCase):
+
+    def test_limit_grows_only_while_it_is_used(self):
+        concurrency = AdaptiveConcurrency(initial_limit=2)
+        for _ in range(10):
+            concurrency.record(0.01, 0.01)
+        self.assertEqual(concurrency.concurrency_modifier(1), 2)
+        concurrency.peak_inflight = 2
+        for _ in range(4):
+            concurrency.record(0.01, 0.01)
+        self.assertEqual(concurrency.concurrency_modifier(1), 3)
+        self.assertEqual(concurrency.metrics()["increases"], 1)
+
+    def test_limit_is_cut_when_latency_rises(self):
+        concurrency = AdaptiveConcurrency(initial_limit=10, backoff=0.5)
+        concurrency.record(0.01, 0.01)
+        for _ in range(3):
+            concurrency.record(0.1, 0.1)
+        # cut once, then given `limit` responses to show the effect
+        self.assertEqual(concurrency.concurrency_modifier(10), 5)
+        for _ in range(5):
+            concurrency.record(0.1, 0.1)
+        self.assertEqual(concurrency.concurrency_modifier(10), 2)
+        metrics = concurrency.metrics()
+        self.assertEqual(metrics["decreases"], 2)
+        # the baseline is the lowest latency seen, slowly forgotten
+        self.assertAlmostEqual(metrics["baseline_ms"], 10.0, delta=0.1)
+        self.assertLess(metrics["gradient"], 1)
+
+    def test_long_streams_are_judged_by_time_to_first_byte(self):
+        concurrency = AdaptiveConcurrency(initial_limit=4)
+        for _ in range(10):
+            concurrency.record(0.01, 5.0, streamed=True)
+        self.assertEqual(concurrency.concurrency_modifier(4), 4)
+        self.assertEqual(concurrency.metrics()["decreases"], 0)
+
+    async def test_handler_measures_the_app(self):
+        concurrency = AdaptiveConcurrency()
+        handler = async_handler(app, concurrency=concurrency)
+
+        async def send(path: str):
+            job = {
+                "id": "job",
+                "input": {
+                    "url": f"http://runpod.test{path}",
+                    "method": "GET",
+                    "headers": [],
+                    "content": None,
+                },
+            }
+            return [output async for output in handler(job)]
+
+        slow = asyncio.ensure_future(send("/slow?delay=0.1"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(concurrency.metrics()["inflight"], 1)
+        await asyncio.gather(slow, send("/stream_ndjson?count=3"))
+        metrics = concurrency.metrics()
+        self.assertEqual((metrics["inflight"], metrics["completed"]), (0, 2))
+        self.assertGreaterEqual(metrics["latency_ms"], metrics["ttfb_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
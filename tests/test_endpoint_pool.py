@@ -0,0 +1,139 @@
+import asyncio
+import unittest
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount
+
+import runpod_httpx_proxy
+from runpod_httpx_proxy.clients.endpoint_pool import EndpointPool
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.worker.local.local_worker import LocalWorker
+from tests.mock.app import app
+
+
+def health(in_queue: int, idle: int, running: int):
+    return {
+        "jobs": {
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "timedOut": 0,
+            "inQueue": in_queue,
+            "retried": 0,
+        },
+        "workers": {"idle": idle, "running": running},
+    }
+
+
+class TestEndpointPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_routes_to_the_shortest_expected_wait(self):
+        snapshots = {
+            "http://a/v2/a": health(in_queue=8, idle=0, running=2),
+            "http://b/v2/b": health(in_queue=1, idle=1, running=1),
+        }
+
+        async def fetch_health(base_url):
+            return snapshots[base_url]
+
+        pool = EndpointPool(list(snapshots), fetch_health)
+        await pool.refresh_all()
+        for _ in pool.endpoints:
+            pool.succeeded(pool.choose(), latency=0.1, execution=1.0)
+        chosen = [pool.choose().base_url for _ in range(3)]
+        # b has an idle worker for the first job, then queues behind it
+        self.assertEqual(chosen[0], "http://b/v2/b")
+        self.assertEqual(chosen.count("http://a/v2/a"), 0)
+        pool.close()
+
+    async def test_circuit_opens_and_recovers_with_a_trial_job(self):
+        pool = EndpointPool(
+            ["http://a/v2/a", "http://b/v2/b"], failure_threshold=2, recovery_time=0.05
+        )
+        a, b = pool.endpoints
+        for _ in range(2):
+            a.inflight += 1
+            pool.failed(a)
+        self.assertIsNotNone(a.open_until)
+        self.assertEqual({pool.choose().base_url for _ in range(4)}, {b.base_url})
+        await asyncio.sleep(0.05)
+        b.latency = 10.0
+        trial = pool.choose()
+        self.assertIs(trial, a)
+        # only one trial job while the circuit is half open
+        self.assertIs(pool.choose(), b)
+        pool.succeeded(trial, latency=0.1)
+        self.assertIsNone(a.open_until)
+        self.assertIs(pool.choose(), a)
+
+    async def test_client_routes_around_a_failing_endpoint(self):
+        for status_code in (500, 503):
+            with self.subTest(status_code=status_code):
+                await self.routes_around(status_code)
+
+    async def routes_around(self, status_code: int):
+        async def unavailable(scope, receive, send):
+            await PlainTextResponse("unavailable", status_code=status_code)(
+                scope, receive, send
+            )
+
+        worker = LocalWorker({"handler": async_handler(app)})
+        api = Starlette(
+            routes=[Mount("/v2/down", app=unavailable), Mount("/v2/up", app=worker)]
+        )
+        async with runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/pool",
+            transport=httpx.ASGITransport(api),
+            endpoints=["http://runpod.test/v2/down", "http://runpod.test/v2/up"],
+            endpoint_pool_options={"failure_threshold": 1},
+            poll_options={"min_interval": 0.001},
+        ) as client:
+            request = client.build_request("GET", "/json")
+            responses = [await client.send(request) for _ in range(4)]
+            pool = client.endpoint_pool
+            assert pool is not None
+            down, up = pool.endpoints
+        self.assertEqual(
+            [r.status_code for r in responses], [status_code, 200, 200, 200]
+        )
+        self.assertEqual(responses[1].json(), {"message": "Hello, World!"})
+        self.assertEqual(str(responses[1].request.url), "http://runpod.test/v2/up/json")
+        self.assertEqual(str(request.url), "http://runpod.test/v2/pool/json")
+        self.assertIsNotNone(down.open_until)
+        self.assertEqual((down.jobs, up.jobs, up.inflight), (1, 3, 0))
+        self.assertIsNotNone(up.latency)
+        worker.close()
+
+    async def test_cancelled_callers_leave_the_circuit_closed(self):
+        worker = LocalWorker({"handler": async_handler(app)})
+        api = Starlette(routes=[Mount("/v2/up", app=worker)])
+        async with runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/pool",
+            transport=httpx.ASGITransport(api),
+            endpoints=["http://runpod.test/v2/up"],
+            endpoint_pool_options={"failure_threshold": 1},
+            poll_options={"min_interval": 0.001},
+        ) as client:
+            callers = [
+                asyncio.create_task(client.get("/slow", params={"delay": 1}))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.05)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.get("/slow", params={"delay": 1}), 0.05)
+            pool = client.endpoint_pool
+            assert pool is not None
+            (up,) = pool.endpoints
+            self.assertEqual((up.failures, up.open_until, up.inflight), (0, None, 0))
+            response = await client.get("/json")
+        self.assertEqual(response.status_code, 200)
+        worker.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import time
+import typing
+import unittest
+
+import httpx
+
+import runpod_httpx_proxy
+from runpod_httpx_proxy.clients.hedging import Hedging
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from tests.mock.app import app
+from tests.mock.worker import MockWorker
+
+
+def stalls(delay: float, stalled: typing.Collection[int] = (1,)):
+    handler = async_handler(app)
+    jobs = 0
+
+    async def stalling_handler(job):
+        nonlocal jobs
+        jobs += 1
+        if jobs in stalled:
+            await asyncio.sleep(delay)
+        async for output in handler(job):
+            yield output
+
+    return stalling_handler
+
+
+class TestHedging(unittest.IsolatedAsyncioTestCase):
+
+    def mock_client(self, worker: MockWorker, **kwargs):
+        return runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=httpx.ASGITransport(worker),
+            poll_options={"min_interval": 0.005, "max_interval": 0.01},
+            **kwargs,
+        )
+
+    async def test_stalled_job_is_hedged_and_cancelled(self):
+        worker = MockWorker(stalls(2.0))
+        async with self.mock_client(
+            worker, hedging={"delay": 0.05, "budget": 1.0}
+        ) as client:
+            started = time.perf_counter()
+            response = await client.get("/json")
+            elapsed = time.perf_counter() - started
+            metrics = client.hedging.metrics()
+        self.assertEqual(response.json(), {"message": "Hello, World!"})
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual((metrics["hedged"], metrics["hedge_wins"]), (1, 1))
+        stalled, _ = worker.jobs.values()
+        await asyncio.wait({stalled.task})
+        self.assertEqual(worker.calls["cancel"], 1)
+        self.assertEqual(stalled.status, "CANCELLED")
+
+    async def test_only_idempotent_requests_within_budget_are_hedged(self):
+        worker = MockWorker(stalls(0.2, stalled=(1, 2, 3)))
+        async with self.mock_client(
+            worker, hedging={"delay": 0.05, "budget": 0.5}
+        ) as client:
+            posted = await client.post("/echo", content=b"once")
+            await client.get("/json")
+            await client.get("/json")
+            metrics = client.hedging.metrics()
+        self.assertEqual(posted.content, b"once")
+        # the POST stalls unhedged, the first GET stalls before half a hedge
+        # is saved up, the second GET is hedged
+        self.assertEqual(worker.calls["run"], 4)
+        self.assertEqual(
+            (
+                metrics["requests"],
+                metrics["hedged"],
+                metrics["hedge_wins"],
+                metrics["over_budget"],
+            ),
+            (2, 1, 1, 1),
+        )
+
+    async def test_hedge_needs_a_free_admission_slot(self):
+        worker = MockWorker(stalls(0.2))
+        async with self.mock_client(
+            worker,
+            hedging={"delay": 0.05, "budget": 1.0},
+            admission={"max_inflight": 1},
+        ) as client:
+            response = await client.get("/json")
+            metrics = client.hedging.metrics()
+            inflight = client.admission.metrics()["http://runpod.test/v2/mock"]
+        self.assertEqual(response.json(), {"message": "Hello, World!"})
+        self.assertEqual(worker.calls["run"], 1)
+        self.assertEqual((metrics["hedged"], metrics["no_capacity"]), (0, 1))
+        self.assertEqual(inflight["inflight"], 0)
+
+    async def test_hedge_answers_for_a_cancelled_attempt(self):
+        attempts = 0
+
+        async def attempt():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                # cancelled from within while the hedge is still running
+                await asyncio.sleep(0.03)
+                raise asyncio.CancelledError
+            await asyncio.sleep(0.05)
+            return httpx.Response(200)
+
+        response = await Hedging(delay=0.01, budget=1.0).send(attempt)
+        self.assertEqual(response.status_code, 200)
+
+        async def cancelled():
+            raise asyncio.CancelledError
+
+        with self.assertRaises(asyncio.CancelledError):
+            await Hedging(delay=0.01).send(cancelled)
+
+    def test_adaptive_delay_follows_recent_latency(self):
+        hedging = Hedging(percentile=0.9, min_samples=10)
+        self.assertIsNone(hedging.delay())
+        hedging.latencies.extend(i / 100 for i in range(1, 11))
+        self.assertEqual(hedging.delay(), 0.1)
+        self.assertEqual(hedging.metrics()["delay_ms"], 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
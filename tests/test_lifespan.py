@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import unittest
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.handlers.lifespan import Lifespan
+
+
+def job(path: str):
+    return {
+        "id": "job",
+        "input": {
+            "url": f"http://runpod.test{path}",
+            "method": "GET",
+            "headers": [],
+            "content": None,
+        },
+    }
+
+
+class TestLifespan(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.events: list[str] = []
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            self.events.append("startup")
+            await asyncio.sleep(0.05)
+            yield {"model": "loaded"}
+            self.events.append("shutdown")
+
+        async def model(request: Request):
+            self.events.append(request.url.path)
+            return JSONResponse({"model": request.state.model})
+
+        self.app = Starlette(
+            routes=[Route("/model", model), Route("/warm", model)],
+            lifespan=lifespan,
+        )
+
+    async def test_app_is_started_and_warmed_once_before_jobs(self):
+        lifespan = Lifespan(warm_up=[httpx.Request("GET", "http://runpod.test/warm")])
+        handler = async_handler(self.app, lifespan=lifespan)
+        first, second = await asyncio.gather(
+            *(asyncio.ensure_future(self.collect(handler, "/model")) for _ in range(2))
+        )
+        third = await self.collect(handler, "/model")
+        self.assertEqual(
+            self.events, ["startup", "/warm", "/model", "/model", "/model"]
+        )
+        self.assertEqual(first["content"], second["content"])
+        self.assertIn("loaded", first["content"])
+        self.assertGreaterEqual(first["timings"]["startup_ms"], 50)
+        self.assertNotIn("startup_ms", third["timings"])
+        metrics = lifespan.metrics()
+        self.assertEqual((metrics["started"], metrics["supported"]), (True, True))
+        self.assertGreaterEqual(metrics["startup_ms"], metrics["warm_up_ms"])
+        await lifespan.shutdown()
+        self.assertEqual(self.events[-1], "shutdown")
+
+    async def test_apps_without_lifespan_are_served(self):
+        async def app(scope, receive, send):
+            assert scope["type"] == "http"
+            await Response(b"plain")(scope, receive, send)
+
+        lifespan = Lifespan()
+        response = await self.collect(async_handler(app, lifespan=lifespan), "/")
+        self.assertEqual(response["status_code"], 200)
+        self.assertIs(lifespan.metrics()["supported"], False)
+        await lifespan.shutdown()
+
+    async def test_failed_startup_fails_every_job(self):
+        @contextlib.asynccontextmanager
+        async def no_gpu(app):
+            raise RuntimeError("no GPU")
+            yield
+
+        lifespan = Lifespan()
+        handler = async_handler(Starlette(lifespan=no_gpu), lifespan=lifespan)
+        for _ in range(2):
+            with self.assertRaisesRegex(RuntimeError, "no GPU"):
+                await self.collect(handler, "/")
+        self.assertIs(lifespan.metrics()["started"], False)
+
+    async def collect(self, handler, path):
+        return [output async for output in handler(job(path))][0]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,290 @@
+import asyncio
+import httpx
+import os
+import threading
+import time
+import unittest
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+import runpod_httpx_proxy
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.worker.local.local_worker import LocalWorker
+from tests.mock.app import app
+
+
+def process_handler(job):
+    for i in range(job["input"]):
+        yield {"index": i, "pid": os.getpid()}
+
+
+def counting_process_handler(job):
+    # counts forever for a negative input
+    index = 0
+    while index != job["input"]:
+        yield index
+        index += 1
+
+
+class TestLocalWorker(unittest.IsolatedAsyncioTestCase):
+
+    def local_client(self, worker: LocalWorker) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(worker), base_url="http://local"
+        )
+
+    async def test_run_stream_status(self):
+        async def handler(job):
+            for i in range(job["input"]["count"]):
+                yield i
+
+        worker = LocalWorker({"handler": handler})
+        async with self.local_client(worker) as client:
+            job = (await client.post("/run", json={"input": {"count": 3}})).json()
+            self.assertEqual(job["status"], "IN_QUEUE")
+            await worker.jobs[job["id"]].finished.wait()
+            stream = (await client.post(f"/stream/{job['id']}")).json()
+            self.assertEqual(stream["status"], "COMPLETED")
+            self.assertEqual(stream["stream"], [{"output": i} for i in range(3)])
+            stream = (await client.post(f"/stream/{job['id']}")).json()
+            self.assertEqual(stream["stream"], [])
+            status = (await client.get(f"/status/{job['id']}")).json()
+            self.assertEqual(status["status"], "COMPLETED")
+            self.assertIn("executionTime", status)
+            missing = await client.get("/status/missing")
+            self.assertEqual(missing.status_code, 404)
+
+    async def test_stream_is_incremental_and_bounded(self):
+        produced = 0
+        release = asyncio.Event()
+
+        async def handler(job):
+            nonlocal produced
+            for i in range(10):
+                if i == 2:
+                    await release.wait()
+                produced += 1
+                yield i
+
+        worker = LocalWorker({"handler": handler}, max_stream_size=4)
+        async with self.local_client(worker) as client:
+            job = (await client.post("/run", json={"input": {}})).json()
+            await asyncio.sleep(0.01)
+            stream = (await client.post(f"/stream/{job['id']}")).json()
+            self.assertEqual(stream["status"], "IN_PROGRESS")
+            self.assertEqual(stream["stream"], [{"output": 0}, {"output": 1}])
+            release.set()
+            await asyncio.sleep(0.01)
+            # the handler waits for the reader once the buffer is full
+            self.assertEqual(len(worker.jobs[job["id"]].stream), 4)
+            self.assertLess(produced, 10)
+            outputs = []
+            while not worker.jobs[job["id"]].finished.is_set() or outputs[-1:] != [9]:
+                stream = (await client.post(f"/stream/{job['id']}")).json()
+                outputs.extend(chunk["output"] for chunk in stream["stream"])
+                await asyncio.sleep(0)
+            self.assertEqual(outputs, list(range(2, 10)))
+            status = (await client.get(f"/status/{job['id']}")).json()
+        self.assertEqual(status["status"], "COMPLETED")
+        self.assertNotIn("output", status)
+
+    async def test_runsync(self):
+        def handler(job):
+            if job["input"] == "fail":
+                raise ValueError("bad input")
+            return job["input"] * 2
+
+        worker = LocalWorker({"handler": handler})
+        async with self.local_client(worker) as client:
+            done = (await client.post("/runsync", json={"input": 21})).json()
+            failed = (await client.post("/runsync", json={"input": "fail"})).json()
+        self.assertEqual((done["status"], done["output"]), ("COMPLETED", 42))
+        self.assertEqual((failed["status"], failed["error"]), ("FAILED", "bad input"))
+
+    async def test_unstreamed_generators_are_not_held_back(self):
+        async def handler(job):
+            for i in range(5):
+                yield i
+
+        worker = LocalWorker(
+            {"handler": handler, "return_aggregate_stream": True},
+            max_stream_size=2,
+            runsync_timeout=2,
+        )
+        async with self.local_client(worker) as client:
+            done = (await client.post("/runsync", json={"input": {}})).json()
+            job = (await client.post("/run", json={"input": {}})).json()
+            await asyncio.wait_for(worker.jobs[job["id"]].finished.wait(), 1)
+            status = (await client.get(f"/status/{job['id']}")).json()
+        self.assertEqual(
+            (done["status"], done["output"]), ("COMPLETED", list(range(5)))
+        )
+        self.assertEqual(status["output"], list(range(5)))
+        # the unread stream keeps only the newest outputs
+        self.assertEqual(list(worker.jobs[job["id"]].stream), [3, 4])
+
+    async def test_client_falls_back_to_the_stream_after_runsync(self):
+        for aggregate in (True, False):
+            worker = LocalWorker(
+                {"handler": async_handler(app), "return_aggregate_stream": aggregate},
+                runsync_timeout=0.05,
+            )
+            api = Starlette(routes=[Mount("/v2/local", app=worker)])
+            async with runpod_httpx_proxy.clients.AsyncClient(
+                base_url="http://runpod.test/v2/local",
+                transport=httpx.ASGITransport(api),
+                runsync=True,
+                poll_options={"min_interval": 0.005},
+            ) as client:
+                # the slow request outlives runsync and is read from its stream
+                responses = await asyncio.gather(
+                    client.get("/json"), client.get("/slow", params={"delay": 0.2})
+                )
+            with self.subTest(aggregate=aggregate):
+                self.assertEqual(
+                    [response.json() for response in responses],
+                    [{"message": "Hello, World!"}] * 2,
+                )
+
+    async def test_admission_follows_concurrency_modifier(self):
+        peak = 0
+        active = 0
+
+        async def handler(job):
+            nonlocal peak, active
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return job["id"]
+
+        worker = LocalWorker(
+            {"handler": handler, "concurrency_modifier": lambda concurrency: 3}
+        )
+        async with self.local_client(worker) as client:
+            jobs = [
+                (await client.post("/run", json={"input": i})).json() for i in range(10)
+            ]
+            health = (await client.get("/health")).json()
+            self.assertEqual(health["workers"], {"idle": 0, "running": 3})
+            self.assertEqual(health["jobs"]["inQueue"], 7)
+            await asyncio.gather(
+                *(worker.jobs[job["id"]].finished.wait() for job in jobs)
+            )
+            health = (await client.get("/health")).json()
+        self.assertEqual(peak, 3)
+        self.assertEqual(health["jobs"]["completed"], 10)
+        self.assertEqual(health["workers"], {"idle": 3, "running": 0})
+
+    async def test_cancel_purge_and_queue_limit(self):
+        release = asyncio.Event()
+
+        async def handler(job):
+            await release.wait()
+            return job["input"]
+
+        worker = LocalWorker({"handler": handler}, max_queue_size=3)
+        async with self.local_client(worker) as client:
+            running = (await client.post("/run", json={"input": 0})).json()
+            queued = [
+                (await client.post("/run", json={"input": i})).json()
+                for i in range(1, 4)
+            ]
+            full = await client.post("/run", json={"input": 4})
+            self.assertEqual(full.status_code, 429)
+            cancelled = (await client.post(f"/cancel/{queued[0]['id']}")).json()
+            self.assertEqual(cancelled["status"], "CANCELLED")
+            purged = (await client.post("/purge-queue")).json()
+            self.assertEqual(purged["removed"], 2)
+            cancelled = (await client.post(f"/cancel/{running['id']}")).json()
+            self.assertEqual(cancelled["status"], "CANCELLED")
+            health = (await client.get("/health")).json()
+        self.assertEqual(health["jobs"]["cancelled"], 4)
+        self.assertEqual(health["jobs"]["inQueue"], 0)
+
+    async def test_thread_executor_keeps_loop_responsive(self):
+        release = threading.Event()
+
+        def handler(job):
+            release.wait(5)
+            yield threading.current_thread().name
+            yield job["input"]
+
+        worker = LocalWorker({"handler": handler, "executor": "thread"})
+        self.addCleanup(worker.close)
+        async with self.local_client(worker) as client:
+            job = (await client.post("/run", json={"input": "done"})).json()
+            await asyncio.sleep(0.01)
+            # the handler blocks its thread, routes are still served
+            health = (await client.get("/health")).json()
+            self.assertEqual(health["workers"]["running"], 1)
+            release.set()
+            await worker.jobs[job["id"]].finished.wait()
+            stream = (await client.post(f"/stream/{job['id']}")).json()
+        self.assertEqual(stream["status"], "COMPLETED")
+        thread_name, output = [chunk["output"] for chunk in stream["stream"]]
+        self.assertTrue(thread_name.startswith("local-worker"))
+        self.assertEqual(output, "done")
+
+    async def test_thread_executor_runs_functions_concurrently(self):
+        def handler(job):
+            time.sleep(0.1)
+            return job["input"]
+
+        worker = LocalWorker(
+            {
+                "handler": handler,
+                "executor": "thread",
+                "max_workers": 4,
+                "concurrency_modifier": lambda concurrency: 4,
+            }
+        )
+        self.addCleanup(worker.close)
+        async with self.local_client(worker) as client:
+            started = time.monotonic()
+            outputs = await asyncio.gather(
+                *(client.post("/runsync", json={"input": i}) for i in range(4))
+            )
+            elapsed = time.monotonic() - started
+        self.assertEqual([output.json()["output"] for output in outputs], [0, 1, 2, 3])
+        self.assertLess(elapsed, 0.3)
+
+    async def test_process_executor_streams_generator(self):
+        worker = LocalWorker(
+            {"handler": process_handler, "executor": "process", "max_workers": 1}
+        )
+        self.addCleanup(worker.close)
+        async with self.local_client(worker) as client:
+            job = (await client.post("/run", json={"input": 3})).json()
+            await asyncio.wait_for(worker.jobs[job["id"]].finished.wait(), 10)
+            stream = (await client.post(f"/stream/{job['id']}")).json()
+        outputs = [chunk["output"] for chunk in stream["stream"]]
+        self.assertEqual([output["index"] for output in outputs], [0, 1, 2])
+        self.assertNotIn(os.getpid(), [output["pid"] for output in outputs])
+
+    async def test_cancelled_process_generator_frees_the_pool(self):
+        worker = LocalWorker(
+            {
+                "handler": counting_process_handler,
+                "executor": "process",
+                "max_workers": 1,
+            }
+        )
+        self.addCleanup(worker.close)
+        async with self.local_client(worker) as client:
+            job = (await client.post("/run", json={"input": -1})).json()
+            stream = (await client.post(f"/stream/{job['id']}")).json()
+            while not stream["stream"]:
+                await asyncio.sleep(0.01)
+                stream = (await client.post(f"/stream/{job['id']}")).json()
+            await client.post(f"/cancel/{job['id']}")
+            # the only pool process is free again once the generator stopped
+            response = await asyncio.wait_for(
+                client.post("/runsync", json={"input": 2}), 10
+            )
+        self.assertEqual(response.json()["status"], "COMPLETED")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import unittest
+
+import httpx
+
+from runpod_httpx_proxy.codecs import BodyCodec
+from runpod_httpx_proxy.models import (
+    RunRequest,
+    StreamResponse,
+    request_from_request_dict,
+    response_dict_from_response,
+)
+
+
+class TestRunRequest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_streamed_body_is_sent_as_it_is_read(self):
+        read = []
+
+        async def body():
+            for chunk in (b"first\n", b"", bytes(range(256)), b"last\n"):
+                read.append(chunk)
+                yield chunk
+
+        request = httpx.Request(
+            "POST",
+            "http://runpod.test/v2/mock/echo?x=1",
+            headers={"content-type": "application/x-ndjson"},
+            content=body(),
+        )
+        run_request = RunRequest.from_request(request)
+        self.assertEqual(run_request.headers["content-type"], "application/json")
+        self.assertEqual(run_request.headers["transfer-encoding"], "chunked")
+        parts = []
+        async for part in run_request.stream:
+            parts.append(part)
+            if len(parts) == 1:
+                # the job head goes out before the body is read
+                self.assertEqual(read, [])
+        job = json.loads(b"".join(parts))
+        self.assertEqual(job["input"]["url"], "http://runpod.test/echo?x=1")
+        self.assertEqual(job["input"]["content"]["encoding"], "chunks")
+        self.assertEqual(len(job["input"]["content"]["chunks"]), 3)
+
+        rebuilt = request_from_request_dict(job["input"])
+        self.assertEqual(await rebuilt.aread(), b"".join(read))
+
+    async def test_read_body_is_inlined(self):
+        request = httpx.Request(
+            "POST", "http://runpod.test/v2/mock/echo", content=b"\xff" * 8
+        )
+        run_request = RunRequest.from_request(request, codec=BodyCodec())
+        job = json.loads(run_request.content)
+        self.assertEqual(job["input"]["content"]["encoding"], "base64")
+
+    async def test_repeated_headers_survive_the_round_trip(self):
+        request = httpx.Request(
+            "GET",
+            "http://runpod.test/v2/mock/json",
+            headers=[("accept", "text/plain"), ("accept", "application/json")],
+        )
+        job = json.loads(RunRequest.from_request(request).content)
+        rebuilt = request_from_request_dict(job["input"])
+        self.assertEqual(
+            rebuilt.headers.get_list("accept"), ["text/plain", "application/json"]
+        )
+        response = httpx.Response(
+            200,
+            headers=[("set-cookie", "a=1"), ("set-cookie", "b=2")],
+            content=b"{}",
+            request=rebuilt,
+        )
+        response_dict = json.loads(json.dumps(response_dict_from_response(response)))
+        # the client attaches its own request instead of an echoed copy
+        self.assertNotIn("request", response_dict)
+        response = StreamResponse.from_response_dict(response_dict, request=request)
+        self.assertEqual(response.headers.get_list("set-cookie"), ["a=1", "b=2"])
+        self.assertIs(response.request, request)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+import boto3
+import httpx
+
+import runpod_httpx_proxy
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.offload import S3Offload
+from tests.mock.app import app
+from tests.mock.worker import MockWorker
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+MiB = 1024 * 1024
+
+
+@unittest.skipIf(ThreadedMotoServer is None, "moto[server] is not installed")
+class TestS3Offload(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+        cls.server.start()
+        host, port = cls.server.get_host_and_port()
+        cls.s3_config = {
+            "accessId": "test",
+            "accessSecret": "test",
+            "bucketName": "offload",
+            "endpointUrl": f"http://{host}:{port}",
+        }
+        boto3.client(
+            "s3",
+            endpoint_url=cls.s3_config["endpointUrl"],
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+            region_name="us-east-1",
+        ).create_bucket(Bucket="offload")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    async def test_multipart_upload_round_trip(self):
+        offload = S3Offload(self.s3_config, part_size=5 * MiB, max_concurrency=2)
+        self.addAsyncCleanup(offload.aclose)
+        body = bytes(range(256)) * (11 * MiB // 256)
+
+        async def chunks():
+            for start in range(0, len(body), 64 * 1024):
+                yield body[start : start + 64 * 1024]
+
+        offloaded = await offload.upload(chunks())
+        self.assertEqual(offloaded["size"], len(body))
+        key = httpx.URL(offloaded["url"]).path.split("/offload/", 1)[1]
+        head = offload.s3.head_object(Bucket="offload", Key=key)
+        # three parts, the last one smaller
+        self.assertTrue(head["ETag"].strip('"').endswith("-3"))
+        fetched = b"".join([chunk async for chunk in offload.fetch(offloaded)])
+        self.assertEqual(fetched, body)
+
+    async def test_small_body_is_a_single_object(self):
+        offload = S3Offload(self.s3_config)
+        self.addAsyncCleanup(offload.aclose)
+        offloaded = await offload.upload(b"small")
+        fetched = b"".join([chunk async for chunk in offload.fetch(offloaded)])
+        self.assertEqual((offloaded["size"], fetched), (5, b"small"))
+
+    async def test_client_and_handler_offload_large_bodies(self):
+        worker = MockWorker(async_handler(app))
+        body = bytes(range(256)) * (2 * MiB // 256)
+        async with runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=httpx.ASGITransport(worker),
+            offload=S3Offload(self.s3_config),
+        ) as client:
+            response = await client.post(
+                "/echo",
+                content=body,
+                headers={"content-type": "application/octet-stream"},
+            )
+            small = await client.post("/echo", content=b"inline")
+        self.assertEqual(response.content, body)
+        self.assertEqual(small.content, b"inline")
+        jobs = list(worker.jobs.values())
+        self.assertEqual(jobs[0].input["content"]["encoding"], "url")
+        self.assertEqual(jobs[0].output[0]["content"]["encoding"], "url")
+        self.assertEqual(jobs[1].output[0]["content"], "inline")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import httpx
+import unittest
+
+from runpod_httpx_proxy.clients.poll_scheduler import PollScheduler
+
+
+def stream_response(status: str, stream=(), **content) -> httpx.Response:
+    return httpx.Response(
+        200,
+        json={
+            "status": status,
+            "stream": [{"output": output} for output in stream],
+            **content,
+        },
+    )
+
+
+class TestPollScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_reschedules_until_output(self):
+        responses = [
+            stream_response("IN_QUEUE"),
+            stream_response("IN_QUEUE"),
+            stream_response("IN_PROGRESS"),
+            stream_response("IN_PROGRESS", ["a"]),
+        ]
+        sent = []
+
+        async def send(request: httpx.Request) -> httpx.Response:
+            sent.append(asyncio.get_running_loop().time())
+            return responses.pop(0)
+
+        scheduler = PollScheduler(send, min_interval=0.01, backoff=2)
+        response, content = await scheduler.poll(httpx.Request("POST", "http://t/"))
+        self.assertEqual(content["stream"], [{"output": "a"}])
+        self.assertEqual(scheduler.polls, 4)
+        # the queued phase backs off between empty polls
+        self.assertGreater(sent[2] - sent[1], sent[1] - sent[0])
+
+    async def test_shares_one_timer_between_jobs(self):
+        async def send(request: httpx.Request) -> httpx.Response:
+            return stream_response("COMPLETED", [request.url.path])
+
+        scheduler = PollScheduler(send, min_interval=0.01)
+        futures = [
+            scheduler.poll(httpx.Request("POST", f"http://t/stream/{i}"))
+            for i in range(100)
+        ]
+        self.assertEqual(len(scheduler), 100)
+        results = await asyncio.gather(*futures)
+        self.assertEqual(
+            [content["stream"][0]["output"] for _, content in results],
+            [f"/stream/{i}" for i in range(100)],
+        )
+        self.assertEqual(len(scheduler), 0)
+
+    async def test_adapts_to_observed_delay_time(self):
+        scheduler = PollScheduler(None, min_interval=0.01, max_interval=10)
+        scheduler.observe({"delayTime": 4000, "executionTime": 200})
+        scheduler.observe({"delayTime": 2000, "executionTime": 200})
+        self.assertAlmostEqual(scheduler.expected_delay, 3.6)
+        loop = asyncio.get_running_loop()
+        future = scheduler.poll(httpx.Request("POST", "http://t/"))
+        _, _, queued = scheduler._heap[0]
+        self.assertAlmostEqual(scheduler.interval(queued, loop.time()), 1.8, places=1)
+        queued.status = "IN_PROGRESS"
+        self.assertAlmostEqual(scheduler.interval(queued, loop.time()), 0.01)
+        queued.attempts = 10
+        self.assertAlmostEqual(scheduler.interval(queued, loop.time()), 0.05)
+        future.cancel()
+        scheduler.close()
+
+    async def test_non_200_resolves_immediately(self):
+        async def send(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(404, text="missing")
+
+        scheduler = PollScheduler(send, min_interval=0.01)
+        response, content = await scheduler.poll(httpx.Request("POST", "http://t/"))
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(content)
+
+    async def test_unreadable_body_fails_the_poll(self):
+        async def send(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, text="<html>bad gateway</html>")
+
+        scheduler = PollScheduler(send, min_interval=0.01)
+        with self.assertRaises(httpx.DecodingError):
+            await asyncio.wait_for(
+                scheduler.poll(httpx.Request("POST", "http://t/")), 1
+            )
+
+    async def test_close_fails_polls_in_flight(self):
+        sent = asyncio.Event()
+
+        async def send(request: httpx.Request) -> httpx.Response:
+            sent.set()
+            await asyncio.sleep(10)
+            raise AssertionError("the poll should have been cancelled")
+
+        scheduler = PollScheduler(send, min_interval=0.01)
+        sending = scheduler.poll(httpx.Request("POST", "http://t/"))
+        queued = scheduler.poll(httpx.Request("POST", "http://t/"), "IN_QUEUE")
+        await sent.wait()
+        scheduler.close()
+        self.assertTrue(sending.cancelled())
+        self.assertTrue(queued.done())
+        self.assertEqual(len(scheduler), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
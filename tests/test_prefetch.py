@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+
+from runpod_httpx_proxy.clients.prefetch import PrefetchBuffer, prefetch
+
+
+class TestPrefetch(unittest.IsolatedAsyncioTestCase):
+
+    async def test_polls_ahead_of_consumer(self):
+        polled = []
+
+        async def produce(buffer: PrefetchBuffer) -> None:
+            for batch in range(3):
+                await buffer.writable()
+                polled.append(batch)
+                await buffer.extend([f"{batch}".encode()])
+
+        chunks = []
+        async for chunk in prefetch(produce):
+            # the producer has already moved past the chunk being consumed
+            await asyncio.sleep(0.01)
+            chunks.append(chunk)
+            if len(chunks) == 1:
+                self.assertEqual(polled, [0, 1, 2])
+        self.assertEqual(chunks, [b"0", b"1", b"2"])
+
+    async def test_pauses_polling_over_budget(self):
+        polled = []
+
+        async def produce(buffer: PrefetchBuffer) -> None:
+            for batch in range(10):
+                await buffer.writable()
+                polled.append(batch)
+                await buffer.extend([b"x" * 10, b"y" * 10])
+
+        stream = prefetch(produce, max_chunks=100, max_bytes=40)
+        self.assertEqual(await anext(stream), b"x" * 10)
+        await asyncio.sleep(0.01)
+        # 40 bytes buffered after two batches, one chunk consumed
+        self.assertEqual(polled, [0, 1, 2])
+        rest = [chunk async for chunk in stream]
+        self.assertEqual(len(rest), 19)
+        self.assertEqual(polled, list(range(10)))
+
+    async def test_raises_producer_error_after_buffered_chunks(self):
+        async def produce(buffer: PrefetchBuffer) -> None:
+            await buffer.extend([b"a"])
+            raise RuntimeError("job failed")
+
+        chunks = []
+        with self.assertRaises(RuntimeError):
+            async for chunk in prefetch(produce):
+                chunks.append(chunk)
+        self.assertEqual(chunks, [b"a"])
+
+    async def test_early_close_cancels_producer(self):
+        cancelled = asyncio.Event()
+
+        async def produce(buffer: PrefetchBuffer) -> None:
+            try:
+                await buffer.extend([b"a"])
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        stream = prefetch(produce)
+        self.assertEqual(await anext(stream), b"a")
+        await stream.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+import runpod_httpx_proxy
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from runpod_httpx_proxy.response_cache import ResponseCache
+from tests.mock.worker import MockWorker
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.calls: dict[str, int] = {}
+
+        def counted(headers: dict[str, str], size: int = 5):
+            async def endpoint(request: Request):
+                path = request.url.path
+                self.calls[path] = self.calls.get(path, 0) + 1
+                etag = headers.get("etag")
+                if etag is not None and request.headers.get("if-none-match") == etag:
+                    return Response(status_code=304, headers=headers)
+                body = await request.body()
+                return Response(body or b"x" * size, headers=headers)
+
+            return endpoint
+
+        self.app = Starlette(
+            routes=[
+                Route("/plain", counted({})),
+                Route("/embed", counted({}), methods=["POST"]),
+                Route("/etag", counted({"etag": '"v1"', "cache-control": "no-cache"})),
+                Route("/private", counted({"cache-control": "private"})),
+                Route("/big", counted({}, size=96)),
+                Route("/public", counted({"cache-control": "public, max-age=60"})),
+            ]
+        )
+
+    async def send(self, handler, path, method="GET", content=None, headers=()):
+        job = {
+            "id": "job",
+            "input": {
+                "url": f"http://runpod.test{path}",
+                "method": method,
+                "headers": list(headers),
+                "content": content,
+            },
+        }
+        return [output async for output in handler(job)][0]
+
+    async def test_repeated_requests_skip_the_app(self):
+        cache = ResponseCache(methods=("GET", "POST"))
+        handler = async_handler(self.app, cache=cache)
+        first = await self.send(handler, "/plain")
+        second = await self.send(handler, "/plain")
+        await self.send(handler, "/plain?other=1")
+        await self.send(handler, "/embed", "POST", "a")
+        embedded = await self.send(handler, "/embed", "POST", "a")
+        await self.send(handler, "/embed", "POST", "b")
+        self.assertEqual(second["content"], first["content"])
+        self.assertEqual(embedded["content"], "a")
+        self.assertEqual(self.calls, {"/plain": 2, "/embed": 2})
+        metrics = cache.metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (2, 4))
+        self.assertEqual(metrics["entries"], 4)
+
+    async def test_stale_entries_are_revalidated_with_their_etag(self):
+        cache = ResponseCache()
+        handler = async_handler(self.app, cache=cache)
+        await self.send(handler, "/etag")
+        revalidated = await self.send(handler, "/etag")
+        not_modified = await self.send(
+            handler, "/etag", headers=[("if-none-match", '"v1"')]
+        )
+        self.assertEqual(
+            (revalidated["status_code"], revalidated["content"]), (200, "xxxxx")
+        )
+        self.assertEqual(not_modified["status_code"], 304)
+        self.assertEqual(self.calls["/etag"], 3)
+        self.assertEqual(cache.metrics()["revalidated"], 2)
+
+    async def test_private_and_oversized_responses_are_not_kept(self):
+        cache = ResponseCache(max_bytes=100)
+        handler = async_handler(self.app, cache=cache)
+        for path in ("/private", "/private", "/plain", "/big", "/big", "/plain"):
+            await self.send(handler, path)
+        await self.send(handler, "/plain", headers=[("cache-control", "no-store")])
+        # /big pushed /plain out of the 100 byte budget
+        self.assertEqual(self.calls, {"/private": 2, "/plain": 3, "/big": 1})
+        self.assertEqual(cache.metrics()["evictions"], 2)
+
+    async def test_authorized_responses_are_only_kept_when_public(self):
+        cache = ResponseCache()
+        handler = async_handler(self.app, cache=cache)
+        for token in ("alice", "bob"):
+            for path in ("/plain", "/public"):
+                await self.send(
+                    handler, path, headers=[("authorization", f"Bearer {token}")]
+                )
+        self.assertEqual(self.calls, {"/plain": 2, "/public": 1})
+
+    async def test_caches_requests_of_an_authenticated_client(self):
+        cache = ResponseCache()
+        worker = MockWorker(async_handler(self.app, cache=cache))
+        async with runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=httpx.ASGITransport(worker),
+            headers={"authorization": "Bearer runpod-api-key"},
+            poll_options={"min_interval": 0.001},
+        ) as client:
+            for _ in range(3):
+                await client.get("/plain")
+        metrics = cache.metrics()
+        self.assertEqual((metrics["hits"], metrics["stores"]), (2, 1))
+        # the API key authenticates the job and is not forwarded to the app
+        for job in worker.jobs.values():
+            self.assertNotIn("authorization", dict(job.input["headers"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+
+import httpx
+
+import runpod_httpx_proxy
+from runpod_httpx_proxy.handlers.async_handler import async_handler
+from tests.mock.app import app
+from tests.mock.worker import MockWorker
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    def mock_client(self, worker: MockWorker, **kwargs):
+        return runpod_httpx_proxy.clients.AsyncClient(
+            base_url="http://runpod.test/v2/mock",
+            transport=httpx.ASGITransport(worker),
+            poll_options={"min_interval": 0.005, "max_interval": 0.01},
+            **kwargs,
+        )
+
+    async def test_identical_requests_share_one_job(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(worker, single_flight={}) as client:
+            responses = await asyncio.gather(
+                *(client.get("/slow", params={"delay": 0.05}) for _ in range(5)),
+                client.post("/echo", content=b"a"),
+                client.post("/echo", content=b"a"),
+            )
+            metrics = client.single_flight.metrics()
+        self.assertEqual(
+            [response.json() for response in responses[:5]],
+            [{"message": "Hello, World!"}] * 5,
+        )
+        self.assertEqual(worker.calls["run"], 3)
+        self.assertEqual(
+            (metrics["leaders"], metrics["followers"], metrics["inflight"]), (1, 4, 0)
+        )
+
+    async def test_streamed_response_is_replayed_to_late_callers(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(worker, single_flight={}) as client:
+            url = "/stream_ndjson?count=3&delay=0.05"
+
+            async def lines(joined: asyncio.Event):
+                async with client.stream("GET", url) as response:
+                    received = []
+                    async for line in response.aiter_lines():
+                        received.append(line)
+                        joined.set()
+                    return received
+
+            first_line = asyncio.Event()
+            first = asyncio.ensure_future(lines(first_line))
+            await first_line.wait()
+            late = await lines(asyncio.Event())
+            self.assertEqual(await first, late)
+        self.assertEqual(late, [f'{{"data": {i}}}' for i in range(3)])
+        self.assertEqual(worker.calls["run"], 1)
+
+    async def test_job_is_cancelled_once_every_caller_is_gone(self):
+        worker = MockWorker(async_handler(app), queue_delay=0.2)
+        async with self.mock_client(worker, single_flight={}) as client:
+            callers = [asyncio.ensure_future(client.get("/json")) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            callers[0].cancel()
+            await asyncio.sleep(0.05)
+            self.assertEqual(worker.calls.get("cancel", 0), 0)
+            callers[1].cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+        (job,) = worker.jobs.values()
+        await asyncio.wait({job.task})
+        self.assertEqual(worker.calls["cancel"], 1)
+        self.assertEqual(job.status, "CANCELLED")
+
+    async def test_cache_answers_repeated_requests(self):
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(
+            worker, cache={"ttl": 60}, headers={"authorization": "Bearer a"}
+        ) as client:
+            first = await client.get("/json")
+            second = await client.get("/json")
+            await client.get("/json", headers={"cache-control": "no-store"})
+            # answers to one credential are not served to another
+            await client.get("/json", headers={"authorization": "Bearer b"})
+            metrics = client.response_cache.metrics()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(worker.calls["run"], 3)
+        self.assertEqual((metrics["hits"], metrics["stores"]), (1, 2))
+
+    async def test_runsync_and_batching_are_kept(self):
+        shared = {"cache": {"ttl": 60}, "single_flight": {}}
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(worker, runsync=True, **shared) as client:
+            await asyncio.gather(*(client.get(f"/json?i={i}") for i in range(4)))
+        self.assertEqual((worker.calls["runsync"], worker.calls.get("run", 0)), (4, 0))
+
+        worker = MockWorker(async_handler(app))
+        async with self.mock_client(
+            worker, batching={"max_size": 4, "max_wait": 0.05}, **shared
+        ) as client:
+            responses = await asyncio.gather(
+                *(client.get(f"/json?i={i}") for i in range(4))
+            )
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(worker.calls["run"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
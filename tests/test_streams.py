@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+
+from runpod_httpx_proxy.codecs import BodyCodec
+from runpod_httpx_proxy.streams import FrameCursor, coalesce, frame, split_lines
+
+
+async def produce(items, delay=0.0):
+    for item in items:
+        yield item
+        await asyncio.sleep(delay)
+
+
+class TestCoalesce(unittest.IsolatedAsyncioTestCase):
+
+    async def test_flushes_on_max_items(self):
+        frames = [frame async for frame in coalesce(produce("abcdefg"), max_items=3)]
+        self.assertEqual(frames, [list("abc"), list("def"), list("g")])
+
+    async def test_flushes_on_max_bytes(self):
+        frames = [
+            frame
+            async for frame in coalesce(
+                produce(["aaaa", "bb", "cccc", "d"]), max_bytes=5
+            )
+        ]
+        self.assertEqual(frames, [["aaaa", "bb"], ["cccc", "d"]])
+
+    async def test_flushes_on_linger(self):
+        frames = [
+            frame
+            async for frame in coalesce(produce("abcd", delay=0.03), max_linger=0.01)
+        ]
+        self.assertEqual(frames, [["a"], ["b"], ["c"], ["d"]])
+        frames = [
+            frame
+            async for frame in coalesce(produce("abcd", delay=0.001), max_linger=1)
+        ]
+        self.assertEqual(frames, [list("abcd")])
+
+
+class TestFraming(unittest.IsolatedAsyncioTestCase):
+
+    async def test_split_lines_keeps_terminators(self):
+        lines = [
+            line async for line in split_lines(produce([b"a\nb", b"c\r\n\n", b"d"]))
+        ]
+        self.assertEqual(lines, [b"a\n", b"bc\r\n", b"\n", b"d"])
+
+    async def test_frames_end_with_last_frame(self):
+        frames = [
+            stream_frame
+            async for stream_frame in frame(
+                produce([[b"a"], [b"b", b"c"]]), BodyCodec()
+            )
+        ]
+        self.assertEqual(
+            frames,
+            [
+                {"seq": 0, "chunks": ["a"]},
+                {"seq": 1, "chunks": ["b", "c"]},
+                {"seq": 2, "chunks": [], "last": True},
+            ],
+        )
+
+    def test_cursor_drops_replays_and_stops_at_gaps(self):
+        cursor = FrameCursor(BodyCodec())
+        self.assertEqual(
+            cursor.read([{"seq": 0, "chunks": ["a"]}, {"seq": 1, "chunks": ["b"]}]),
+            ([b"a", b"b"], True),
+        )
+        self.assertEqual(
+            cursor.read([{"seq": 1, "chunks": ["b"]}, {"seq": 3, "chunks": ["d"]}]),
+            ([], False),
+        )
+        self.assertTrue(cursor.missing_tail)
+        self.assertEqual(
+            cursor.read(
+                [
+                    {"seq": 2, "chunks": ["c"]},
+                    {"seq": 3, "chunks": ["d"]},
+                    {"seq": 4, "chunks": [], "last": True},
+                ]
+            ),
+            ([b"c", b"d"], True),
+        )
+        self.assertFalse(cursor.missing_tail)
+
+    def test_cursor_passes_unframed_outputs(self):
+        cursor = FrameCursor(BodyCodec())
+        self.assertEqual(cursor.read(["a", "b"]), ([b"a", b"b"], True))
+        self.assertFalse(cursor.missing_tail)
+
+
+if __name__ == "__main__":
+    unittest.main()